@@ -0,0 +1,130 @@
+"""
+Benchmark de serialização JSON por endpoint.
+
+Compara o provider padrão do Flask (antes) com _FastJSONProvider usando o
+json da stdlib e orjson (depois), sobre payloads no formato real de cada
+endpoint e no tamanho de um sábado cheio.
+
+Uso:
+    python benchmarks/bench_json.py [repeticoes] > bench_output.txt
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("ENABLE_BACKGROUND_JOBS", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import main  # noqa: E402
+
+
+def _fixtures_payload(n=1200):
+    jogos = [{
+        "id": f"sr:sport_event:{50000000 + i}",
+        "data": "2026-10-17T18:30:00+00:00",
+        "status": "NS",
+        "minuto": None,
+        "competicao": "Brasileiro Serie A",
+        "competicao_id": "sr:competition:325",
+        "mandante": "Atletico Mineiro",
+        "mandante_id": f"sr:competitor:{1000 + i}",
+        "visitante": "Sao Paulo",
+        "visitante_id": f"sr:competitor:{2000 + i}",
+        "placar": None
+    } for i in range(n)]
+    return {"ok": True, "date": "2026-10-17", "total": n, "source": "schedule", "jogos": jogos}
+
+
+def _minute_by_minute_payload(n=160):
+    state = main._TimelineState("Flamengo", "Palmeiras")
+    types = ("score_change", "yellow_card", "substitution", "corner_kick", "free_kick", "throw_in")
+    for i in range(n):
+        state.apply({
+            "id": 1000000 + i,
+            "type": types[i % len(types)],
+            "match_time": i * 95 // n,
+            "competitor": "home" if i % 2 else "away",
+            "player": {"name": f"Jogador {i % 22}"},
+            "home_score": i // 40,
+            "away_score": i // 55,
+            "description": "Lance disputado no meio-campo"
+        })
+    return {
+        "ok": True,
+        "jogo": {"id": "sr:sport_event:1", "mandante": "Flamengo", "visitante": "Palmeiras",
+                 "status": "2H", "placar": {"mandante": 3, "visitante": 2}},
+        "timeline_completa": state.timeline,
+        "analise_por_periodos": state.periods,
+        "momentos_chave": state.key_moments(),
+        "resumo": {"total_eventos": n, "total_gols": state.goals, "total_cartoes": state.cards,
+                   "total_substituicoes": state.substitutions},
+        "ultimo_evento_id": state.last_id,
+        "timestamp": "2026-10-17T20:00:00Z"
+    }
+
+
+def _topscorers_payload(n=250):
+    artilheiros = [{
+        "jogador": f"Jogador {i}", "jogador_id": f"sr:player:{i}", "time": "Botafogo",
+        "time_id": "sr:competitor:1958", "gols": 20 - i // 15, "assistencias": i % 7,
+        "jogos": 30, "amarelos": i % 5, "vermelhos": 0
+    } for i in range(n)]
+    return {"ok": True, "competition": "sr:competition:325", "season": "sr:season:1",
+            "total": n, "stale": False, "artilheiros": artilheiros}
+
+
+def _value_batch_payload(n=10000):
+    colunas = {
+        "odd": [2.1] * n, "probability": [0.52] * n, "value": [0.092] * n,
+        "kelly": [0.0836] * n, "prob_implicita": [0.4762] * n, "margem": [0.0438] * n,
+        "recommendation": ["Apostar"] * n
+    }
+    return {"ok": True, "total": n, "validos": n, "value_bets": n, "colunas": colunas, "erros": []}
+
+
+PAYLOADS = {
+    "/fixtures (1200 jogos)": _fixtures_payload,
+    "/fixtures/live/minute-by-minute (160 eventos)": _minute_by_minute_payload,
+    "/players/topscorers (250)": _topscorers_payload,
+    "/analysis/value/batch (10000)": _value_batch_payload,
+}
+
+
+def _time_ms(provider, payload, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        body = provider.response(payload).get_data()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000, len(body)
+
+
+def main_bench(repeat=20):
+    app = main.app
+    providers = [("antes (Flask padrao)", DefaultJSONProvider(app))]
+    stdlib = main._FastJSONProvider(app)
+    stdlib.backend = "json"
+    providers.append(("depois (stdlib)", stdlib))
+    if main.orjson is not None:
+        fast = main._FastJSONProvider(app)
+        fast.backend = "orjson"
+        providers.append(("depois (orjson)", fast))
+    else:
+        print("orjson nao instalado: medindo apenas o fallback stdlib\n")
+
+    with app.app_context():
+        for endpoint, build in PAYLOADS.items():
+            payload = build()
+            print(endpoint)
+            baseline = None
+            for name, provider in providers:
+                ms, size = _time_ms(provider, payload, repeat)
+                baseline = baseline or ms
+                print(f"  {name:<22} {ms:8.2f} ms  {size / 1024:8.1f} KiB  {baseline / ms:5.1f}x")
+            print()
+
+
+if __name__ == "__main__":
+    main_bench(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
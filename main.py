@@ -1,22 +1,93 @@
 import os
+import bisect
+import csv
+import gzip
+import io
 import logging
+import queue
 import requests
 import json
 import yaml
+import hashlib
+import heapq
+import itertools
+import math
+import re
+import sqlite3
+import sys
+import tempfile
 import time
+import unicodedata
+from array import array
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from flask import Flask, jsonify, request, send_file
+from urllib.parse import urlencode
+from flask import Flask, Response, jsonify, request, send_file, g, has_request_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from requests.adapters import HTTPAdapter
 from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
-from functools import lru_cache
 import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    import orjson  # opcional: serialização JSON bem mais rápida
+except ImportError:
+    orjson = None
 
 # =======================
 # Configurações iniciais
 # =======================
 load_dotenv()
+
+
+class _FastJSONProvider(DefaultJSONProvider):
+    """
+    Provider JSON do app (jsonify, NDJSON e SSE).
+
+    Usa orjson quando instalado e o json da stdlib como fallback
+    (JSON_BACKEND=json força o fallback). Saída compacta, UTF-8 e chaves na
+    ordem de inserção nos dois backends; tipos extras (date, Decimal,
+    dataclass...) passam pelo mesmo `default` do provider padrão do Flask.
+    """
+
+    sort_keys = False
+    ensure_ascii = False
+    compact = True
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.backend = "orjson" if orjson is not None and os.getenv("JSON_BACKEND", "orjson") == "orjson" else "json"
+
+    def dumps_bytes(self, obj):
+        if self.backend == "orjson":
+            return orjson.dumps(
+                obj, default=self.default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            )
+        return json.dumps(
+            obj, default=self.default, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+    def dumps(self, obj, **kwargs):
+        if not kwargs:
+            return self.dumps_bytes(obj).decode("utf-8")
+        kwargs.setdefault("separators", (",", ":"))
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.backend == "orjson" and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
+
+
 app = Flask(__name__)
+app.json = _FastJSONProvider(app)
 CORS(app)
 app.wsgi_app = ProxyFix(app.wsgi_app)
 
@@ -36,6 +107,7 @@ DEFAULT_NEWS_DAYS = 3
 MAX_NEWS_DAYS = 30
 MAX_LIVE_FIXTURES = 20
 MAX_H2H_RESULTS = 10
+# Totais por jogo usados pelo _set_piece_model enquanto nenhum jogo com estatísticas foi visto
 DEFAULT_CORNERS_ESTIMATE = 10.0
 DEFAULT_CARDS_ESTIMATE = 5.5
 
@@ -44,6 +116,7 @@ MIN_ODD_VALUE = 1.01
 MAX_ODD_VALUE = 100.0
 MIN_PROBABILITY = 0.01
 MAX_PROBABILITY = 1.0
+VALUE_BATCH_MAX_ITEMS = 10000
 
 # Sportradar API
 API_KEY = os.getenv("API_KEY")
@@ -53,19 +126,717 @@ API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "3"))
 API_RETRY_DELAY = float(os.getenv("API_RETRY_DELAY", "1.2"))  # Sportradar trial: 1 req/sec
 NEWS_API_KEY = os.getenv("NEWS_API_KEY", "")
 
-# Rate limiter para Sportradar trial (1 req/sec)
-_last_request_time = 0.0
-_rate_limit_lock = threading.Lock()
+# Rate limiter compartilhado entre workers (token bucket + quota diária em SQLite)
+API_RATE_LIMIT_QPS = float(os.getenv("API_RATE_LIMIT_QPS", "0.9"))  # margem abaixo de 1 req/s
+API_RATE_LIMIT_BURST = float(os.getenv("API_RATE_LIMIT_BURST", "1"))
+API_DAILY_QUOTA = int(os.getenv("API_DAILY_QUOTA", "1000"))
+API_QUOTA_RESERVE = int(os.getenv("API_QUOTA_RESERVE", "50"))
+API_REQUEST_DEADLINE = float(os.getenv("API_REQUEST_DEADLINE", "8"))  # segundos por chamada
+RATE_LIMIT_DB_PATH = os.getenv(
+    "RATE_LIMIT_DB_PATH", os.path.join(tempfile.gettempdir(), "sportradar_ratelimit.sqlite3")
+)
+
 
-def _rate_limit():
-    """Garante no mínimo 1 segundo entre requisições (Sportradar trial: QPS=1)."""
-    global _last_request_time
-    with _rate_limit_lock:
+class SportradarError(str):
+    """Mensagem de erro (str) que carrega o status HTTP sugerido para a resposta."""
+
+    def __new__(cls, message, status=500):
+        obj = super().__new__(cls, message)
+        obj.status = status
+        return obj
+
+
+class _SQLiteStore:
+    """
+    Base dos stores SQLite locais compartilhados entre os workers.
+    Uma conexão por thread (recriada após fork), journal em WAL.
+    """
+    SCHEMA = ()
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _setup(self, conn):
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    self._setup(conn)
+                    self._initialized = True
+        return conn
+
+
+class _SharedRateLimiter(_SQLiteStore):
+    """
+    Token bucket + contador de quota diária compartilhados por todos os
+    workers gunicorn da máquina via SQLite (transações BEGIN IMMEDIATE
+    servem de lock entre processos).
+
+    A quota é contada por dia UTC. Quando restam API_QUOTA_RESERVE chamadas
+    ou menos, try_acquire(reserve_ok=False) recusa a chamada para que o
+    chamador sirva dado em cache; a reserva fica para o que não tem cópia.
+    """
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS bucket ("
+        "id INTEGER PRIMARY KEY CHECK (id = 1), tokens REAL, updated_at REAL)",
+        "CREATE TABLE IF NOT EXISTS quota (day TEXT PRIMARY KEY, used INTEGER)",
+    )
+
+    def __init__(self, db_path, rate, burst, daily_quota, reserve):
+        super().__init__(db_path)
+        self.rate = rate
+        self.burst = burst
+        self.daily_quota = daily_quota
+        self.reserve = reserve
+
+    def _setup(self, conn):
+        super()._setup(conn)
+        conn.execute(
+            "INSERT OR IGNORE INTO bucket (id, tokens, updated_at) VALUES (1, ?, ?)",
+            (self.burst, time.time())
+        )
+
+    @staticmethod
+    def _today():
+        return datetime.utcnow().strftime("%Y-%m-%d")
+
+    def try_acquire(self, reserve_ok=True):
+        """
+        Tenta consumir um token e uma unidade da quota diária.
+
+        Returns:
+            tuple: (wait, error) — wait=0 se o token foi concedido, >0 com o
+            tempo até o próximo token; error preenchido se a quota acabou.
+        """
+        conn = self._conn()
         now = time.time()
-        elapsed = now - _last_request_time
-        if elapsed < 1.1:
-            time.sleep(1.1 - elapsed)
-        _last_request_time = time.time()
+        day = self._today()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT used FROM quota WHERE day = ?", (day,)).fetchone()
+            used = row[0] if row else 0
+            limit = self.daily_quota if reserve_ok else self.daily_quota - self.reserve
+            if used >= limit:
+                conn.execute("ROLLBACK")
+                if used >= self.daily_quota:
+                    return 0, SportradarError(
+                        f"Quota diaria Sportradar esgotada ({used}/{self.daily_quota}). Tente novamente amanha.",
+                        429
+                    )
+                return 0, SportradarError(
+                    f"Quota diaria Sportradar na reserva ({used}/{self.daily_quota}). "
+                    "Chamada adiada para preservar a quota.", 429
+                )
+
+            tokens, updated_at = conn.execute(
+                "SELECT tokens, updated_at FROM bucket WHERE id = 1"
+            ).fetchone()
+            tokens = min(self.burst, tokens + max(0.0, now - updated_at) * self.rate)
+            if tokens < 1.0:
+                conn.execute(
+                    "UPDATE bucket SET tokens = ?, updated_at = ? WHERE id = 1", (tokens, now)
+                )
+                conn.execute("COMMIT")
+                return (1.0 - tokens) / self.rate, None
+
+            conn.execute(
+                "UPDATE bucket SET tokens = ?, updated_at = ? WHERE id = 1", (tokens - 1.0, now)
+            )
+            conn.execute(
+                "INSERT INTO quota (day, used) VALUES (?, 1) "
+                "ON CONFLICT(day) DO UPDATE SET used = used + 1",
+                (day,)
+            )
+            conn.execute("DELETE FROM quota WHERE day < ?", (day,))
+            conn.execute("COMMIT")
+            return 0, None
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def quota_status(self):
+        try:
+            row = self._conn().execute(
+                "SELECT used FROM quota WHERE day = ?", (self._today(),)
+            ).fetchone()
+        except sqlite3.Error as e:
+            return {"erro": str(e)}
+        used = row[0] if row else 0
+        return {
+            "dia_utc": self._today(),
+            "usadas": used,
+            "limite": self.daily_quota,
+            "restantes": max(0, self.daily_quota - used),
+            "reserva": self.reserve,
+            "em_reserva": used >= self.daily_quota - self.reserve
+        }
+
+
+_rate_limiter = _SharedRateLimiter(
+    RATE_LIMIT_DB_PATH, API_RATE_LIMIT_QPS, API_RATE_LIMIT_BURST, API_DAILY_QUOTA, API_QUOTA_RESERVE
+)
+
+
+class _SharedLease(_SQLiteStore):
+    """
+    Lease nomeado compartilhado pelos workers da máquina (mesmo SQLite do
+    limiter): só o dono faz o trabalho; se ele parar de renovar, outro
+    worker assume quando o lease expira.
+    """
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)",
+    )
+
+    def acquire(self, name, ttl):
+        """Adquire ou renova o lease deste processo. Retorna True se ele é o dono."""
+        owner, now = str(os.getpid()), time.time()
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+                if row and row[0] != owner and row[1] > now:
+                    conn.execute("ROLLBACK")
+                    return False
+                conn.execute(
+                    "INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                    (name, owner, now + ttl)
+                )
+                conn.execute("COMMIT")
+                return True
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"[Lease] {name}: {e}")
+            return False
+
+    def release(self, name):
+        try:
+            self._conn().execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, str(os.getpid())))
+        except sqlite3.Error as e:
+            logger.warning(f"[Lease] {name}: {e}")
+
+
+_shared_lease = _SharedLease(RATE_LIMIT_DB_PATH)
+
+
+# Faixas de prioridade: menor valor é atendido primeiro
+LANE_LIVE, LANE_DEFAULT, LANE_BULK = 0, 1, 2
+_LANE_RULES = [
+    (re.compile(r"^/schedules/live/|^/sport_events/[^/]+/(summary|timeline)\.json$"), LANE_LIVE),
+    (re.compile(r"/seasons\.json$|^/competitions\.json$|/competitors\.json$|/profile\.json$"), LANE_BULK),
+]
+
+
+def _lane_for(path):
+    """Faixa de prioridade do limiter para um path Sportradar."""
+    for pattern, lane in _LANE_RULES:
+        if pattern.search(path):
+            return lane
+    return LANE_DEFAULT
+
+
+class _SlotScheduler:
+    """
+    Distribui os slots do token bucket entre as threads do worker.
+
+    Cada chamada entra numa fila de prioridade (faixa, ordem de chegada).
+    Só a primeira da fila consulta o bucket compartilhado; as demais esperam
+    numa Condition (sem segurar lock). Quem não consegue slot antes do seu
+    deadline desiste na hora com erro 503, em vez de prender a thread.
+    """
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self._cond = threading.Condition()
+        self._queue = []  # heap de (faixa, seq)
+        self._seq = itertools.count()
+        self._fallback_last = 0.0
+        self.granted = 0
+        self.rejected = 0
+        self.max_wait = 0.0
+
+    def _try_acquire(self, reserve_ok):
+        try:
+            return self.limiter.try_acquire(reserve_ok)
+        except sqlite3.Error as e:
+            # Sem o arquivo compartilhado, espaça as chamadas só neste worker
+            logger.error(f"[RateLimit] Falha no SQLite ({self.limiter.db_path}): {e}")
+            wait = self._fallback_last + 1.0 / self.limiter.rate - time.time()
+            if wait <= 0:
+                self._fallback_last = time.time()
+                return 0, None
+            return wait, None
+
+    def _reject(self, lane, waited):
+        self.rejected += 1
+        return SportradarError(
+            f"Limite de requisicoes Sportradar: sem slot disponivel em {waited:.1f}s "
+            f"(fila de prioridade {lane}). Tente novamente em instantes.", 503
+        )
+
+    def acquire(self, lane, deadline, reserve_ok=True):
+        """
+        Aguarda um slot até o deadline (epoch).
+
+        Returns:
+            None se o slot foi concedido, ou a mensagem de erro (quota/deadline).
+        """
+        ticket = (lane, next(self._seq))
+        start = time.time()
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+        try:
+            while True:
+                with self._cond:
+                    ahead = sum(1 for t in self._queue if t < ticket)
+                    now = time.time()
+                    # Slot estimado: cada chamada à frente ocupa 1/rate segundos
+                    if now + ahead / self.limiter.rate > deadline:
+                        return self._reject(lane, now - start)
+                    if ahead:
+                        self._cond.wait(timeout=deadline - now)
+                        continue
+
+                wait, error = self._try_acquire(reserve_ok)
+                if error:
+                    return error
+                now = time.time()
+                if wait <= 0:
+                    self.granted += 1
+                    self.max_wait = max(self.max_wait, now - start)
+                    return None
+                if now + wait > deadline:
+                    return self._reject(lane, now - start)
+                with self._cond:
+                    self._cond.wait(timeout=wait)
+        finally:
+            with self._cond:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            waiting = len(self._queue)
+        return {
+            "concedidos": self.granted,
+            "rejeitados_deadline": self.rejected,
+            "fila_atual": waiting,
+            "espera_max_ms": round(self.max_wait * 1000)
+        }
+
+
+_slot_scheduler = _SlotScheduler(_rate_limiter)
+
+
+def _rate_limit(path="", reserve_ok=True, deadline=None, lane=None):
+    """
+    Aguarda um slot do limiter compartilhado (Sportradar trial: QPS=1, 1000/dia).
+    Retorna None se liberado ou a mensagem de erro (quota esgotada / deadline).
+    """
+    if deadline is None:
+        deadline = time.time() + API_REQUEST_DEADLINE
+    if lane is None:
+        lane = _lane_for(path)
+    return _slot_scheduler.acquire(lane, deadline, reserve_ok)
+
+# =======================
+# Cache de respostas Sportradar
+# =======================
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+CACHE_DEFAULT_TTL = 60
+
+# TTL (segundos) por tipo de endpoint. A primeira regra que casar com o path vence.
+CACHE_TTL_RULES = [
+    # Ao vivo: segundos
+    (re.compile(r"^/schedules/live/"), 10),
+    (re.compile(r"/timeline\.json$"), 15),
+    (re.compile(r"^/sport_events/[^/]+/summary\.json$"), 20),
+    # Agenda do dia
+    (re.compile(r"^/schedules/[^/]+/summaries\.json$"), 2 * 60),
+    (re.compile(r"^/schedules/[^/]+/schedule\.json$"), 5 * 60),
+    # Tabela, desfalques e estatísticas: minutos
+    (re.compile(r"/standings\.json$"), 10 * 60),
+    (re.compile(r"/missing_players\.json$"), 10 * 60),
+    (re.compile(r"/top_scorers\.json$"), 30 * 60),
+    (re.compile(r"/competitor_statistics\.json$"), 30 * 60),
+    (re.compile(r"/probabilities\.json$"), 30 * 60),
+    (re.compile(r"^/competitors/[^/]+/summaries\.json$"), 30 * 60),
+    # Dados quase estáticos: horas
+    (re.compile(r"/versus/[^/]+/summaries\.json$"), 6 * 3600),
+    (re.compile(r"/profile\.json$"), 6 * 3600),
+    (re.compile(r"/competitors\.json$"), 12 * 3600),
+    (re.compile(r"^/competitions/[^/]+/seasons\.json$"), 12 * 3600),
+    (re.compile(r"^/competitions\.json$"), 24 * 3600),
+]
+
+
+def _cache_ttl_for(path):
+    """Retorna o TTL (segundos) do cache para um path Sportradar."""
+    for pattern, ttl in CACHE_TTL_RULES:
+        if pattern.search(path):
+            return ttl
+    return CACHE_DEFAULT_TTL
+
+
+def _cache_key(path, params=None):
+    """Chave de cache: path + query string ordenada (sem api_key)."""
+    if not params:
+        return path
+    return f"{path}?{urlencode(sorted(params.items()))}"
+
+
+class _ResponseCache:
+    """
+    Cache LRU em memória (por worker) para respostas JSON da Sportradar.
+
+    Entradas expiradas não são descartadas na leitura: continuam ocupando
+    espaço até serem despejadas pelo LRU, o que permite servi-las como
+    dado antigo quando a API falha.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (data, stored_at, ttl, version)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Retorna (data, stored_at) se estiver dentro do TTL, senão None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            data, stored_at, ttl, _ = entry
+            if time.time() - stored_at > ttl:
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data, stored_at
+
+    def get_stale(self, key):
+        """
+        Retorna (data, stored_at, version) mesmo expirado, ou None.
+        Fallback quando a API não pode ser chamada.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return (entry[0], entry[1], entry[3]) if entry else None
+
+    def set(self, key, data, ttl, stored_at=None, version=None):
+        """`version`: hash do payload upstream (ETag); mantido se o mesmo objeto for regravado."""
+        with self._lock:
+            previous = self._entries.get(key)
+            if version is None and previous is not None and previous[0] is data:
+                version = previous[3]
+            self._entries[key] = (data, stored_at or time.time(), ttl, version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Força a próxima leitura da chave a ir à API (mantém a cópia para fallback)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries[key] = (entry[0], entry[1], -1, entry[3])
+
+    def version(self, key):
+        """Versão do payload em cache (hash do conteúdo ou, se desconhecido, instante da gravação)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            return entry[3] or f"t{entry[1]}"
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entradas": len(self._entries),
+                "capacidade": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expirados": self.expired,
+                "despejos": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "chamadas_economizadas": self.hits
+            }
+
+
+_response_cache = _ResponseCache(CACHE_MAX_ENTRIES)
+
+# =======================
+# Snapshots persistentes (SQLite) das respostas Sportradar
+# =======================
+SNAPSHOT_DB_PATH = os.getenv(
+    "SNAPSHOT_DB_PATH", os.path.join(tempfile.gettempdir(), "sportradar_snapshots.sqlite3")
+)
+SNAPSHOT_COMPACT_INTERVAL = int(os.getenv("SNAPSHOT_COMPACT_INTERVAL", str(6 * 3600)))
+
+# Idade máxima (segundos) de um snapshot servido quando a Sportradar falha
+# (429/5xx/timeout) ou a quota não permite chamar. Documentada no README.
+SNAPSHOT_MAX_STALENESS_RULES = [
+    (re.compile(r"^/schedules/live/|/timeline\.json$|^/sport_events/[^/]+/summary\.json$"), 2 * 60),
+    (re.compile(r"^/schedules/[^/]+/(summaries|schedule)\.json$"), 60 * 60),
+    (re.compile(r"/standings\.json$|/missing_players\.json$"), 12 * 3600),
+    (re.compile(r"/top_scorers\.json$|/competitor_statistics\.json$|/probabilities\.json$"), 24 * 3600),
+    (re.compile(r"^/competitors/[^/]+/summaries\.json$"), 24 * 3600),
+    (re.compile(r"/versus/[^/]+/summaries\.json$|/profile\.json$|/competitors\.json$"), 7 * 86400),
+    (re.compile(r"/seasons\.json$|^/competitions\.json$"), 30 * 86400),
+]
+SNAPSHOT_DEFAULT_MAX_STALENESS = 60 * 60
+
+
+def _max_staleness_for(path):
+    """Idade máxima aceitável (segundos) de um snapshot antigo para o path."""
+    for pattern, max_age in SNAPSHOT_MAX_STALENESS_RULES:
+        if pattern.search(path):
+            return max_age
+    return SNAPSHOT_DEFAULT_MAX_STALENESS
+
+
+class _SnapshotStore(_SQLiteStore):
+    """
+    Guarda o JSON bruto de cada resposta 200 da Sportradar, com hash do
+    conteúdo (etag), ETag do upstream e versão (incrementada quando o
+    conteúdo muda).
+
+    Funciona como segundo nível do cache, compartilhado entre os workers e
+    entre reinícios: aquece o cache em memória no boot e fornece dado antigo
+    (até _max_staleness_for) quando a API falha.
+    """
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS snapshots ("
+        "key TEXT PRIMARY KEY, path TEXT NOT NULL, payload TEXT NOT NULL, etag TEXT NOT NULL, "
+        "upstream_etag TEXT, version INTEGER NOT NULL DEFAULT 1, fetched_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS snapshots_fetched_at ON snapshots (fetched_at)",
+    )
+
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        self.stale_served = 0
+        self.errors = 0
+
+    def _safe(self, func, default=None):
+        try:
+            return func()
+        except (sqlite3.Error, ValueError) as e:
+            self.errors += 1
+            logger.warning(f"[Snapshots] {e}")
+            return default
+
+    def save(self, key, path, raw, upstream_etag=None):
+        """Grava o payload bruto. Retorna o etag (sha1 do conteúdo)."""
+        etag = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+        self._safe(lambda: self._conn().execute(
+            "INSERT INTO snapshots (key, path, payload, etag, upstream_etag, version, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?, 1, ?) "
+            "ON CONFLICT(key) DO UPDATE SET payload = excluded.payload, "
+            "upstream_etag = excluded.upstream_etag, fetched_at = excluded.fetched_at, "
+            "version = version + (etag != excluded.etag), etag = excluded.etag",
+            (key, path, raw, etag, upstream_etag, time.time())
+        ))
+        return etag
+
+    def touch(self, key):
+        """Upstream respondeu 304: o snapshot continua válido a partir de agora."""
+        self._safe(lambda: self._conn().execute(
+            "UPDATE snapshots SET fetched_at = ? WHERE key = ?", (time.time(), key)
+        ))
+
+    def expire(self, key, ttl):
+        """
+        Tira o snapshot do segundo nível (recua fetched_at para além do TTL)
+        sem apagá-lo: continua servindo de cópia antiga se a API falhar.
+        """
+        self._safe(lambda: self._conn().execute(
+            "UPDATE snapshots SET fetched_at = MIN(fetched_at, ?) WHERE key = ?",
+            (time.time() - ttl - 1, key)
+        ))
+
+    def head(self, key):
+        """Retorna (fetched_at, etag, upstream_etag) do snapshot sem ler o payload, ou None."""
+        return self._safe(lambda: self._conn().execute(
+            "SELECT fetched_at, etag, upstream_etag FROM snapshots WHERE key = ?", (key,)
+        ).fetchone())
+
+    def load(self, key, max_age=None):
+        """Retorna (data, fetched_at, etag) se existir (e tiver no máximo max_age segundos), senão None."""
+        min_fetched = time.time() - max_age if max_age is not None else 0
+        row = self._safe(lambda: self._conn().execute(
+            "SELECT payload, fetched_at, etag FROM snapshots WHERE key = ? AND fetched_at >= ?",
+            (key, min_fetched)
+        ).fetchone())
+        if not row:
+            return None
+        data = self._safe(lambda: json.loads(row[0]))
+        return (data, row[1], row[2]) if data is not None else None
+
+    def warm(self, cache):
+        """Carrega no cache em memória os snapshots mais recentes ainda aproveitáveis."""
+        rows = self._safe(lambda: self._conn().execute(
+            "SELECT key, path, payload, fetched_at, etag FROM snapshots ORDER BY fetched_at DESC LIMIT ?",
+            (cache.max_entries,)
+        ).fetchall(), default=[])
+        now, loaded = time.time(), 0
+        for key, path, payload, fetched_at, etag in reversed(rows):
+            if now - fetched_at > _max_staleness_for(path):
+                continue
+            data = self._safe(lambda: json.loads(payload))
+            if data is not None:
+                cache.set(key, data, _cache_ttl_for(path), stored_at=fetched_at, version=etag)
+                loaded += 1
+        return loaded
+
+    def payloads(self, path_like):
+        """Gera (path, data) dos snapshots cujo path casa com o padrão LIKE, do mais antigo ao mais novo."""
+        rows = self._safe(lambda: self._conn().execute(
+            "SELECT path, payload FROM snapshots WHERE path LIKE ? ORDER BY fetched_at", (path_like,)
+        ).fetchall(), default=[])
+        for path, payload in rows:
+            data = self._safe(lambda: json.loads(payload))
+            if data is not None:
+                yield path, data
+
+    def compact(self):
+        """Remove snapshots além da idade máxima do seu endpoint e recupera espaço."""
+        rows = self._safe(lambda: self._conn().execute(
+            "SELECT key, path, fetched_at FROM snapshots"
+        ).fetchall(), default=[])
+        now = time.time()
+        expired = [(key,) for key, path, fetched_at in rows if now - fetched_at > _max_staleness_for(path)]
+        if expired:
+            self._safe(lambda: self._conn().executemany("DELETE FROM snapshots WHERE key = ?", expired))
+            self._safe(lambda: self._conn().execute("VACUUM"))
+        self._safe(lambda: self._conn().execute("PRAGMA wal_checkpoint(TRUNCATE)"))
+        logger.info(f"[Snapshots] Compactacao: {len(expired)} removido(s), {len(rows) - len(expired)} mantido(s)")
+
+    def stats(self):
+        row = self._safe(lambda: self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM snapshots"
+        ).fetchone(), default=(None, None))
+        return {
+            "snapshots": row[0],
+            "bytes": row[1],
+            "servidos_antigos": self.stale_served,
+            "erros": self.errors
+        }
+
+
+_snapshot_store = _SnapshotStore(SNAPSHOT_DB_PATH)
+
+
+def _stale_copy(cache_key, path):
+    """
+    Cópia antiga aproveitável (dentro de _max_staleness_for): a mais nova entre
+    o cache em memória e o snapshot, que outro worker pode ter regravado.
+
+    Retorna (data, fetched_at, version, upstream_etag) ou None. upstream_etag
+    só vem preenchido quando descreve exatamente esse corpo (mesmo hash do
+    snapshot), então um 304 do upstream pode regravá-lo como atual.
+    """
+    max_age = _max_staleness_for(path)
+    now = time.time()
+    entry = _response_cache.get_stale(cache_key)
+    if entry is not None and now - entry[1] > max_age:
+        entry = None
+    head = _snapshot_store.head(cache_key)
+    if head is not None and now - head[0] > max_age:
+        head = None
+    if head is not None and (entry is None or (head[0] > entry[1] and head[1] != entry[2])):
+        entry = _snapshot_store.load(cache_key, max_age=max_age) or entry
+    if entry is None:
+        return None
+    data, fetched_at, version = entry
+    upstream_etag = head[2] if head is not None and head[1] == version else None
+    return data, fetched_at, version, upstream_etag
+
+
+# =======================
+# Sessão HTTP com pool de conexões (keep-alive)
+# =======================
+GUNICORN_THREADS = int(os.getenv("GUNICORN_THREADS", "4"))
+
+_http_session_lock = threading.Lock()
+_http_session_state = {"pid": None, "session": None}
+
+
+def _http_session():
+    """
+    Retorna a sessão HTTP do worker atual (criada sob demanda, uma por processo).
+
+    Reaproveita conexões TCP+TLS com api.sportradar.com e newsapi.org. O pool
+    por host comporta as threads do gunicorn mais as do executor de fan-out.
+    """
+    state = _http_session_state
+    if state["session"] is not None and state["pid"] == os.getpid():
+        return state["session"]
+    with _http_session_lock:
+        if state["session"] is None or state["pid"] != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=GUNICORN_THREADS + FANOUT_MAX_WORKERS + ANALYSIS_BATCH_MAX_WORKERS,
+                max_retries=0  # retry é feito em call_sportradar
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({
+                "Accept": "application/json",
+                "Accept-Encoding": "gzip, deflate",
+                "Connection": "keep-alive",
+                "User-Agent": f"apostas-esportivas-pro/{API_VERSION}"
+            })
+            state["session"] = session
+            state["pid"] = os.getpid()
+    return state["session"]
+
+
+def _http_pool_stats():
+    """Conexões abertas vs requisições feitas por host (reuso de keep-alive)."""
+    session = _http_session_state["session"]
+    if session is None or _http_session_state["pid"] != os.getpid():
+        return {"hosts": {}}
+    hosts = {}
+    adapter = session.get_adapter("https://")
+    pools = adapter.poolmanager.pools
+    for key in pools.keys():
+        pool = pools[key]
+        if pool is None:
+            continue
+        created, total = pool.num_connections, pool.num_requests
+        hosts[pool.host] = {
+            "conexoes_criadas": created,
+            "requisicoes": total,
+            "taxa_reuso": round(1 - created / total, 3) if total else None
+        }
+    return {"pool_maxsize": adapter._pool_maxsize, "hosts": hosts}
+
 
 # Validação crítica de API_KEY
 if not API_KEY:
@@ -105,178 +876,574 @@ SUPPORTED_COMPETITIONS = {
     "sr:competition:133": "Copa America"
 }
 
-# Mapeamento estático de times europeus → URN Sportradar
-# Usado como fallback quando a API trial não tem acesso aos endpoints de temporada
-TEAMS_STATIC_LOOKUP = {
-    # ── La Liga (sr:competition:8) ──────────────────────────────────────────
-    "real madrid":              {"id": "sr:competitor:2829", "name": "Real Madrid CF",           "competition": "sr:competition:8"},
-    "barcelona":                {"id": "sr:competitor:2817", "name": "FC Barcelona",             "competition": "sr:competition:8"},
-    "fc barcelona":             {"id": "sr:competitor:2817", "name": "FC Barcelona",             "competition": "sr:competition:8"},
-    "atletico madrid":          {"id": "sr:competitor:2836", "name": "Club Atletico de Madrid",  "competition": "sr:competition:8"},
-    "atlético madrid":          {"id": "sr:competitor:2836", "name": "Club Atletico de Madrid",  "competition": "sr:competition:8"},
-    "atletico de madrid":       {"id": "sr:competitor:2836", "name": "Club Atletico de Madrid",  "competition": "sr:competition:8"},
-    "athletic club":            {"id": "sr:competitor:2818", "name": "Athletic Club",            "competition": "sr:competition:8"},
-    "athletic bilbao":          {"id": "sr:competitor:2818", "name": "Athletic Club",            "competition": "sr:competition:8"},
-    "real sociedad":            {"id": "sr:competitor:2820", "name": "Real Sociedad",            "competition": "sr:competition:8"},
-    "real betis":               {"id": "sr:competitor:6900", "name": "Real Betis Balompie",      "competition": "sr:competition:8"},
-    "villarreal":               {"id": "sr:competitor:2825", "name": "Villarreal CF",            "competition": "sr:competition:8"},
-    "valencia":                 {"id": "sr:competitor:2832", "name": "Valencia CF",              "competition": "sr:competition:8"},
-    "sevilla":                  {"id": "sr:competitor:2833", "name": "Sevilla FC",               "competition": "sr:competition:8"},
-    "osasuna":                  {"id": "sr:competitor:2819", "name": "CA Osasuna",               "competition": "sr:competition:8"},
-    "celta vigo":               {"id": "sr:competitor:2822", "name": "RC Celta de Vigo",         "competition": "sr:competition:8"},
-    "celta":                    {"id": "sr:competitor:2822", "name": "RC Celta de Vigo",         "competition": "sr:competition:8"},
-    "getafe":                   {"id": "sr:competitor:2824", "name": "Getafe CF",                "competition": "sr:competition:8"},
-    "rayo vallecano":           {"id": "sr:competitor:2834", "name": "Rayo Vallecano",           "competition": "sr:competition:8"},
-    "girona":                   {"id": "sr:competitor:3153", "name": "Girona FC",                "competition": "sr:competition:8"},
-    "mallorca":                 {"id": "sr:competitor:2823", "name": "RCD Mallorca",             "competition": "sr:competition:8"},
-    "las palmas":               {"id": "sr:competitor:5820", "name": "UD Las Palmas",            "competition": "sr:competition:8"},
-    "alaves":                   {"id": "sr:competitor:2826", "name": "Deportivo Alaves",         "competition": "sr:competition:8"},
-    "alavés":                   {"id": "sr:competitor:2826", "name": "Deportivo Alaves",         "competition": "sr:competition:8"},
-    "espanyol":                 {"id": "sr:competitor:2821", "name": "RCD Espanyol",             "competition": "sr:competition:8"},
-    "leganes":                  {"id": "sr:competitor:5964", "name": "CD Leganes",               "competition": "sr:competition:8"},
-    "leganés":                  {"id": "sr:competitor:5964", "name": "CD Leganes",               "competition": "sr:competition:8"},
-    "valladolid":               {"id": "sr:competitor:5819", "name": "Real Valladolid CF",       "competition": "sr:competition:8"},
-    # ── Bundesliga (sr:competition:35) ─────────────────────────────────────
-    "bayern":                   {"id": "sr:competitor:2841", "name": "FC Bayern Munchen",        "competition": "sr:competition:35"},
-    "bayern munich":            {"id": "sr:competitor:2841", "name": "FC Bayern Munchen",        "competition": "sr:competition:35"},
-    "bayern münchen":           {"id": "sr:competitor:2841", "name": "FC Bayern Munchen",        "competition": "sr:competition:35"},
-    "borussia dortmund":        {"id": "sr:competitor:2838", "name": "Borussia Dortmund",        "competition": "sr:competition:35"},
-    "dortmund":                 {"id": "sr:competitor:2838", "name": "Borussia Dortmund",        "competition": "sr:competition:35"},
-    "bayer leverkusen":         {"id": "sr:competitor:2847", "name": "Bayer 04 Leverkusen",      "competition": "sr:competition:35"},
-    "leverkusen":               {"id": "sr:competitor:2847", "name": "Bayer 04 Leverkusen",      "competition": "sr:competition:35"},
-    "rb leipzig":               {"id": "sr:competitor:42406","name": "RB Leipzig",               "competition": "sr:competition:35"},
-    "leipzig":                  {"id": "sr:competitor:42406","name": "RB Leipzig",               "competition": "sr:competition:35"},
-    "eintracht frankfurt":      {"id": "sr:competitor:2851", "name": "Eintracht Frankfurt",      "competition": "sr:competition:35"},
-    "frankfurt":                {"id": "sr:competitor:2851", "name": "Eintracht Frankfurt",      "competition": "sr:competition:35"},
-    "vfb stuttgart":            {"id": "sr:competitor:2846", "name": "VfB Stuttgart",            "competition": "sr:competition:35"},
-    "stuttgart":                {"id": "sr:competitor:2846", "name": "VfB Stuttgart",            "competition": "sr:competition:35"},
-    "sc freiburg":              {"id": "sr:competitor:2852", "name": "SC Freiburg",              "competition": "sr:competition:35"},
-    "freiburg":                 {"id": "sr:competitor:2852", "name": "SC Freiburg",              "competition": "sr:competition:35"},
-    "hoffenheim":               {"id": "sr:competitor:5985", "name": "TSG 1899 Hoffenheim",      "competition": "sr:competition:35"},
-    "werder bremen":            {"id": "sr:competitor:2843", "name": "Werder Bremen",            "competition": "sr:competition:35"},
-    "bremen":                   {"id": "sr:competitor:2843", "name": "Werder Bremen",            "competition": "sr:competition:35"},
-    "wolfsburg":                {"id": "sr:competitor:2849", "name": "VfL Wolfsburg",            "competition": "sr:competition:35"},
-    "borussia monchengladbach": {"id": "sr:competitor:2844", "name": "Borussia Monchengladbach", "competition": "sr:competition:35"},
-    "gladbach":                 {"id": "sr:competitor:2844", "name": "Borussia Monchengladbach", "competition": "sr:competition:35"},
-    "union berlin":             {"id": "sr:competitor:40658","name": "1. FC Union Berlin",       "competition": "sr:competition:35"},
-    "mainz":                    {"id": "sr:competitor:2850", "name": "1. FSV Mainz 05",          "competition": "sr:competition:35"},
-    "augsburg":                 {"id": "sr:competitor:3025", "name": "FC Augsburg",              "competition": "sr:competition:35"},
-    "heidenheim":               {"id": "sr:competitor:6717", "name": "1. FC Heidenheim",         "competition": "sr:competition:35"},
-    "bochum":                   {"id": "sr:competitor:3424", "name": "VfL Bochum",               "competition": "sr:competition:35"},
-    # ── Serie A (sr:competition:23) ────────────────────────────────────────
-    "juventus":                 {"id": "sr:competitor:2839", "name": "Juventus FC",              "competition": "sr:competition:23"},
-    "inter":                    {"id": "sr:competitor:2840", "name": "FC Internazionale Milano", "competition": "sr:competition:23"},
-    "inter milan":              {"id": "sr:competitor:2840", "name": "FC Internazionale Milano", "competition": "sr:competition:23"},
-    "internazionale":           {"id": "sr:competitor:2840", "name": "FC Internazionale Milano", "competition": "sr:competition:23"},
-    "ac milan":                 {"id": "sr:competitor:2848", "name": "AC Milan",                 "competition": "sr:competition:23"},
-    "milan":                    {"id": "sr:competitor:2848", "name": "AC Milan",                 "competition": "sr:competition:23"},
-    "napoli":                   {"id": "sr:competitor:2853", "name": "SSC Napoli",               "competition": "sr:competition:23"},
-    "roma":                     {"id": "sr:competitor:2854", "name": "AS Roma",                  "competition": "sr:competition:23"},
-    "as roma":                  {"id": "sr:competitor:2854", "name": "AS Roma",                  "competition": "sr:competition:23"},
-    "lazio":                    {"id": "sr:competitor:2855", "name": "SS Lazio",                 "competition": "sr:competition:23"},
-    "atalanta":                 {"id": "sr:competitor:2856", "name": "Atalanta BC",              "competition": "sr:competition:23"},
-    "fiorentina":               {"id": "sr:competitor:2857", "name": "ACF Fiorentina",           "competition": "sr:competition:23"},
-    "torino":                   {"id": "sr:competitor:2858", "name": "Torino FC",                "competition": "sr:competition:23"},
-    "bologna":                  {"id": "sr:competitor:2859", "name": "Bologna FC",               "competition": "sr:competition:23"},
-    "udinese":                  {"id": "sr:competitor:2861", "name": "Udinese Calcio",           "competition": "sr:competition:23"},
-    "genoa":                    {"id": "sr:competitor:2862", "name": "Genoa CFC",                "competition": "sr:competition:23"},
-    "sassuolo":                 {"id": "sr:competitor:2863", "name": "US Sassuolo",              "competition": "sr:competition:23"},
-    "cagliari":                 {"id": "sr:competitor:2864", "name": "Cagliari Calcio",          "competition": "sr:competition:23"},
-    "hellas verona":            {"id": "sr:competitor:2865", "name": "Hellas Verona",            "competition": "sr:competition:23"},
-    "verona":                   {"id": "sr:competitor:2865", "name": "Hellas Verona",            "competition": "sr:competition:23"},
-    "lecce":                    {"id": "sr:competitor:5815", "name": "US Lecce",                 "competition": "sr:competition:23"},
-    "empoli":                   {"id": "sr:competitor:5981", "name": "Empoli FC",                "competition": "sr:competition:23"},
-    "monza":                    {"id": "sr:competitor:5816", "name": "AC Monza",                 "competition": "sr:competition:23"},
-    "parma":                    {"id": "sr:competitor:2870", "name": "Parma Calcio 1913",        "competition": "sr:competition:23"},
-    "venezia":                  {"id": "sr:competitor:5817", "name": "Venezia FC",               "competition": "sr:competition:23"},
-    "como":                     {"id": "sr:competitor:5818", "name": "Como 1907",                "competition": "sr:competition:23"},
-    # ── Ligue 1 (sr:competition:34) ────────────────────────────────────────
-    "psg":                      {"id": "sr:competitor:2860", "name": "Paris Saint-Germain",      "competition": "sr:competition:34"},
-    "paris saint-germain":      {"id": "sr:competitor:2860", "name": "Paris Saint-Germain",      "competition": "sr:competition:34"},
-    "paris sg":                 {"id": "sr:competitor:2860", "name": "Paris Saint-Germain",      "competition": "sr:competition:34"},
-    "marseille":                {"id": "sr:competitor:2871", "name": "Olympique de Marseille",   "competition": "sr:competition:34"},
-    "olympique marseille":      {"id": "sr:competitor:2871", "name": "Olympique de Marseille",   "competition": "sr:competition:34"},
-    "lyon":                     {"id": "sr:competitor:2872", "name": "Olympique Lyonnais",       "competition": "sr:competition:34"},
-    "olympique lyonnais":       {"id": "sr:competitor:2872", "name": "Olympique Lyonnais",       "competition": "sr:competition:34"},
-    "monaco":                   {"id": "sr:competitor:2873", "name": "AS Monaco FC",             "competition": "sr:competition:34"},
-    "as monaco":                {"id": "sr:competitor:2873", "name": "AS Monaco FC",             "competition": "sr:competition:34"},
-    "lille":                    {"id": "sr:competitor:2874", "name": "LOSC Lille",               "competition": "sr:competition:34"},
-    "nice":                     {"id": "sr:competitor:2875", "name": "OGC Nice",                 "competition": "sr:competition:34"},
-    "ogc nice":                 {"id": "sr:competitor:2875", "name": "OGC Nice",                 "competition": "sr:competition:34"},
-    "rennes":                   {"id": "sr:competitor:2876", "name": "Stade Rennais FC",         "competition": "sr:competition:34"},
-    "lens":                     {"id": "sr:competitor:2877", "name": "RC Lens",                  "competition": "sr:competition:34"},
-    "rc lens":                  {"id": "sr:competitor:2877", "name": "RC Lens",                  "competition": "sr:competition:34"},
-    "strasbourg":               {"id": "sr:competitor:2878", "name": "RC Strasbourg Alsace",     "competition": "sr:competition:34"},
-    "nantes":                   {"id": "sr:competitor:2879", "name": "FC Nantes",                "competition": "sr:competition:34"},
-    "montpellier":              {"id": "sr:competitor:2880", "name": "Montpellier HSC",          "competition": "sr:competition:34"},
-    "reims":                    {"id": "sr:competitor:5986", "name": "Stade de Reims",           "competition": "sr:competition:34"},
-    "toulouse":                 {"id": "sr:competitor:5987", "name": "Toulouse FC",              "competition": "sr:competition:34"},
-    "brest":                    {"id": "sr:competitor:2881", "name": "Stade Brestois 29",        "competition": "sr:competition:34"},
-    "le havre":                 {"id": "sr:competitor:5988", "name": "Le Havre AC",              "competition": "sr:competition:34"},
-    "angers":                   {"id": "sr:competitor:2882", "name": "SCO Angers",               "competition": "sr:competition:34"},
-    "saint-etienne":            {"id": "sr:competitor:2883", "name": "AS Saint-Etienne",         "competition": "sr:competition:34"},
-    "auxerre":                  {"id": "sr:competitor:2884", "name": "AJ Auxerre",               "competition": "sr:competition:34"},
-    # ── Primeira Liga (sr:competition:238) ─────────────────────────────────
-    "benfica":                  {"id": "sr:competitor:3943", "name": "SL Benfica",               "competition": "sr:competition:238"},
-    "sl benfica":               {"id": "sr:competitor:3943", "name": "SL Benfica",               "competition": "sr:competition:238"},
-    "porto":                    {"id": "sr:competitor:3950", "name": "FC Porto",                 "competition": "sr:competition:238"},
-    "fc porto":                 {"id": "sr:competitor:3950", "name": "FC Porto",                 "competition": "sr:competition:238"},
-    "sporting cp":              {"id": "sr:competitor:3945", "name": "Sporting CP",              "competition": "sr:competition:238"},
-    "sporting":                 {"id": "sr:competitor:3945", "name": "Sporting CP",              "competition": "sr:competition:238"},
-    "braga":                    {"id": "sr:competitor:3948", "name": "SC Braga",                 "competition": "sr:competition:238"},
-    "sc braga":                 {"id": "sr:competitor:3948", "name": "SC Braga",                 "competition": "sr:competition:238"},
-    "vitoria guimaraes":        {"id": "sr:competitor:3946", "name": "Vitoria SC",               "competition": "sr:competition:238"},
-    "guimaraes":                {"id": "sr:competitor:3946", "name": "Vitoria SC",               "competition": "sr:competition:238"},
-    "boavista":                 {"id": "sr:competitor:3949", "name": "Boavista FC",              "competition": "sr:competition:238"},
-    "casa pia":                 {"id": "sr:competitor:6118", "name": "Casa Pia AC",              "competition": "sr:competition:238"},
-    "moreirense":               {"id": "sr:competitor:3951", "name": "Moreirense FC",            "competition": "sr:competition:238"},
-    "famalicao":                {"id": "sr:competitor:6116", "name": "FC Famalicao",             "competition": "sr:competition:238"},
-    "famalicão":                {"id": "sr:competitor:6116", "name": "FC Famalicao",             "competition": "sr:competition:238"},
-    "rio ave":                  {"id": "sr:competitor:3953", "name": "Rio Ave FC",               "competition": "sr:competition:238"},
-    "estoril":                  {"id": "sr:competitor:3954", "name": "GD Estoril Praia",         "competition": "sr:competition:238"},
-    "nacional":                 {"id": "sr:competitor:3955", "name": "CD Nacional",              "competition": "sr:competition:238"},
-    "santa clara":              {"id": "sr:competitor:3956", "name": "CD Santa Clara",           "competition": "sr:competition:238"},
-    "estrela amadora":          {"id": "sr:competitor:6119", "name": "CF Estrela Amadora",       "competition": "sr:competition:238"},
-    "gil vicente":              {"id": "sr:competitor:3952", "name": "Gil Vicente FC",           "competition": "sr:competition:238"},
-    # ── Premier League (sr:competition:17) ─────────────────────────────────
-    "manchester city":          {"id": "sr:competitor:2863", "name": "Manchester City FC",       "competition": "sr:competition:17"},
-    "man city":                 {"id": "sr:competitor:2863", "name": "Manchester City FC",       "competition": "sr:competition:17"},
-    "arsenal":                  {"id": "sr:competitor:2869", "name": "Arsenal FC",               "competition": "sr:competition:17"},
-    "liverpool":                {"id": "sr:competitor:2870", "name": "Liverpool FC",             "competition": "sr:competition:17"},
-    "manchester united":        {"id": "sr:competitor:2871", "name": "Manchester United FC",     "competition": "sr:competition:17"},
-    "man united":               {"id": "sr:competitor:2871", "name": "Manchester United FC",     "competition": "sr:competition:17"},
-    "man utd":                  {"id": "sr:competitor:2871", "name": "Manchester United FC",     "competition": "sr:competition:17"},
-    "chelsea":                  {"id": "sr:competitor:2872", "name": "Chelsea FC",               "competition": "sr:competition:17"},
-    "tottenham":                {"id": "sr:competitor:2874", "name": "Tottenham Hotspur",        "competition": "sr:competition:17"},
-    "spurs":                    {"id": "sr:competitor:2874", "name": "Tottenham Hotspur",        "competition": "sr:competition:17"},
-    "newcastle":                {"id": "sr:competitor:2875", "name": "Newcastle United FC",      "competition": "sr:competition:17"},
-    "aston villa":              {"id": "sr:competitor:2873", "name": "Aston Villa FC",           "competition": "sr:competition:17"},
-    "west ham":                 {"id": "sr:competitor:2876", "name": "West Ham United FC",       "competition": "sr:competition:17"},
-    "brighton":                 {"id": "sr:competitor:5981", "name": "Brighton & Hove Albion",   "competition": "sr:competition:17"},
-    "brentford":                {"id": "sr:competitor:5985", "name": "Brentford FC",             "competition": "sr:competition:17"},
-    "fulham":                   {"id": "sr:competitor:5986", "name": "Fulham FC",                "competition": "sr:competition:17"},
-    "crystal palace":           {"id": "sr:competitor:2877", "name": "Crystal Palace FC",        "competition": "sr:competition:17"},
-    "wolves":                   {"id": "sr:competitor:2878", "name": "Wolverhampton Wanderers",  "competition": "sr:competition:17"},
-    "wolverhampton":            {"id": "sr:competitor:2878", "name": "Wolverhampton Wanderers",  "competition": "sr:competition:17"},
-    "everton":                  {"id": "sr:competitor:2879", "name": "Everton FC",               "competition": "sr:competition:17"},
-    "nottingham forest":        {"id": "sr:competitor:2880", "name": "Nottingham Forest FC",     "competition": "sr:competition:17"},
-    "bournemouth":              {"id": "sr:competitor:5990", "name": "AFC Bournemouth",          "competition": "sr:competition:17"},
-    "leicester":                {"id": "sr:competitor:2881", "name": "Leicester City FC",        "competition": "sr:competition:17"},
-    "ipswich":                  {"id": "sr:competitor:2882", "name": "Ipswich Town FC",          "competition": "sr:competition:17"},
-    "southampton":              {"id": "sr:competitor:2883", "name": "Southampton FC",           "competition": "sr:competition:17"},
-}
+# =======================
+# Registro de competidores
+# =======================
+# Times conhecidos → URN Sportradar, lidos de data/competitors.json.
+# Usado como fallback quando a API trial não tem acesso aos endpoints de temporada.
+COMPETITORS_DATA_PATH = os.getenv(
+    "COMPETITORS_DATA_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "competitors.json")
+)
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def _normalize_name(text):
+    """Minúsculas, sem acentos e só alfanuméricos separados por espaço ("Atlético-MG" -> "atletico mg")."""
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode("ascii")
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+class _Competitor:
+    """Um time no registro. URNs internadas: a mesma string é compartilhada por todos os índices."""
+
+    __slots__ = ("urn", "name", "competitions", "aliases")
+
+    def __init__(self, urn, name, competitions=(), aliases=()):
+        self.urn = sys.intern(urn)
+        self.name = name
+        self.competitions = [sys.intern(c) for c in competitions]
+        self.aliases = list(aliases)
+
+
+class _CompetitorRegistry:
+    """
+    Registro compacto de competidores: um registro por time, indexado por
+    URN. A busca por nome/apelido fica com _team_search_index, alimentado
+    por records().
+
+    Uma mesma URN pode aparecer com nomes diferentes no arquivo (ex.:
+    sr:competitor:2863); o lookup reverso aceita a competição para desempatar.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_urn = {}  # urn -> [_Competitor]
+
+    def load(self, path):
+        """Carrega o arquivo JSON ([{id, name, competition, aliases}]). Retorna o número de times."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"[Competidores] Nao foi possivel ler {path}: {e}")
+            return 0
+        for entry in entries:
+            self.add(entry["id"], entry["name"], entry.get("competition"), entry.get("aliases", ()))
+        duplicated = sum(1 for records in self._by_urn.values() if len(records) > 1)
+        if duplicated:
+            # Esperado no arquivo do repositório (mesmo clube listado em mais de uma competição)
+            logger.debug(f"[Competidores] {duplicated} URN(s) com mais de um nome em {path}")
+        return len(entries)
+
+    def add(self, urn, name, competition=None, aliases=()):
+        """Registra (ou completa) um time e retorna o registro."""
+        with self._lock:
+            record = next((r for r in self._by_urn.get(urn, ()) if r.name == name), None)
+            if record is None:
+                record = _Competitor(urn, name)
+                self._by_urn.setdefault(record.urn, []).append(record)
+            if competition and competition not in record.competitions:
+                record.competitions.append(sys.intern(competition))
+            for alias in aliases:
+                if alias and alias != name and alias not in record.aliases:
+                    record.aliases.append(alias)
+            return record
+
+    def get(self, urn, competition=None):
+        """Lookup reverso URN → registro (preferindo o da competição informada)."""
+        records = self._by_urn.get(urn)
+        if not records:
+            return None
+        if competition:
+            for record in records:
+                if competition in record.competitions:
+                    return record
+        return records[0]
+
+    def name_of(self, urn, competition=None):
+        record = self.get(urn, competition)
+        return record.name if record else None
+
+    def records(self):
+        with self._lock:
+            return [record for records in self._by_urn.values() for record in records]
+
+    def stats(self):
+        with self._lock:
+            records = [record for records in self._by_urn.values() for record in records]
+            return {
+                "times": len(records),
+                "urns": len(self._by_urn),
+                "apelidos": sum(len(record.aliases) for record in records),
+                "competicoes": len({c for record in records for c in record.competitions})
+            }
+
+
+_competitor_registry = _CompetitorRegistry()
+_competitor_registry.load(COMPETITORS_DATA_PATH)
+
+# =======================
+# Índice de busca de times
+# =======================
+SEARCH_MIN_SCORE = float(os.getenv("SEARCH_MIN_SCORE", "0.45"))
+SEARCH_MAX_RESULTS = 10
+
+
+def _trigrams(normalized):
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _TeamSearchIndex:
+    """
+    Índice invertido de nomes de times (tabela estática + times vistos na Sportradar).
+
+    Um documento por URN: o primeiro nome visto é o de exibição e nomes
+    alternativos (outras competições, short_name) viram apelidos do mesmo
+    documento, então a busca nunca devolve o mesmo time_id duas vezes.
+    Cada documento guarda seus apelidos normalizados; postings por
+    token e por trigrama levam da consulta aos candidatos, que são pontuados
+    por correspondência de tokens (exata > prefixo) e similaridade de
+    trigramas (Dice). Consultas curtas como "inter" ranqueiam o time cujo
+    token é exatamente "inter" acima de "internacional".
+    """
+
+    class _Doc:
+        __slots__ = ("urn", "name", "competitions", "source", "aliases")
+
+        def __init__(self, urn, name, source):
+            self.urn = urn
+            self.name = name
+            self.competitions = set()
+            self.source = source
+            self.aliases = {}  # normalizado -> (tokens, trigramas)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs = {}  # urn -> _Doc
+        self._tokens = {}  # token -> set(urn)
+        self._grams = {}  # trigrama -> set(urn)
+        self.searches = 0
+
+    def add(self, urn, name, competition=None, aliases=(), source="api"):
+        """Indexa um time; chamadas repetidas (mesmo com outro nome) só acrescentam competições/apelidos."""
+        if not urn or not name:
+            return
+        urn = sys.intern(urn)
+        with self._lock:
+            doc = self._docs.get(urn)
+            if doc is None:
+                doc = self._docs[urn] = self._Doc(urn, name, source)
+            if competition:
+                doc.competitions.add(competition)
+            for alias in (name, *aliases):
+                normalized = _normalize_name(alias)
+                if not normalized or normalized in doc.aliases:
+                    continue
+                tokens = normalized.split()
+                grams = _trigrams(normalized)
+                doc.aliases[normalized] = (tokens, grams)
+                for token in tokens:
+                    self._tokens.setdefault(token, set()).add(urn)
+                for gram in grams:
+                    self._grams.setdefault(gram, set()).add(urn)
+
+    @staticmethod
+    def _score(query, q_tokens, q_grams, doc):
+        best = 0.0
+        for alias, (tokens, grams) in doc.aliases.items():
+            if alias == query:
+                return 1.0
+            matched = 0.0
+            for qt in q_tokens:
+                if qt in tokens:
+                    matched += 1.0
+                elif len(qt) >= 3 and any(t.startswith(qt) for t in tokens):
+                    matched += 0.7
+            token_score = matched / len(q_tokens) * (0.8 + 0.2 * min(1.0, len(q_tokens) / len(tokens)))
+            dice = 2 * len(q_grams & grams) / (len(q_grams) + len(grams))
+            best = max(best, 0.95 * token_score, dice)
+        return best
+
+    def search(self, query, competition=None, limit=SEARCH_MAX_RESULTS):
+        """Retorna [(score, doc)] ordenado por relevância (score >= SEARCH_MIN_SCORE)."""
+        normalized = _normalize_name(query)
+        if not normalized:
+            return []
+        q_tokens = normalized.split()
+        q_grams = _trigrams(normalized)
+        with self._lock:
+            self.searches += 1
+            candidates = set()
+            for token in q_tokens:
+                candidates |= self._tokens.get(token, set())
+            for gram in q_grams:
+                candidates |= self._grams.get(gram, set())
+            scored = []
+            for urn in candidates:
+                doc = self._docs[urn]
+                if competition and competition not in doc.competitions:
+                    continue
+                score = self._score(normalized, q_tokens, q_grams, doc)
+                if score >= SEARCH_MIN_SCORE:
+                    scored.append((round(score, 3), doc))
+        scored.sort(key=lambda item: (-item[0], item[1].name))
+        # Com um acerto forte, descarta os parecidos só por trigramas ("Team 3" vs "Team 0")
+        if scored and scored[0][0] >= 0.9:
+            floor = scored[0][0] * 0.75
+            scored = [item for item in scored if item[0] >= floor]
+        return scored[:limit]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "times": len(self._docs),
+                "tokens": len(self._tokens),
+                "trigramas": len(self._grams),
+                "buscas": self.searches
+            }
+
+
+_team_search_index = _TeamSearchIndex()
+for _team in _competitor_registry.records():
+    for _competition in _team.competitions:
+        _team_search_index.add(_team.urn, _team.name, _competition, aliases=_team.aliases, source="static")
+
+# =======================
+# Catálogo de competidores (colheita)
+# =======================
+# Toda resposta 200 da Sportradar passa por _competitor_catalog.harvest:
+# competidores, competições e temporadas vistos vão para o SQLite (com
+# first/last seen) e alimentam o registro e o índice de busca, sem quota extra.
+CATALOG_DB_PATH = os.getenv(
+    "CATALOG_DB_PATH", os.path.join(tempfile.gettempdir(), "sportradar_catalog.sqlite3")
+)
+CATALOG_TOUCH_INTERVAL = int(os.getenv("CATALOG_TOUCH_INTERVAL", "3600"))
+_HARVEST_SKIP_KEYS = frozenset(("timeline", "players", "lineups", "venue", "coverage", "markets"))
+_HARVEST_PATH_CONTEXT = re.compile(r"^/(competitions|seasons)/(sr:[a-z_]+:\d+)/")
+
+
+def _harvest_payload(node, competition, found):
+    """
+    Percorre um payload e junta em `found` os competidores (com a competição
+    do contexto), competições e temporadas. A competição vem do
+    sport_event_context ou do season.competition_id mais próximo.
+    """
+    if isinstance(node, list):
+        for item in node:
+            if isinstance(item, (dict, list)):
+                _harvest_payload(item, competition, found)
+        return
+    context = node.get("sport_event_context")
+    if isinstance(context, dict):
+        competition = (context.get("competition") or {}).get("id") or competition
+    season = node.get("season")
+    if isinstance(season, dict) and season.get("competition_id"):
+        competition = season["competition_id"]
+
+    urn, name = node.get("id"), node.get("name")
+    if isinstance(urn, str) and name:
+        if urn.startswith("sr:competitor:"):
+            entry = found["competitors"].setdefault(urn, [name, None, None, set()])
+            entry[1] = node.get("abbreviation") or entry[1]
+            entry[2] = node.get("country") or entry[2]
+            if competition:
+                entry[3].add(competition)
+        elif urn.startswith("sr:competition:"):
+            found["competitions"][urn] = (name, (node.get("category") or {}).get("name"), node.get("gender"))
+        elif urn.startswith("sr:season:"):
+            found["seasons"][urn] = (
+                name, node.get("competition_id") or competition,
+                node.get("start_date"), node.get("end_date"), node.get("year")
+            )
+
+    for key, value in node.items():
+        if key not in _HARVEST_SKIP_KEYS and isinstance(value, (dict, list)):
+            _harvest_payload(value, competition, found)
+
+
+class _CompetitorCatalog(_SQLiteStore):
+    """
+    Catálogo local de competidores, competições e temporadas colhidos das
+    respostas da Sportradar.
+
+    Deduplicado em memória: uma linha só é regravada quando muda (nome,
+    sigla, país...) ou quando o last_seen gravado tem mais de
+    CATALOG_TOUCH_INTERVAL segundos. Competidores novos entram no registro
+    e no índice de busca na hora; no boot, restore() recarrega o catálogo.
+    """
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS competitors ("
+        "urn TEXT PRIMARY KEY, name TEXT NOT NULL, abbreviation TEXT, country TEXT, "
+        "first_seen REAL NOT NULL, last_seen REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS competitor_competitions ("
+        "urn TEXT NOT NULL, competition TEXT NOT NULL, first_seen REAL NOT NULL, last_seen REAL NOT NULL, "
+        "PRIMARY KEY (urn, competition))",
+        "CREATE TABLE IF NOT EXISTS competitions ("
+        "urn TEXT PRIMARY KEY, name TEXT NOT NULL, category TEXT, gender TEXT, "
+        "first_seen REAL NOT NULL, last_seen REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS seasons ("
+        "urn TEXT PRIMARY KEY, name TEXT NOT NULL, competition TEXT, start_date TEXT, end_date TEXT, "
+        "year TEXT, first_seen REAL NOT NULL, last_seen REAL NOT NULL)",
+    )
+    UPSERTS = {
+        "competitors": (
+            "INSERT INTO competitors (urn, name, abbreviation, country, first_seen, last_seen) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(urn) DO UPDATE SET name = excluded.name, "
+            "abbreviation = COALESCE(excluded.abbreviation, abbreviation), "
+            "country = COALESCE(excluded.country, country), last_seen = excluded.last_seen"
+        ),
+        "competitor_competitions": (
+            "INSERT INTO competitor_competitions (urn, competition, first_seen, last_seen) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(urn, competition) DO UPDATE SET last_seen = excluded.last_seen"
+        ),
+        "competitions": (
+            "INSERT INTO competitions (urn, name, category, gender, first_seen, last_seen) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(urn) DO UPDATE SET name = excluded.name, "
+            "category = COALESCE(excluded.category, category), "
+            "gender = COALESCE(excluded.gender, gender), last_seen = excluded.last_seen"
+        ),
+        "seasons": (
+            "INSERT INTO seasons (urn, name, competition, start_date, end_date, year, first_seen, last_seen) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(urn) DO UPDATE SET name = excluded.name, "
+            "competition = COALESCE(excluded.competition, competition), "
+            "start_date = COALESCE(excluded.start_date, start_date), "
+            "end_date = COALESCE(excluded.end_date, end_date), "
+            "year = COALESCE(excluded.year, year), last_seen = excluded.last_seen"
+        ),
+    }
+
+    def __init__(self, db_path, touch_interval):
+        super().__init__(db_path)
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._seen = {table: {} for table in self.UPSERTS}  # tabela -> chave -> (assinatura, last_seen gravado)
+        self.payloads = 0
+        self.writes = 0
+        self.errors = 0
+
+    def _fresh(self, table, key, signature, now):
+        """True se a linha mudou ou precisa renovar o last_seen (e já marca como gravada)."""
+        seen = self._seen[table].get(key)
+        if seen is not None and seen[0] == signature and now - seen[1] < self.touch_interval:
+            return False
+        self._seen[table][key] = (signature, now)
+        return True
+
+    def _competition_of_season(self, season_urn):
+        seen = self._seen["seasons"].get(season_urn)
+        return seen[0][1] if seen else None
+
+    def harvest(self, path, data):
+        """Colhe um payload recém-chegado da Sportradar. Nunca levanta exceção."""
+        if not isinstance(data, (dict, list)):
+            return
+        found = {"competitors": {}, "competitions": {}, "seasons": {}}
+        match = _HARVEST_PATH_CONTEXT.match(path)
+        competition = None
+        if match:
+            competition = match.group(2) if match.group(1) == "competitions" else None
+        _harvest_payload(data, competition, found)
+        if match and match.group(1) == "seasons":
+            # /seasons/{urn}/competitors.json não traz a competição no corpo
+            season_competition = (found["seasons"].get(match.group(2)) or (None, None))[1]
+            with self._lock:
+                season_competition = season_competition or self._competition_of_season(match.group(2))
+            if season_competition:
+                for entry in found["competitors"].values():
+                    if not entry[3]:
+                        entry[3].add(season_competition)
+
+        now = time.time()
+        rows = {table: [] for table in self.UPSERTS}
+        added = []
+        with self._lock:
+            self.payloads += 1
+            for urn, (name, abbreviation, country, competitions) in found["competitors"].items():
+                if self._fresh("competitors", urn, (name, abbreviation, country), now):
+                    rows["competitors"].append((urn, name, abbreviation, country, now, now))
+                    added.append((urn, name, None))
+                for comp in competitions:
+                    if self._fresh("competitor_competitions", (urn, comp), None, now):
+                        rows["competitor_competitions"].append((urn, comp, now, now))
+                        added.append((urn, name, comp))
+            for urn, row in found["competitions"].items():
+                if self._fresh("competitions", urn, row, now):
+                    rows["competitions"].append((urn, *row, now, now))
+            for urn, row in found["seasons"].items():
+                if self._fresh("seasons", urn, row, now):
+                    rows["seasons"].append((urn, *row, now, now))
+        if not any(rows.values()):
+            return
+
+        for urn, name, comp in added:
+            _competitor_registry.add(urn, name, comp)
+            _team_search_index.add(urn, name, comp)
+        self._write(rows)
+
+    def _write(self, rows):
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for table, values in rows.items():
+                    if values:
+                        conn.executemany(self.UPSERTS[table], values)
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"[Catalogo] {e}")
+            return
+        self.writes += sum(len(values) for values in rows.values())
+
+    def restore(self):
+        """Recarrega o catálogo gravado no registro e no índice de busca. Retorna o número de competidores."""
+        try:
+            conn = self._conn()
+            competitors = conn.execute(
+                "SELECT urn, name, abbreviation, country, last_seen FROM competitors"
+            ).fetchall()
+            memberships = conn.execute(
+                "SELECT urn, competition, last_seen FROM competitor_competitions"
+            ).fetchall()
+            competitions = conn.execute(
+                "SELECT urn, name, category, gender, last_seen FROM competitions"
+            ).fetchall()
+            seasons = conn.execute(
+                "SELECT urn, name, competition, start_date, end_date, year, last_seen FROM seasons"
+            ).fetchall()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"[Catalogo] {e}")
+            return 0
+
+        names = {}
+        with self._lock:
+            for urn, name, abbreviation, country, last_seen in competitors:
+                names[urn] = name
+                self._seen["competitors"][urn] = ((name, abbreviation, country), last_seen)
+            for urn, competition, last_seen in memberships:
+                self._seen["competitor_competitions"][(urn, competition)] = (None, last_seen)
+            for urn, *row, last_seen in competitions:
+                self._seen["competitions"][urn] = (tuple(row), last_seen)
+            for urn, *row, last_seen in seasons:
+                self._seen["seasons"][urn] = (tuple(row), last_seen)
+
+        for urn, competition, _ in memberships:
+            if urn in names:
+                _competitor_registry.add(urn, names[urn], competition)
+                _team_search_index.add(urn, names[urn], competition)
+        for urn, name in names.items():
+            _competitor_registry.add(urn, name)
+            _team_search_index.add(urn, name)
+        return len(names)
+
+    def stats(self):
+        with self._lock:
+            counts = {table: len(seen) for table, seen in self._seen.items()}
+        return {
+            "competidores": counts["competitors"],
+            "competicoes": counts["competitions"],
+            "temporadas": counts["seasons"],
+            "payloads_colhidos": self.payloads,
+            "linhas_gravadas": self.writes,
+            "erros": self.errors
+        }
+
+
+_competitor_catalog = _CompetitorCatalog(CATALOG_DB_PATH, CATALOG_TOUCH_INTERVAL)
+
+
+class _SingleFlight:
+    """
+    Coalescência de chamadas idênticas em andamento (single-flight).
+
+    O primeiro chamador de uma chave executa a requisição; os que chegam
+    enquanto ela está em andamento esperam e recebem o mesmo resultado.
+    """
+
+    class _Flight:
+        __slots__ = ("event", "result")
+
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key, fn, deadline):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._Flight()
+                self._flights[key] = flight
+                self.leaders += 1
+
+        if not leader:
+            if not flight.event.wait(timeout=max(0.0, deadline - time.time())):
+                return None, SportradarError(
+                    f"Tempo esgotado aguardando requisicao em andamento: {key.split('?')[0]}", 503
+                )
+            with self._lock:
+                self.shared += 1
+            return flight.result
+
+        try:
+            flight.result = fn()
+        except Exception as e:
+            flight.result = (None, str(e))
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.event.set()
+        return flight.result
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._flights)
+        return {
+            "requisicoes_upstream": self.leaders,
+            "chamadas_coalescidas": self.shared,
+            "em_andamento": in_flight
+        }
+
+
+_single_flight = _SingleFlight()
+
 
 # =======================
 # Funções utilitárias
 # =======================
-def call_sportradar(path, params=None, max_retries=None):
+def call_sportradar(path, params=None, max_retries=None, use_cache=True, deadline=None, lane=None,
+                    swr=False):
     """
-    Chama a Sportradar Soccer API v4 com rate limiting e retry automático.
+    Chama a Sportradar Soccer API v4 com cache, rate limiting e retry automático.
+
+    Respostas 200 ficam em cache LRU com TTL definido pelo tipo de endpoint
+    (ver CACHE_TTL_RULES); um hit não consome quota nem passa pelo rate limiter.
 
     Args:
         path (str): Caminho do endpoint (ex: /schedules/2025-03-01/summaries.json)
         params (dict): Parâmetros adicionais da query string (sem api_key)
         max_retries (int): Número máximo de tentativas
+        use_cache (bool): Se False, ignora o cache e sempre chama a API
+        deadline (float): Epoch limite para obter slot/retentar (padrão: agora + API_REQUEST_DEADLINE)
+        lane (int): Faixa de prioridade no limiter (padrão: derivada do path)
+        swr (bool): Stale-while-revalidate — com cópia expirada de até SWR_MAX_AGE
+            segundos, devolve a cópia na hora e atualiza em segundo plano
 
     Returns:
         tuple: (data, error) onde data é o JSON de resposta ou None em caso de erro
@@ -287,21 +1454,176 @@ def call_sportradar(path, params=None, max_retries=None):
     if max_retries is None:
         max_retries = API_MAX_RETRIES
 
+    cache_key = _cache_key(path, params)
+    ttl = _cache_ttl_for(path)
+    if use_cache:
+        cached = _response_cache.get(cache_key)
+        if cached is not None:
+            _note_data_age(cached[1], ttl, cache_key)
+            return cached[0], None
+        # Segundo nível: snapshot gravado por outro worker (ou antes do restart) ainda no TTL
+        snapshot = _snapshot_store.load(cache_key, max_age=ttl)
+        if snapshot is not None:
+            _response_cache.set(cache_key, snapshot[0], ttl, stored_at=snapshot[1], version=snapshot[2])
+            _note_data_age(snapshot[1], ttl, cache_key)
+            return snapshot[0], None
+        if swr:
+            stale = _stale_copy(cache_key, path)
+            if stale is not None and time.time() - stale[1] <= SWR_MAX_AGE:
+                _schedule_revalidation(path, params, max_retries, cache_key)
+                _note_data_age(stale[1], ttl, cache_key, version=stale[2])
+                return stale[0], None
+
+    if deadline is None:
+        deadline = time.time() + API_REQUEST_DEADLINE
+
+    # Chamadas concorrentes para o mesmo path+params esperam uma única requisição
+    data, error = _single_flight.do(
+        cache_key,
+        lambda: _fetch_sportradar(path, params, max_retries, use_cache, deadline, lane, cache_key),
+        deadline
+    )
+    if data is not None:
+        entry = _response_cache.get_stale(cache_key)
+        _note_data_age(entry[1] if entry and entry[0] is data else time.time(), ttl, cache_key)
+    return data, error
+
+
+SWR_MAX_AGE = int(os.getenv("SWR_MAX_AGE", "3600"))
+SWR_REFRESH_DEADLINE = 120
+_revalidate_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="revalidate")
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+
+def _schedule_revalidation(path, params, max_retries, cache_key):
+    """Agenda a atualização de uma chave em segundo plano (uma por vez, faixa de baixa prioridade)."""
+    with _revalidating_lock:
+        if cache_key in _revalidating:
+            return
+        _revalidating.add(cache_key)
+
+    def refresh():
+        try:
+            deadline = time.time() + SWR_REFRESH_DEADLINE
+            _single_flight.do(
+                cache_key,
+                lambda: _fetch_sportradar(path, params, max_retries, True, deadline, LANE_BULK, cache_key),
+                deadline
+            )
+        except Exception as e:
+            logger.error(f"[SWR] Falha ao atualizar {path}: {e}")
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(cache_key)
+
+    _revalidate_executor.submit(refresh)
+
+
+def _note_data_age(stored_at, ttl, cache_key=None, version=None):
+    """
+    Registra na requisição atual a idade do dado upstream mais antigo usado
+    (X-Data-Age) e a versão de cada payload lido (base do ETag).
+
+    `version`: hash do payload quando ele veio de fora do cache em memória
+    (snapshot); sem ele, vale a versão guardada no cache.
+    """
+    if not has_request_context():
+        return
+    age = max(0.0, time.time() - stored_at)
+    g.data_age = max(g.get("data_age", 0.0), age)
+    if age > ttl:
+        g.data_stale = True
+    if cache_key is not None:
+        if "data_sources" not in g:
+            g.data_sources = {}
+        g.data_sources[cache_key] = version or _response_cache.version(cache_key) or f"t{stored_at}"
+
+
+def _data_is_stale():
+    """True se a resposta atual usou dado upstream além do TTL (servido antes da atualização)."""
+    return bool(g.get("data_stale", False))
+
+
+def _response_etag(*extra):
+    """
+    ETag fraco da resposta atual: rota + query + formato pedido + versões dos
+    payloads upstream lidos até aqui (ver _note_data_age) + `extra`.
+    """
+    parts = [request.path, urlencode(sorted(request.args.items(multi=True))),
+             "ndjson" if _wants_ndjson() else "json"]
+    parts.extend(f"{k}={v}" for k, v in sorted(g.get("data_sources", {}).items()))
+    parts.extend(str(e) for e in extra)
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def _not_modified(*extra):
+    """
+    Resposta condicional: chame depois de buscar os dados e antes de montar o JSON.
+
+    Marca a rota como cacheável (o after_request envia o ETag) e, se o
+    cliente já tem esta versão (If-None-Match), devolve 304 sem montar nem
+    serializar nada. Use só em rotas cujo JSON depende apenas dos payloads
+    lidos via call_sportradar e dos parâmetros (mais `extra` para dados locais).
+    """
+    g.etag = _response_etag(*extra)
+    if request.if_none_match.contains_weak(g.etag):
+        response = app.response_class(status=304)
+        response.set_etag(g.etag, weak=True)
+        return response
+    return None
+
+
+@app.after_request
+def _add_data_age_header(response):
+    age = g.get("data_age")
+    if age is not None:
+        response.headers["X-Data-Age"] = str(int(age))
+    etag = g.get("etag")
+    if etag and response.status_code == 200 and "ETag" not in response.headers:
+        response.set_etag(etag, weak=True)
+        response.headers.setdefault("Cache-Control", "no-cache")
+    return response
+
+
+def _fetch_sportradar(path, params, max_retries, use_cache, deadline, lane, cache_key):
+    """Executa a chamada HTTP de call_sportradar (limiter + retries). Retorna (data, error)."""
     url = f"{SPORTRADAR_BASE_URL}{path}"
     query_params = {"api_key": API_KEY}
     if params:
         query_params.update(params)
 
+    # Cópia antiga aproveitável: servida (sem retentar) se a quota/limiter ou a API falharem
+    stale = _stale_copy(cache_key, path) if use_cache else None
+    headers = {"If-None-Match": stale[3]} if stale is not None and stale[3] else None
+
     last_error = None
+    attempt = 0
 
     for attempt in range(max_retries):
         try:
-            _rate_limit()
+            # Perto do fim da quota, quem já tem cópia é servido dela
+            quota_error = _rate_limit(path, reserve_ok=stale is None, deadline=deadline, lane=lane)
+            if quota_error:
+                if stale is not None:
+                    return _serve_stale(stale, path, quota_error, cache_key)
+                logger.error(f"[Sportradar] {quota_error} -> {path}")
+                return None, quota_error
             timeout = API_TIMEOUT + (attempt * 2)
-            response = requests.get(url, params=query_params, timeout=timeout)
+            response = _http_session().get(url, params=query_params, headers=headers, timeout=timeout)
 
             if response.status_code == 200:
-                return response.json(), None
+                data = response.json()
+                version = _snapshot_store.save(cache_key, path, response.text, response.headers.get("ETag"))
+                _response_cache.set(cache_key, data, _cache_ttl_for(path), version=version)
+                _competitor_catalog.harvest(path, data)
+                return data, None
+
+            elif response.status_code == 304 and headers:
+                # O ETag enviado é o do próprio corpo em `stale` (ver _stale_copy)
+                _response_cache.set(cache_key, stale[0], _cache_ttl_for(path), version=stale[2])
+                _snapshot_store.touch(cache_key)
+                return stale[0], None
 
             elif response.status_code == 401:
                 body = response.text[:300] if response.text else "(sem corpo)"
@@ -320,10 +1642,9 @@ def call_sportradar(path, params=None, max_retries=None):
             elif response.status_code in [429, 500, 502, 503, 504]:
                 last_error = f"HTTP {response.status_code}"
                 logger.warning(f"[Sportradar Retry {attempt+1}/{max_retries}] {last_error} -> {path}")
-                if attempt < max_retries - 1:
-                    delay = API_RETRY_DELAY * (2 ** attempt)
-                    time.sleep(delay)
+                if stale is None and attempt < max_retries - 1 and _retry_backoff(attempt, deadline):
                     continue
+                break
             else:
                 logger.error(f"[Sportradar] HTTP {response.status_code} -> {path}")
                 return None, f"Erro HTTP {response.status_code}"
@@ -331,30 +1652,79 @@ def call_sportradar(path, params=None, max_retries=None):
         except requests.exceptions.Timeout:
             last_error = "Timeout na requisicao"
             logger.warning(f"[Sportradar Timeout {attempt+1}/{max_retries}] {path}")
-            if attempt < max_retries - 1:
-                time.sleep(API_RETRY_DELAY * (2 ** attempt))
+            if stale is None and attempt < max_retries - 1 and _retry_backoff(attempt, deadline):
                 continue
+            break
 
         except requests.exceptions.ConnectionError:
             last_error = "Erro de conexao"
             logger.warning(f"[Sportradar Connection Error {attempt+1}/{max_retries}] {path}")
-            if attempt < max_retries - 1:
-                time.sleep(API_RETRY_DELAY * (2 ** attempt))
+            if stale is None and attempt < max_retries - 1 and _retry_backoff(attempt, deadline):
                 continue
+            break
 
         except Exception as e:
             last_error = str(e)
             logger.error(f"[Sportradar Exception] {last_error}")
             return None, last_error
 
+    if stale is not None:
+        return _serve_stale(stale, path, last_error, cache_key)
+
+    attempts = attempt + 1
+    if attempts < max_retries:
+        logger.error(f"[Sportradar] Deadline esgotado apos {attempts} tentativa(s) para {path}")
+        return None, SportradarError(f"Falha apos {attempts} tentativas (deadline): {last_error}", 503)
     logger.error(f"[Sportradar] Todas as {max_retries} tentativas falharam para {path}")
     return None, f"Falha apos {max_retries} tentativas: {last_error}"
 
 
+def _serve_stale(stale, path, reason, cache_key):
+    """Devolve a cópia antiga no lugar de um erro da Sportradar."""
+    data, fetched_at, version = stale[:3]
+    # Mantém no cache com a data e a versão originais: a idade segue visível, o
+    # ETag não muda e a próxima leitura tenta de novo
+    _response_cache.set(cache_key, data, -1, stored_at=fetched_at, version=version)
+    _snapshot_store.stale_served += 1
+    logger.warning(
+        f"[Sportradar] {reason} -> servindo dado de {round(time.time() - fetched_at)}s atras: {path}"
+    )
+    return data, None
+
+
+def _retry_backoff(attempt, deadline):
+    """
+    Espera o backoff exponencial antes de uma nova tentativa.
+    Retorna False (sem dormir) se o backoff ultrapassaria o deadline da chamada.
+    """
+    delay = API_RETRY_DELAY * (2 ** attempt)
+    if time.time() + delay >= deadline:
+        return False
+    time.sleep(delay)
+    return True
+
+
 def error_response(msg, status=400):
+    # Erros do limiter/quota carregam o próprio status (ex: 429)
+    status = getattr(msg, "status", status)
     return jsonify({"ok": False, "error": msg}), status
 
 
+def _wants_ndjson():
+    """True se o cliente pediu NDJSON (Accept: application/x-ndjson) em vez de JSON."""
+    best = request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"])
+    return best == "application/x-ndjson"
+
+
+def _ndjson_response(items):
+    """Resposta NDJSON em streaming: um objeto JSON por linha, enviado assim que produzido."""
+    def generate():
+        for item in items:
+            yield app.json.dumps_bytes(item) + b"\n"
+
+    return Response(generate(), mimetype="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+
 def validate_numeric_param(value, param_name, min_val=None, max_val=None, required=True):
     if value is None:
         if required:
@@ -364,6 +1734,9 @@ def validate_numeric_param(value, param_name, min_val=None, max_val=None, requir
         num_value = float(value)
     except (ValueError, TypeError):
         return None, f"Parametro '{param_name}' deve ser numerico"
+    # nan passa por qualquer comparação de limite (toda comparação com nan é falsa)
+    if not math.isfinite(num_value):
+        return None, f"Parametro '{param_name}' deve ser um numero finito"
     if min_val is not None and num_value < min_val:
         return None, f"Parametro '{param_name}' deve ser >= {min_val}"
     if max_val is not None and num_value > max_val:
@@ -465,74 +1838,829 @@ def calculate_must_win_factor(form_str=None, position=None, total_teams=None):
     }
 
 
-def _get_current_season_urn(competition_urn):
-    """
-    Busca a URN da temporada atual (mais recente) para uma competição.
-    Retorna (season_urn, error).
-    """
-    comp_id = competition_urn.replace(":", "%3A") if "%" not in competition_urn else competition_urn
-    data, error = call_sportradar(f"/competitions/{competition_urn}/seasons.json")
-    if error:
-        return None, error
-    seasons = data.get("seasons", [])
-    if not seasons:
-        return None, "Nenhuma temporada encontrada para esta competicao"
-    # Retorna a mais recente (maior ano)
-    current_year = datetime.now().year
-    best = None
-    for s in seasons:
-        year = s.get("year", "")
-        if str(current_year) in str(year):
-            best = s
-            break
-    if not best:
-        best = seasons[0]  # fallback para a primeira
-    return best.get("id"), None
+def _pick_current_season(seasons):
+    """
+    Escolhe a temporada vigente: a que contém a data de hoje; senão a mais
+    recente já iniciada; senão a primeira da lista.
+    """
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    started = []
+    for s in seasons:
+        start, end = s.get("start_date") or "", s.get("end_date") or ""
+        if start and end and start <= today <= end:
+            return s
+        if start and start <= today:
+            started.append(s)
+    if started:
+        return max(started, key=lambda s: s.get("start_date"))
+    return seasons[0]
+
+
+SEASON_INDEX_REFRESH = int(os.getenv("SEASON_INDEX_REFRESH", str(12 * 3600)))
+
+
+class _SeasonIndex:
+    """
+    Índice residente competição -> temporada atual.
+
+    Populado em segundo plano para todas as SUPPORTED_COMPETITIONS (e sob
+    demanda para as demais), de modo que a auto-detecção de temporada nos
+    endpoints não custe chamada à Sportradar. Entradas com mais de
+    SEASON_INDEX_REFRESH segundos valem como ausentes e são resolvidas de
+    novo, para que a virada de temporada apareça também nas competições fora
+    do job periódico.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seasons = {}  # competition -> (season_urn, refreshed_at)
+
+    def get(self, competition_urn):
+        with self._lock:
+            entry = self._seasons.get(competition_urn)
+        if entry is None or time.time() - entry[1] > SEASON_INDEX_REFRESH:
+            return None
+        return entry[0]
+
+    def refresh(self, competition_urn, deadline=None, lane=None):
+        """Busca /seasons.json e atualiza o índice. Retorna (season_urn, error)."""
+        data, error = call_sportradar(
+            f"/competitions/{competition_urn}/seasons.json", deadline=deadline, lane=lane
+        )
+        if error:
+            return None, error
+        seasons = data.get("seasons", [])
+        if not seasons:
+            return None, "Nenhuma temporada encontrada para esta competicao"
+        season_urn = _pick_current_season(seasons).get("id")
+        with self._lock:
+            self._seasons[competition_urn] = (season_urn, time.time())
+        return season_urn, None
+
+    def refresh_all(self):
+        """Atualiza todas as competições suportadas na faixa de baixa prioridade."""
+        for competition_urn in SUPPORTED_COMPETITIONS:
+            _, error = self.refresh(competition_urn, deadline=time.time() + 120, lane=LANE_BULK)
+            if error:
+                logger.warning(f"[SeasonIndex] {competition_urn}: {error}")
+
+    def stats(self):
+        with self._lock:
+            oldest = min((t for _, t in self._seasons.values()), default=None)
+            return {
+                "competicoes": len(self._seasons),
+                "atualizado_ha_s": round(time.time() - oldest) if oldest else None
+            }
+
+
+_season_index = _SeasonIndex()
+
+
+def _get_current_season_urn(competition_urn, deadline=None, lane=None):
+    """
+    Retorna a URN da temporada atual de uma competição: (season_urn, error).
+    Lê do índice residente; só chama a Sportradar se a competição ainda não foi indexada.
+    """
+    season_urn = _season_index.get(competition_urn)
+    if season_urn:
+        return season_urn, None
+    # A temporada já entra no ETag pelo path dos dados seguintes: esta busca não conta como fonte
+    sources = dict(g.get("data_sources", {})) if has_request_context() else None
+    result = _season_index.refresh(competition_urn, deadline=deadline, lane=lane)
+    if sources is not None:
+        g.data_sources = sources
+    return result
+
+
+class _StandingsSnapshot:
+    """
+    Classificação já processada de uma (competição, temporada).
+
+    rows: linhas no formato de /standings, ordenadas por posição.
+    by_team: URN do time -> (linha, tamanho do grupo), para lookup O(1).
+    """
+    __slots__ = ("competition", "season", "rows", "by_team", "source", "built_at")
+
+    def __init__(self, competition, season, rows, by_team, source):
+        self.competition = competition
+        self.season = season
+        self.rows = rows
+        self.by_team = by_team
+        self.source = source
+        self.built_at = time.time()
+
+    def lookup(self, team_urn):
+        """Retorna (posicao, pontos, nome, total_times) do time ou (None, 0, None, None)."""
+        entry = self.by_team.get(team_urn)
+        if not entry:
+            return None, 0, None, None
+        row, group_size = entry
+        return row["posicao"], row["pontos"], row["time"], group_size
+
+
+class _StandingsStore:
+    """
+    Snapshots de classificação compartilhados por /standings, /search/teams e
+    pelas análises. O payload vem de call_sportradar (cache); o snapshot só é
+    reconstruído quando o payload muda, e nesse caso as linhas de times sem
+    alteração são reaproveitadas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots = {}  # (competition, season) -> _StandingsSnapshot
+
+    @staticmethod
+    def _path(competition, season):
+        return f"/competitions/{competition}/seasons/{season}/standings.json"
+
+    def get(self, competition, season, deadline=None, swr=False, lane=None):
+        """Retorna (snapshot, error) para a competição/temporada."""
+        data, error = call_sportradar(
+            self._path(competition, season), deadline=deadline, swr=swr, lane=lane
+        )
+        if error:
+            return None, error
+        key = (competition, season)
+        with self._lock:
+            previous = self._snapshots.get(key)
+        if previous is not None and previous.source is data:
+            return previous, None
+        snapshot = self._build(competition, season, data, previous)
+        with self._lock:
+            self._snapshots[key] = snapshot
+        return snapshot, None
+
+    def invalidate(self, competition):
+        """Marca a classificação da competição como desatualizada (ex: jogo encerrado)."""
+        with self._lock:
+            seasons = [season for (comp, season) in self._snapshots if comp == competition]
+        for season in seasons:
+            path = self._path(competition, season)
+            _response_cache.invalidate(_cache_key(path))
+            # Senão a próxima leitura recarrega do snapshot a mesma tabela ainda no TTL
+            _snapshot_store.expire(_cache_key(path), _cache_ttl_for(path))
+
+    def stats(self):
+        with self._lock:
+            return {"snapshots": len(self._snapshots)}
+
+    @staticmethod
+    def _build(competition, season, data, previous):
+        old_rows = {}
+        if previous is not None:
+            old_rows = {urn: row for urn, (row, _) in previous.by_team.items()}
+        rows, by_team = [], {}
+        for standing in data.get("standings", []):
+            if standing.get("type") != "total":
+                continue
+            for group in standing.get("groups", []):
+                entries = group.get("standings", [])
+                for entry in entries:
+                    team = entry.get("team", {})
+                    team_id = team.get("id")
+                    row = {
+                        "posicao": entry.get("rank"),
+                        "time": team.get("name"),
+                        "time_id": team_id,
+                        "jogos": entry.get("played", 0),
+                        "vitorias": entry.get("win", 0),
+                        "empates": entry.get("draw", 0),
+                        "derrotas": entry.get("loss", 0),
+                        "gols_pro": entry.get("goals_scored", 0),
+                        "gols_contra": entry.get("goals_conceded", 0),
+                        "saldo": entry.get("goals_scored", 0) - entry.get("goals_conceded", 0),
+                        "pontos": entry.get("points", 0)
+                    }
+                    if old_rows.get(team_id) == row:
+                        row = old_rows[team_id]
+                    rows.append(row)
+                    if team_id:
+                        by_team[team_id] = (row, len(entries))
+                        _team_search_index.add(team_id, team.get("name"), competition)
+        rows.sort(key=lambda x: x.get("posicao") or 999)
+        return _StandingsSnapshot(competition, season, rows, by_team, data)
+
+
+_standings_store = _StandingsStore()
+
+
+FORM_HISTORY_SIZE = int(os.getenv("FORM_HISTORY_SIZE", "10"))
+FORM_MAX_TEAMS = int(os.getenv("FORM_MAX_TEAMS", "20000"))
+FORM_FEED_INTERVAL = int(os.getenv("FORM_FEED_INTERVAL", str(6 * 3600)))
+# Jogos da noite (UTC) fecham depois da meia-noite: ontem é relido até uma
+# ingestão posterior ao fim do dia + esta folga
+FORM_FEED_DAY_GRACE = int(os.getenv("FORM_FEED_DAY_GRACE", str(3 * 3600)))
+
+
+def _closed_result(summary):
+    """
+    Extrai um jogo encerrado de um summary Sportradar.
+    Retorna (event_id, scheduled, competition_id, [(competitor_id, "W"/"D"/"L"), ...]) ou None.
+    """
+    status_obj = summary.get("sport_event_status", {})
+    if status_obj.get("status") not in ("closed", "ended"):
+        return None
+    sport_event = summary.get("sport_event", {})
+    home_score = int(status_obj.get("home_score") or 0)
+    away_score = int(status_obj.get("away_score") or 0)
+    outcomes = []
+    for c in sport_event.get("competitors", []):
+        qualifier = c.get("qualifier")
+        if qualifier == "home":
+            team_score, opp_score = home_score, away_score
+        elif qualifier == "away":
+            team_score, opp_score = away_score, home_score
+        else:
+            continue
+        result = "W" if team_score > opp_score else ("D" if team_score == opp_score else "L")
+        outcomes.append((c.get("id"), result))
+    if not outcomes:
+        return None
+    competition_id = sport_event.get("sport_event_context", {}).get("competition", {}).get("id")
+    return sport_event.get("id"), sport_event.get("scheduled") or "", competition_id, outcomes
+
+
+class _TeamFormStore:
+    """
+    Últimos FORM_HISTORY_SIZE resultados por time, do mais recente para o mais antigo.
+
+    Alimentado pelo feed diário /schedules/{date}/summaries.json (uma chamada
+    cobre todos os jogos do dia). Times ainda sem histórico são semeados uma
+    única vez por /competitors/{urn}/summaries.json.
+    """
+
+    def __init__(self, history_size, max_teams):
+        self.history_size = history_size
+        self.max_teams = max_teams
+        self._lock = threading.Lock()
+        self._teams = OrderedDict()  # competitor -> [(scheduled, event_id, resultado)]
+        self._seeded = set()
+        self._ingested_dates = {}  # date -> epoch da última ingestão
+
+    def _add(self, competitor, event_id, scheduled, result):
+        history = self._teams.get(competitor)
+        if history is None:
+            history = self._teams[competitor] = []
+            while len(self._teams) > self.max_teams:
+                evicted, _ = self._teams.popitem(last=False)
+                self._seeded.discard(evicted)
+        else:
+            self._teams.move_to_end(competitor)
+        if any(e[1] == event_id for e in history):
+            return False
+        history.append((scheduled, event_id, result))
+        history.sort(reverse=True)
+        del history[self.history_size:]
+        return True
+
+    def record(self, summaries):
+        """Registra os jogos encerrados. Retorna o conjunto de competições com resultado novo."""
+        changed = set()
+        with self._lock:
+            for summary in summaries:
+                closed = _closed_result(summary)
+                if not closed:
+                    continue
+                event_id, scheduled, competition_id, outcomes = closed
+                for competitor, result in outcomes:
+                    if self._add(competitor, event_id, scheduled, result) and competition_id:
+                        changed.add(competition_id)
+        return changed
+
+    def seed(self, competitor, summaries):
+        self.record(summaries)
+        with self._lock:
+            self._teams.setdefault(competitor, [])
+            self._seeded.add(competitor)
+
+    def lookup(self, competitor, n=5):
+        """
+        Retorna (conhecido, form_str). conhecido=False se o time não foi semeado
+        e o feed diário ainda não acumulou n resultados dele.
+        """
+        with self._lock:
+            history = self._teams.get(competitor, [])
+            if competitor not in self._seeded and len(history) < n:
+                return False, None
+            form = "".join(r for _, _, r in history[:n])
+        return True, form or None
+
+    def ingest_daily(self, date, deadline=None):
+        """Processa o feed de um dia e invalida a classificação das competições afetadas."""
+        started = time.time()
+        data, error = call_sportradar(
+            f"/schedules/{date}/summaries.json", deadline=deadline, lane=LANE_BULK
+        )
+        if error:
+            return error
+        changed = self.record(data.get("summaries", []))
+        _set_piece_model.record(data.get("summaries", []))
+        for competition_id in changed:
+            _standings_store.invalidate(competition_id)
+        with self._lock:
+            self._ingested_dates[date] = started
+            for old in sorted(self._ingested_dates)[:-7]:
+                del self._ingested_dates[old]
+        if changed:
+            logger.info(f"[TeamForm] {date}: resultados novos em {len(changed)} competicao(oes)")
+        return None
+
+    def refresh_feed(self):
+        """
+        Job: hoje a cada execução; ontem até ser lido uma vez depois de
+        terminado (meia-noite UTC + FORM_FEED_DAY_GRACE), para pegar jogos
+        encerrados após a última execução do dia.
+        """
+        today = datetime.utcnow().date()
+        yesterday = (today - timedelta(days=1)).strftime("%Y-%m-%d")
+        day_end = (datetime(today.year, today.month, today.day) - datetime(1970, 1, 1)).total_seconds()
+        with self._lock:
+            need_yesterday = self._ingested_dates.get(yesterday, 0) < day_end + FORM_FEED_DAY_GRACE
+        deadline = time.time() + 120
+        if need_yesterday:
+            self.ingest_daily(yesterday, deadline=deadline)
+        self.ingest_daily(today.strftime("%Y-%m-%d"), deadline=deadline)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "times": len(self._teams),
+                "semeados": len(self._seeded),
+                "dias_processados": sorted(self._ingested_dates)
+            }
+
+
+_team_form_store = _TeamFormStore(FORM_HISTORY_SIZE, FORM_MAX_TEAMS)
+
+
+def _get_team_form(competitor_urn, deadline=None, lane=None):
+    """
+    Retorna a string de forma (W/D/L) dos últimos 5 jogos de um time.
+    Retorna (form_str, error) ex: ("WWDLW", None)
+    Servida da memória; só o primeiro pedido de cada time consome 1 chamada à Sportradar.
+    """
+    known, form = _team_form_store.lookup(competitor_urn)
+    if known:
+        return form, None
+
+    data, error = call_sportradar(
+        f"/competitors/{competitor_urn}/summaries.json", deadline=deadline, lane=lane
+    )
+    if error:
+        return None, error
+    _team_form_store.seed(competitor_urn, data.get("summaries", []))
+    _set_piece_model.record(data.get("summaries", []))
+    return _team_form_store.lookup(competitor_urn)[1], None
+
+
+# =======================
+# Modelo de escanteios e cartões
+# =======================
+SET_PIECE_PRIOR_MATCHES = 5       # jogos "virtuais" com a média da liga somados a cada time
+SET_PIECE_MAX_EVENTS = int(os.getenv("SET_PIECE_MAX_EVENTS", "50000"))
+CORNER_LINES = (7.5, 8.5, 9.5, 10.5, 11.5, 12.5)
+CARD_LINES = (2.5, 3.5, 4.5, 5.5, 6.5)
+SET_PIECE_SUGGESTION_PROB = 0.6
+# Por time: [jogos, escanteios pró, escanteios contra, cartões pró, cartões contra] em casa e fora
+_SP_WIDTH = 5
+_SP_VENUE = {"home": 0, "away": _SP_WIDTH}
+_SP_COLUMN = {"corners": 1, "cards": 3}
+
+
+def _match_cards(stats):
+    if "cards_given" in stats:
+        return int(stats.get("cards_given") or 0)
+    return sum(int(stats.get(key) or 0) for key in ("yellow_cards", "yellow_red_cards", "red_cards"))
+
+
+def _set_piece_totals(summary):
+    """
+    Escanteios e cartões de um jogo encerrado com estatísticas.
+    Retorna (event_id, competition_id, home_id, away_id, (esc_casa, esc_fora, cart_casa, cart_fora)) ou None.
+    """
+    if summary.get("sport_event_status", {}).get("status") not in ("closed", "ended"):
+        return None
+    sport_event = summary.get("sport_event", {})
+    teams = {c.get("qualifier"): c.get("id") for c in sport_event.get("competitors", [])}
+    stats = {
+        cs.get("id"): cs.get("statistics", {})
+        for cs in summary.get("statistics", {}).get("totals", {}).get("competitors", [])
+    }
+    home, away = teams.get("home"), teams.get("away")
+    if not home or not away or home not in stats or away not in stats:
+        return None
+    hs, as_ = stats[home], stats[away]
+    if "corner_kicks" not in hs or "corner_kicks" not in as_:
+        return None
+    competition_id = sport_event.get("sport_event_context", {}).get("competition", {}).get("id")
+    return sport_event.get("id"), competition_id, home, away, (
+        int(hs.get("corner_kicks") or 0), int(as_.get("corner_kicks") or 0), _match_cards(hs), _match_cards(as_)
+    )
+
+
+def _poisson_over(lam, line):
+    """P(X > line) para X ~ Poisson(lam), com line fracionária (ex.: 9.5)."""
+    term = cdf = math.exp(-lam)
+    for k in range(1, int(line) + 1):
+        term *= lam / k
+        cdf += term
+    return max(0.0, 1.0 - cdf)
+
+
+class _SetPieceModel:
+    """
+    Taxas de escanteios e cartões por time, separadas em casa/fora, guardadas
+    num array('d') contíguo (um bloco de 10 posições por time) e somas por
+    competição para a média da liga.
+
+    Atualizado de forma incremental pelos jogos encerrados que passam pelo
+    feed diário e pela semeadura de forma (cada jogo conta uma vez). A
+    estimativa de um confronto são consultas ao array: a média de cada lado
+    combina o que o time faz com o que o adversário cede, encolhida para a
+    média da liga com SET_PIECE_PRIOR_MATCHES jogos virtuais, e vira uma
+    distribuição de Poisson para as linhas over/under.
+    """
+
+    def __init__(self, max_events):
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self._slots = {}  # competitor -> índice do bloco em _rates
+        self._rates = array("d")
+        self._leagues = {}  # competição (None = todas) -> array('d', [jogos, esc casa, esc fora, cart casa, cart fora])
+        self._events = OrderedDict()
+
+    def _slot(self, competitor):
+        slot = self._slots.get(competitor)
+        if slot is None:
+            slot = self._slots[competitor] = len(self._rates)
+            self._rates.extend([0.0] * (2 * _SP_WIDTH))
+        return slot
+
+    def record(self, summaries):
+        """Acumula os jogos encerrados ainda não vistos. Retorna quantos entraram."""
+        added = 0
+        with self._lock:
+            for summary in summaries:
+                totals = _set_piece_totals(summary)
+                if not totals or totals[0] in self._events:
+                    continue
+                event_id, competition_id, home, away, (hc, ac, hk, ak) = totals
+                self._events[event_id] = None
+                while len(self._events) > self.max_events:
+                    self._events.popitem(last=False)
+                blocks = [
+                    (self._rates, self._slot(home) + _SP_VENUE["home"], (1, hc, ac, hk, ak)),
+                    (self._rates, self._slot(away) + _SP_VENUE["away"], (1, ac, hc, ak, hk)),
+                ]
+                for key in {competition_id, None}:
+                    league = self._leagues.get(key)
+                    if league is None:
+                        league = self._leagues[key] = array("d", [0.0] * _SP_WIDTH)
+                    blocks.append((league, 0, (1, hc, ac, hk, ak)))
+                for target, base, values in blocks:
+                    for i, value in enumerate(values):
+                        target[base + i] += value
+                added += 1
+        return added
+
+    def _league_means(self, competition, kind, default_total):
+        """Médias (casa, fora, base) por jogo da competição; senão de todas; senão default_total dividido ao meio."""
+        column = _SP_COLUMN[kind]
+        for key, base in ((competition, "competicao"), (None, "todas_competicoes")):
+            league = self._leagues.get(key)
+            if league is not None and league[0]:
+                return league[column] / league[0], league[column + 1] / league[0], base
+        return default_total / 2, default_total / 2, "padrao"
+
+    def _block(self, team, venue):
+        slot = self._slots.get(team)
+        return slot + _SP_VENUE[venue] if slot is not None else None
+
+    def _games(self, team, venue):
+        base = self._block(team, venue)
+        return int(self._rates[base]) if base is not None else 0
+
+    def _side(self, attacker, defender, kind, attacker_venue, league_mean):
+        """Média esperada do lado `attacker`: o que ele produz e o que o adversário cede, cada um no seu mando."""
+        column = _SP_COLUMN[kind]
+        defender_venue = "away" if attacker_venue == "home" else "home"
+        k = SET_PIECE_PRIOR_MATCHES
+        estimates = []
+        for team, venue, offset in ((attacker, attacker_venue, column), (defender, defender_venue, column + 1)):
+            base = self._block(team, venue)
+            games = self._rates[base] if base is not None else 0.0
+            total = self._rates[base + offset] if base is not None else 0.0
+            estimates.append((total + k * league_mean) / (games + k))
+        return sum(estimates) / 2
+
+    def estimate(self, kind, competition, home, away, default_total, lines):
+        """Estimativa de `kind` ("corners"/"cards") para o confronto, com a distribuição over/under por linha."""
+        with self._lock:
+            home_mean, away_mean, base = self._league_means(competition, kind, default_total)
+            lam_home = self._side(home, away, kind, "home", home_mean)
+            lam_away = self._side(away, home, kind, "away", away_mean)
+            home_games, away_games = self._games(home, "home"), self._games(away, "away")
+        lam = lam_home + lam_away
+        linhas = []
+        for line in lines:
+            over = _poisson_over(lam, line)
+            linhas.append({
+                "linha": line,
+                "over": round(over, 3),
+                "under": round(1 - over, 3),
+                "odd_justa_over": round(1 / over, 2) if over > 0 else None,
+                "odd_justa_under": round(1 / (1 - over), 2) if over < 1 else None
+            })
+        return {
+            "estimativa_total": round(lam, 2),
+            "estimativa_mandante": round(lam_home, 2),
+            "estimativa_visitante": round(lam_away, 2),
+            "linhas": linhas,
+            "amostra": {
+                "mandante_jogos_em_casa": home_games,
+                "visitante_jogos_fora": away_games,
+                "media_base": base
+            },
+            "fonte": "modelo" if home_games or away_games else "media_liga" if base != "padrao" else "padrao"
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "times": len(self._slots),
+                "jogos": len(self._events),
+                "competicoes": len(self._leagues) - (None in self._leagues),
+                "bytes_taxas": self._rates.itemsize * len(self._rates)
+            }
+
+
+def _set_piece_suggestion(estimate, label):
+    """Linha mais alta com over >= SET_PIECE_SUGGESTION_PROB, senão a mais baixa com under >= esse limite."""
+    for entry in reversed(estimate["linhas"]):
+        if entry["over"] >= SET_PIECE_SUGGESTION_PROB:
+            return f"Over {entry['linha']} {label}", entry["over"], entry["odd_justa_over"]
+    for entry in estimate["linhas"]:
+        if entry["under"] >= SET_PIECE_SUGGESTION_PROB:
+            return f"Under {entry['linha']} {label}", entry["under"], entry["odd_justa_under"]
+    return None, None, None
+
+
+_set_piece_model = _SetPieceModel(SET_PIECE_MAX_EVENTS)
+
+
+# =======================
+# Timeline incremental por jogo
+# =======================
+TIMELINE_MAX_FIXTURES = int(os.getenv("TIMELINE_MAX_FIXTURES", "200"))
+CARD_EVENT_TYPES = ("yellow_card", "red_card", "yellow_red_card")
+TIMELINE_PERIODS = ("0-15", "16-30", "31-45", "46-60", "61-75", "76-90+")
 
 
-def _get_team_form(competitor_urn):
-    """
-    Calcula string de forma (W/D/L) dos últimos 5 jogos de um time.
-    Retorna (form_str, error) ex: ("WWDLW", None)
-    Consome 1 chamada à API Sportradar.
-    """
-    data, error = call_sportradar(f"/competitors/{competitor_urn}/summaries.json")
-    if error:
-        return None, error
+def _timeline_period(minute):
+    if minute <= 15: return "0-15"
+    if minute <= 30: return "16-30"
+    if minute <= 45: return "31-45"
+    if minute <= 60: return "46-60"
+    if minute <= 75: return "61-75"
+    return "76-90+"
 
-    form = []
-    for summary in data.get("summaries", []):
-        if len(form) >= 5:
-            break
-        status_obj = summary.get("sport_event_status", {})
-        if status_obj.get("status") not in ("closed", "ended"):
-            continue
 
-        competitors = summary.get("sport_event", {}).get("competitors", [])
-        qualifier = None
-        for c in competitors:
-            if c.get("id") == competitor_urn:
-                qualifier = c.get("qualifier")
-                break
+class _TimelineState:
+    """Timeline já processada de um jogo: eventos ordenados por minuto e agregados por período."""
 
-        home_score = int(status_obj.get("home_score") or 0)
-        away_score = int(status_obj.get("away_score") or 0)
+    __slots__ = ("home_name", "away_name", "last_id", "processed", "source",
+                 "timeline", "periods", "goals", "cards", "substitutions")
 
-        if qualifier == "home":
-            team_score, opp_score = home_score, away_score
-        elif qualifier == "away":
-            team_score, opp_score = away_score, home_score
+    def __init__(self, home_name, away_name):
+        self.home_name = home_name
+        self.away_name = away_name
+        self.last_id = None
+        self.processed = 0
+        self.source = None
+        self.timeline = []
+        self.periods = {p: {"gols": 0, "cartoes": 0, "eventos": []} for p in TIMELINE_PERIODS}
+        self.goals = self.cards = self.substitutions = 0
+
+    def apply(self, event):
+        minute = event.get("match_time", 0) or 0
+        event_type = event.get("type", "")
+        competitor = event.get("competitor", "")
+        player = event.get("player", {})
+        team_name = (self.home_name if competitor == "home"
+                     else (self.away_name if competitor == "away" else competitor))
+
+        event_obj = {
+            "id": event.get("id"),
+            "minuto": minute,
+            "minuto_display": f"{minute}'",
+            "tipo": event_type,
+            "time": team_name,
+            "jogador": player.get("name", "Desconhecido") if player else "Desconhecido",
+            "descricao": event.get("description", "")
+        }
+        period = self.periods[_timeline_period(minute)]
+        if event_type == "score_change":
+            event_obj["placar"] = {
+                "mandante": event.get("home_score"),
+                "visitante": event.get("away_score")
+            }
+            self.goals += 1
+            period["gols"] += 1
+        elif event_type in CARD_EVENT_TYPES:
+            self.cards += 1
+            period["cartoes"] += 1
+        elif event_type == "substitution":
+            self.substitutions += 1
+        period["eventos"].append(event_obj)
+
+        # Eventos chegam quase sempre em ordem; insort só paga quando não chegam
+        if self.timeline and self.timeline[-1]["minuto"] > minute:
+            bisect.insort(self.timeline, event_obj, key=lambda e: e["minuto"])
         else:
-            continue
+            self.timeline.append(event_obj)
+        self.last_id = event.get("id", self.last_id)
+        self.processed += 1
+
+    def key_moments(self):
+        momentos_chave = []
+        if self.periods["0-15"]["gols"] > 0:
+            momentos_chave.append({
+                "periodo": "0-15",
+                "descricao": f"Inicio eletrico com {self.periods['0-15']['gols']} gol(s)",
+                "impacto": "ALTO"
+            })
+        periodo, dados = max(self.periods.items(), key=lambda x: len(x[1]["eventos"]))
+        if len(dados["eventos"]) >= 5:
+            momentos_chave.append({
+                "periodo": periodo,
+                "descricao": f"Periodo mais agitado com {len(dados['eventos'])} eventos",
+                "impacto": "MODERADO"
+            })
+        return momentos_chave
+
+
+class _TimelineStore:
+    """
+    Estado de timeline por jogo (LRU de TIMELINE_MAX_FIXTURES jogos).
 
-        if team_score > opp_score:
-            form.append("W")
-        elif team_score == opp_score:
-            form.append("D")
+    A cada payload novo de /sport_events/{id}/timeline.json só os eventos com
+    id maior que o último processado são aplicados; o mesmo payload (hit de
+    cache) não custa nada. Se a Sportradar corrigir/remover eventos antigos,
+    a contagem não fecha e o estado é reconstruído do zero.
+    """
+
+    def __init__(self, max_fixtures):
+        self.max_fixtures = max_fixtures
+        self._lock = threading.Lock()
+        self._states = OrderedDict()
+        self.incremental = 0
+        self.rebuilds = 0
+        self.unchanged = 0
+
+    def update(self, fixture_id, data):
+        """Aplica o payload ao estado do jogo e retorna o _TimelineState (use sob o lock)."""
+        state = self._states.get(fixture_id)
+        if state is not None and state.source is data:
+            self.unchanged += 1
+            self._states.move_to_end(fixture_id)
+            return state
+
+        events = data.get("timeline", [])
+        new_events = []
+        if state is not None and state.last_id is not None:
+            for event in reversed(events):
+                if (event.get("id") or 0) <= state.last_id:
+                    break
+                new_events.append(event)
+            new_events.reverse()
+
+        if state is None or len(events) - len(new_events) != state.processed:
+            competitors = {c.get("qualifier"): c.get("name")
+                           for c in data.get("sport_event", {}).get("competitors", [])}
+            state = _TimelineState(competitors.get("home"), competitors.get("away"))
+            new_events = events
+            self.rebuilds += 1
         else:
-            form.append("L")
+            self.incremental += 1
+
+        for event in new_events:
+            state.apply(event)
+        state.source = data
+        self._states[fixture_id] = state
+        self._states.move_to_end(fixture_id)
+        while len(self._states) > self.max_fixtures:
+            self._states.popitem(last=False)
+        return state
+
+    @property
+    def lock(self):
+        return self._lock
+
+    def stats(self):
+        with self._lock:
+            return {
+                "jogos": len(self._states),
+                "atualizacoes_incrementais": self.incremental,
+                "reconstrucoes": self.rebuilds,
+                "sem_mudanca": self.unchanged
+            }
+
+
+_timeline_store = _TimelineStore(TIMELINE_MAX_FIXTURES)
+
+
+# Executor compartilhado para chamadas Sportradar em paralelo (por worker)
+FANOUT_MAX_WORKERS = int(os.getenv("FANOUT_MAX_WORKERS", "6"))
+ANALYSIS_DEADLINE = float(os.getenv("ANALYSIS_DEADLINE", "15"))
+_fanout_executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix="fanout")
+# Lotes (/analysis/complete/batch) têm pool próprio: um lote grande não enfileira na
+# frente das análises interativas, e todos os lotes juntos usam no máximo estas threads
+ANALYSIS_BATCH_MAX_WORKERS = int(os.getenv("ANALYSIS_BATCH_MAX_WORKERS", "2"))
+_batch_executor = ThreadPoolExecutor(max_workers=ANALYSIS_BATCH_MAX_WORKERS, thread_name_prefix="batch")
+
+
+def _run_stage_graph(stages):
+    """
+    Executa um pequeno grafo de dependências em paralelo.
+
+    Cada estágio é submetido assim que suas dependências terminam. Hits de
+    cache retornam na hora; os misses entram juntos na fila do limiter, que
+    libera um slot após o outro (a latência de rede de uma chamada se
+    sobrepõe à espera da próxima).
+
+    Args:
+        stages (dict): nome -> (func, deps). func recebe um dict com os
+            resultados das dependências.
+
+    Returns:
+        tuple: (results, timings, errors) — timings em ms por estágio (início e
+        duração); um estágio que levanta exceção fica com resultado None e a
+        mensagem em errors[nome], sem derrubar os demais
+    """
+    start = time.time()
+    results, timings, errors = {}, {}, {}
+    pending = dict(stages)
+    running = {}
+
+    def run(name, func, dep_results):
+        t0 = time.time()
+        try:
+            return func(dep_results)
+        except Exception as e:
+            logger.warning(f"[Stages] Erro na etapa '{name}': {e}")
+            errors[name] = f"Erro ao processar {name}: {e}"
+            return None
+        finally:
+            timings[name] = {
+                "inicio_ms": round((t0 - start) * 1000),
+                "duracao_ms": round((time.time() - t0) * 1000)
+            }
 
-    return "".join(form) if form else None, None
+    while pending or running:
+        for name, (func, deps) in list(pending.items()):
+            if all(d in results for d in deps):
+                dep_results = {d: results[d] for d in deps}
+                running[_fanout_executor.submit(run, name, func, dep_results)] = name
+                del pending[name]
+        if not running:
+            raise ValueError(f"Dependencias nao satisfeitas: {sorted(pending)}")
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[running.pop(future)] = future.result()
+
+    return results, timings, errors
+
+
+# Jobs periódicos em segundo plano (threads daemon por worker).
+# Desligados por padrão no Vercel, onde não há processo entre requisições.
+ENABLE_BACKGROUND_JOBS = os.getenv(
+    "ENABLE_BACKGROUND_JOBS", "false" if os.getenv("VERCEL") else "true"
+).lower() == "true"
+_background_jobs = {}
+
+
+def _start_periodic_job(name, interval, func, initial_delay=0.0):
+    """Executa func() a cada `interval` segundos numa thread daemon."""
+    if not ENABLE_BACKGROUND_JOBS or not API_KEY or name in _background_jobs:
+        return
+    job = {"intervalo_s": interval, "execucoes": 0, "ultima_execucao": None, "ultimo_erro": None}
+    _background_jobs[name] = job
+
+    def loop():
+        time.sleep(initial_delay)
+        while True:
+            try:
+                func()
+                job["ultimo_erro"] = None
+            except Exception as e:
+                job["ultimo_erro"] = str(e)
+                logger.error(f"[Job {name}] {e}")
+            job["execucoes"] += 1
+            job["ultima_execucao"] = datetime.utcnow().isoformat() + "Z"
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name=f"job-{name}", daemon=True).start()
 
 
 def _parse_status_sportradar(status_str):
@@ -572,9 +2700,10 @@ def home():
         "endpoints": {
             "base": ["/health", "/competitions", "/fixtures", "/standings", "/players/topscorers"],
             "avancados": ["/fixtures/headtohead", "/predictions", "/fixtures/live"],
-            "ao_vivo": ["/fixtures/live/analysis", "/fixtures/live/minute-by-minute"],
+            "ao_vivo": ["/fixtures/live/analysis", "/fixtures/live/minute-by-minute", "/fixtures/live/stream"],
             "profissionais": ["/analysis/corners", "/analysis/cards", "/analysis/value",
-                              "/news/context", "/analysis/complete"],
+                              "/analysis/value/batch", "/news/context", "/analysis/complete",
+                              "/analysis/complete/batch"],
             "utilidades": ["/seasons"]
         },
         "nota_ids": (
@@ -617,6 +2746,24 @@ def health():
         status["sportradar_status"] = "not_configured"
         status["warning"] = "API_KEY nao configurada"
 
+    status["cache"] = _response_cache.stats()
+    status["snapshots"] = _snapshot_store.stats()
+    status["quota"] = _rate_limiter.quota_status()
+    status["rate_limiter"] = _slot_scheduler.stats()
+    status["http_pool"] = _http_pool_stats()
+    status["single_flight"] = _single_flight.stats()
+    status["season_index"] = _season_index.stats()
+    status["standings"] = _standings_store.stats()
+    status["team_form"] = _team_form_store.stats()
+    status["prefetch"] = _prefetch_scheduler.stats()
+    status["live_poller"] = _live_poller.stats()
+    status["timeline"] = _timeline_store.stats()
+    status["team_search"] = _team_search_index.stats()
+    status["competitors"] = _competitor_registry.stats()
+    status["catalog"] = _competitor_catalog.stats()
+    status["live_matches"] = _live_match_store.stats()
+    status["set_piece_model"] = _set_piece_model.stats()
+    status["jobs"] = _background_jobs
     return jsonify(status)
 
 
@@ -642,9 +2789,12 @@ def debug_test_api():
 
     for ep in test_endpoints:
         try:
-            _rate_limit()
+            quota_error = _rate_limit(ep)
+            if quota_error:
+                results[ep] = {"status_code": None, "ok": False, "error": quota_error}
+                continue
             url = f"{base_url}{ep}"
-            resp = requests.get(url, params={"api_key": API_KEY}, timeout=10)
+            resp = _http_session().get(url, params={"api_key": API_KEY}, timeout=10)
             body_preview = resp.text[:200] if resp.text else ""
             results[ep] = {
                 "status_code": resp.status_code,
@@ -664,19 +2814,26 @@ def debug_test_api():
     })
 
 
-@app.route("/openapi.json")
-def openapi_json():
+OPENAPI_MAX_AGE = int(os.getenv("OPENAPI_MAX_AGE", "3600"))
+OPENAPI_GZIP = os.getenv("OPENAPI_GZIP", "true").lower() == "true"
+
+
+def _load_openapi_document():
+    """
+    Lê openapi.yaml uma vez e pré-serializa o JSON servido em /openapi.json.
+
+    Retorna dict com body (bytes), body_gz (bytes ou None), etag e error.
+    """
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    yaml_path = os.path.join(base_dir, "openapi.yaml")
+    if not os.path.exists(yaml_path):
+        yaml_path = "openapi.yaml"
     try:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        yaml_path = os.path.join(base_dir, "openapi.yaml")
-        if not os.path.exists(yaml_path):
-            yaml_path = "openapi.yaml"
         if os.path.exists(yaml_path):
             with open(yaml_path, "r", encoding="utf-8") as f:
-                openapi_yaml = yaml.safe_load(f)
-            return jsonify(openapi_yaml)
+                document = yaml.safe_load(f)
         else:
-            return jsonify({
+            document = {
                 "openapi": "3.1.0",
                 "info": {
                     "title": "Apostas Esportivas Pro API",
@@ -684,9 +2841,40 @@ def openapi_json():
                     "description": "API profissional integrada com Sportradar Soccer API v4."
                 },
                 "paths": {}
-            })
+            }
+        body = app.json.dumps_bytes(document)
     except Exception as e:
-        return error_response(f"Erro ao carregar schema: {str(e)}", 500)
+        logger.error(f"[OpenAPI] Erro ao carregar schema: {e}")
+        return {"body": None, "body_gz": None, "etag": None, "error": str(e)}
+
+    return {
+        "body": body,
+        # mtime=0: mesmo arquivo gera sempre os mesmos bytes (ETag estável entre workers)
+        "body_gz": gzip.compress(body, compresslevel=9, mtime=0) if OPENAPI_GZIP else None,
+        "etag": hashlib.sha1(body).hexdigest(),
+        "error": None
+    }
+
+
+_openapi_document = _load_openapi_document()
+
+
+@app.route("/openapi.json")
+def openapi_json():
+    """Schema OpenAPI pré-serializado em memória, com ETag forte e gzip opcional."""
+    doc = _openapi_document
+    if doc["error"]:
+        return error_response(f"Erro ao carregar schema: {doc['error']}", 500)
+
+    use_gzip = doc["body_gz"] is not None and "gzip" in request.accept_encodings
+    response = app.response_class(doc["body_gz"] if use_gzip else doc["body"], mimetype="application/json")
+    if use_gzip:
+        response.headers["Content-Encoding"] = "gzip"
+    # ETag por representação: gzip e identidade têm bytes diferentes
+    response.set_etag(doc["etag"] + ("-gz" if use_gzip else ""))
+    response.headers["Cache-Control"] = f"public, max-age={OPENAPI_MAX_AGE}"
+    response.headers["Vary"] = "Accept-Encoding"
+    return response.make_conditional(request)
 
 
 @app.route("/competitions")
@@ -698,6 +2886,10 @@ def competitions():
     Query Parameters:
         - live: Se 'true', busca as competições ao vivo no momento
     """
+    not_modified = _not_modified(API_VERSION, sorted(SUPPORTED_COMPETITIONS.items()))
+    if not_modified:
+        return not_modified
+
     # Lista estática conhecida
     known = [
         {"id": cid, "name": name}
@@ -747,9 +2939,12 @@ def seasons():
     if not competition:
         return error_response("Parametro 'competition' e obrigatorio (ex: sr:competition:325)")
 
-    data, error = call_sportradar(f"/competitions/{competition}/seasons.json")
+    data, error = call_sportradar(f"/competitions/{competition}/seasons.json", swr=True)
     if error:
         return error_response(error, 500)
+    not_modified = _not_modified()
+    if not_modified:
+        return not_modified
 
     seasons_list = []
     for s in data.get("seasons", []):
@@ -767,6 +2962,7 @@ def seasons():
         "competition": competition,
         "total": len(seasons_list),
         "seasons": seasons_list,
+        "stale": _data_is_stale(),
         "nota": "Use o 'id' da temporada como parametro 'season' nos outros endpoints"
     })
 
@@ -803,93 +2999,100 @@ def fixtures():
 
     if error:
         return error_response(error, 500)
+    not_modified = _not_modified(date)
+    if not_modified:
+        return not_modified
+
+    def rows():
+        if use_schedule_fallback:
+            # schedule.json: {"schedule": [{sport_event direto com competitors, status, etc}]}
+            events = data.get("schedule", data.get("sport_events", []))
+            for sport_event in events:
+                ctx = sport_event.get("sport_event_context", {})
+                comp = ctx.get("competition", {})
+                comp_id = comp.get("id", "")
+                if competition_filter and comp_id != competition_filter:
+                    continue
 
-    jogos = []
-
-    if use_schedule_fallback:
-        # schedule.json: {"schedule": [{sport_event direto com competitors, status, etc}]}
-        events = data.get("schedule", data.get("sport_events", []))
-        for sport_event in events:
-            ctx = sport_event.get("sport_event_context", {})
-            comp = ctx.get("competition", {})
-            comp_id = comp.get("id", "")
-            if competition_filter and comp_id != competition_filter:
-                continue
-
-            competitors = sport_event.get("competitors", [])
-            home_name = away_name = None
-            home_id = away_id = None
-
-            for c in competitors:
-                q = c.get("qualifier", "")
-                if q == "home":
-                    home_name = c.get("name")
-                    home_id = c.get("id")
-                elif q == "away":
-                    away_name = c.get("name")
-                    away_id = c.get("id")
-
-            status_str = sport_event.get("status", "")
-            home_score = sport_event.get("home_score")
-            away_score = sport_event.get("away_score")
-
-            jogos.append({
-                "id": sport_event.get("id"),
-                "data": sport_event.get("scheduled"),
-                "status": _parse_status_sportradar(status_str),
-                "minuto": None,
-                "competicao": comp.get("name"),
-                "competicao_id": comp_id,
-                "mandante": home_name,
-                "mandante_id": home_id,
-                "visitante": away_name,
-                "visitante_id": away_id,
-                "placar": f"{home_score}x{away_score}" if home_score is not None else None
-            })
-    else:
-        # summaries.json: {"summaries": [{"sport_event": {...}, "sport_event_status": {...}}]}
-        summaries = data.get("summaries", [])
-        for summary in summaries:
-            sport_event = summary.get("sport_event", {})
-            status_obj = summary.get("sport_event_status", {})
-
-            ctx = sport_event.get("sport_event_context", {})
-            comp = ctx.get("competition", {})
-            comp_id = comp.get("id", "")
-            if competition_filter and comp_id != competition_filter:
-                continue
-
-            competitors = sport_event.get("competitors", [])
-            home_name = away_name = None
-            home_id = away_id = None
-
-            for c in competitors:
-                q = c.get("qualifier", "")
-                if q == "home":
-                    home_name = c.get("name")
-                    home_id = c.get("id")
-                elif q == "away":
-                    away_name = c.get("name")
-                    away_id = c.get("id")
+                competitors = sport_event.get("competitors", [])
+                home_name = away_name = None
+                home_id = away_id = None
+
+                for c in competitors:
+                    q = c.get("qualifier", "")
+                    if q == "home":
+                        home_name = c.get("name")
+                        home_id = c.get("id")
+                    elif q == "away":
+                        away_name = c.get("name")
+                        away_id = c.get("id")
+
+                status_str = sport_event.get("status", "")
+                home_score = sport_event.get("home_score")
+                away_score = sport_event.get("away_score")
+
+                yield {
+                    "id": sport_event.get("id"),
+                    "data": sport_event.get("scheduled"),
+                    "status": _parse_status_sportradar(status_str),
+                    "minuto": None,
+                    "competicao": comp.get("name"),
+                    "competicao_id": comp_id,
+                    "mandante": home_name,
+                    "mandante_id": home_id,
+                    "visitante": away_name,
+                    "visitante_id": away_id,
+                    "placar": f"{home_score}x{away_score}" if home_score is not None else None
+                }
+        else:
+            # summaries.json: {"summaries": [{"sport_event": {...}, "sport_event_status": {...}}]}
+            summaries = data.get("summaries", [])
+            for summary in summaries:
+                sport_event = summary.get("sport_event", {})
+                status_obj = summary.get("sport_event_status", {})
+
+                ctx = sport_event.get("sport_event_context", {})
+                comp = ctx.get("competition", {})
+                comp_id = comp.get("id", "")
+                if competition_filter and comp_id != competition_filter:
+                    continue
 
-            status_str = status_obj.get("status", "")
-            home_score = status_obj.get("home_score")
-            away_score = status_obj.get("away_score")
-            match_time = status_obj.get("clock", {}).get("match_time") if status_str == "live" else None
+                competitors = sport_event.get("competitors", [])
+                home_name = away_name = None
+                home_id = away_id = None
+
+                for c in competitors:
+                    q = c.get("qualifier", "")
+                    if q == "home":
+                        home_name = c.get("name")
+                        home_id = c.get("id")
+                    elif q == "away":
+                        away_name = c.get("name")
+                        away_id = c.get("id")
+
+                status_str = status_obj.get("status", "")
+                home_score = status_obj.get("home_score")
+                away_score = status_obj.get("away_score")
+                match_time = status_obj.get("clock", {}).get("match_time") if status_str == "live" else None
+
+                yield {
+                    "id": sport_event.get("id"),
+                    "data": sport_event.get("scheduled"),
+                    "status": _parse_status_sportradar(status_str),
+                    "minuto": match_time,
+                    "competicao": comp.get("name"),
+                    "competicao_id": comp_id,
+                    "mandante": home_name,
+                    "mandante_id": home_id,
+                    "visitante": away_name,
+                    "visitante_id": away_id,
+                    "placar": f"{home_score}x{away_score}" if home_score is not None else None
+                }
 
-            jogos.append({
-                "id": sport_event.get("id"),
-                "data": sport_event.get("scheduled"),
-                "status": _parse_status_sportradar(status_str),
-                "minuto": match_time,
-                "competicao": comp.get("name"),
-                "competicao_id": comp_id,
-                "mandante": home_name,
-                "mandante_id": home_id,
-                "visitante": away_name,
-                "visitante_id": away_id,
-                "placar": f"{home_score}x{away_score}" if home_score is not None else None
-            })
+    # Accept: application/x-ndjson → um jogo por linha, sem montar a lista inteira
+    if _wants_ndjson():
+        return _ndjson_response(rows())
+    jogos = list(rows())
 
     return jsonify({
         "ok": True,
@@ -919,43 +3122,22 @@ def standings():
     if not season_urn:
         season_urn, error = _get_current_season_urn(competition)
         if error:
-            return error_response(f"Nao foi possivel detectar a temporada atual: {error}", 500)
+            return error_response(f"Nao foi possivel detectar a temporada atual: {error}", getattr(error, "status", 500))
 
-    data, error = call_sportradar(
-        f"/competitions/{competition}/seasons/{season_urn}/standings.json"
-    )
+    snapshot, error = _standings_store.get(competition, season_urn, swr=True)
     if error:
         return error_response(error, 500)
+    not_modified = _not_modified()
+    if not_modified:
+        return not_modified
 
-    standings_raw = data.get("standings", [])
-    result = []
-
-    for standing in standings_raw:
-        if standing.get("type") != "total":
-            continue
-        for group in standing.get("groups", []):
-            for entry in group.get("standings", []):
-                team = entry.get("team", {})
-                result.append({
-                    "posicao": entry.get("rank"),
-                    "time": team.get("name"),
-                    "time_id": team.get("id"),
-                    "jogos": entry.get("played", 0),
-                    "vitorias": entry.get("win", 0),
-                    "empates": entry.get("draw", 0),
-                    "derrotas": entry.get("loss", 0),
-                    "gols_pro": entry.get("goals_scored", 0),
-                    "gols_contra": entry.get("goals_conceded", 0),
-                    "saldo": entry.get("goals_scored", 0) - entry.get("goals_conceded", 0),
-                    "pontos": entry.get("points", 0)
-                })
-
-    result.sort(key=lambda x: x.get("posicao") or 999)
+    result = snapshot.rows
     return jsonify({
         "ok": True,
         "competition": competition,
         "season": season_urn,
         "total": len(result),
+        "stale": _data_is_stale(),
         "classificacao": result
     })
 
@@ -978,91 +3160,61 @@ def search_teams():
     if not name or not competition:
         return error_response("Parametros 'name' e 'competition' sao obrigatorios")
 
-    # 1. Consulta mapeamento estático primeiro (não depende do trial da Sportradar)
-    matches = []
-    for key, team_data in TEAMS_STATIC_LOOKUP.items():
-        if name in key or key in name:
-            if not competition or team_data["competition"] == competition:
-                matches.append({
-                    "time": team_data["name"],
-                    "time_id": team_data["id"],
-                    "posicao": None,
-                    "pontos": None,
-                    "competicao_id": team_data["competition"],
-                    "season_id": None,
-                    "fonte": "static"
-                })
-
-    if matches:
+    def result(matches, snapshot=None):
+        times = []
+        for score, doc in matches:
+            posicao, pontos = snapshot.lookup(doc.urn)[:2] if snapshot else (None, None)
+            times.append({
+                "time": doc.name,
+                "time_id": doc.urn,
+                "posicao": posicao,
+                "pontos": pontos if posicao is not None else None,
+                "competicao_id": competition,
+                "season_id": season_urn,
+                "fonte": doc.source,
+                "score": score
+            })
         return jsonify({
             "ok": True,
             "query": name,
             "competition": competition,
             "season": season_urn,
-            "total": len(matches),
-            "times": matches
+            "total": len(times),
+            "times": times
         })
 
-    # 2. Fallback: busca na API Sportradar (competitors.json → standings.json)
+    # 1. Índice local: tabela estática + todo time já visto na Sportradar (sem quota)
+    matches = _team_search_index.search(name, competition)
+    if matches:
+        return result(matches)
+
+    # 2. Fallback: indexa os times da competição via Sportradar (competitors.json → standings.json)
     if not season_urn:
         season_urn, error = _get_current_season_urn(competition)
         if error:
-            return error_response(f"Nao foi possivel detectar a temporada: {error}", 500)
+            return error_response(f"Nao foi possivel detectar a temporada: {error}", getattr(error, "status", 500))
 
     data, error = call_sportradar(
         f"/competitions/{competition}/seasons/{season_urn}/competitors.json"
     )
 
+    snapshot = None
     competitors_list = data.get("season_competitors") or data.get("competitors", []) if not error else []
     if competitors_list:
         for entry in competitors_list:
             comp = entry.get("competitor", entry)
-            team_name = comp.get("name", "")
-            if name in team_name.lower() or team_name.lower() in name:
-                matches.append({
-                    "time": team_name,
-                    "time_id": comp.get("id"),
-                    "posicao": None,
-                    "pontos": None,
-                    "competicao_id": competition,
-                    "season_id": season_urn,
-                    "fonte": "api"
-                })
+            _team_search_index.add(comp.get("id"), comp.get("name"), competition,
+                                   aliases=(comp.get("short_name") or "",))
     else:
-        data2, error2 = call_sportradar(
-            f"/competitions/{competition}/seasons/{season_urn}/standings.json"
-        )
+        # Montar o snapshot já indexa os times da tabela
+        snapshot, error2 = _standings_store.get(competition, season_urn)
         if error2:
             return error_response(
                 f"Time nao encontrado no mapeamento local e a API retornou erro. "
                 f"competitors: {error} | standings: {error2}", 500
             )
-        for standing in data2.get("standings", []):
-            if standing.get("type") != "total":
-                continue
-            for group in standing.get("groups", []):
-                for entry in group.get("standings", []):
-                    team = entry.get("team", {})
-                    team_name = team.get("name", "")
-                    if name in team_name.lower() or team_name.lower() in name:
-                        matches.append({
-                            "time": team_name,
-                            "time_id": team.get("id"),
-                            "posicao": entry.get("rank"),
-                            "pontos": entry.get("points", 0),
-                            "competicao_id": competition,
-                            "season_id": season_urn,
-                            "fonte": "api"
-                        })
 
-    return jsonify({
-        "ok": True,
-        "query": name,
-        "competition": competition,
-        "season": season_urn,
-        "total": len(matches),
-        "times": matches
-    })
+    return result(_team_search_index.search(name, competition), snapshot)
 
 
 @app.route("/teams/statistics")
@@ -1099,6 +3251,10 @@ def team_statistics():
             params={"competitor": team}
         )
 
+    not_modified = _not_modified()
+    if not_modified:
+        return not_modified
+
     return jsonify({
         "ok": True,
         "team": {
@@ -1146,13 +3302,16 @@ def top_scorers():
     if not season_urn:
         season_urn, error = _get_current_season_urn(competition)
         if error:
-            return error_response(f"Nao foi possivel detectar a temporada: {error}", 500)
+            return error_response(f"Nao foi possivel detectar a temporada: {error}", getattr(error, "status", 500))
 
     data, error = call_sportradar(
-        f"/competitions/{competition}/seasons/{season_urn}/top_scorers.json"
+        f"/competitions/{competition}/seasons/{season_urn}/top_scorers.json", swr=True
     )
     if error:
         return error_response(error, 500)
+    not_modified = _not_modified()
+    if not_modified:
+        return not_modified
 
     top_scorers_raw = data.get("top_scorers", {})
     artilheiros = []
@@ -1175,11 +3334,15 @@ def top_scorers():
             })
 
     artilheiros.sort(key=lambda x: x.get("gols", 0), reverse=True)
+    # Lista pequena (precisa ser ordenada antes); NDJSON só evita o envelope único
+    if _wants_ndjson():
+        return _ndjson_response(artilheiros)
     return jsonify({
         "ok": True,
         "competition": competition,
         "season": season_urn,
         "total": len(artilheiros),
+        "stale": _data_is_stale(),
         "artilheiros": artilheiros
     })
 
@@ -1210,6 +3373,9 @@ def head_to_head():
     )
     if error:
         return error_response(error, 500)
+    not_modified = _not_modified()
+    if not_modified:
+        return not_modified
 
     last_meetings = data.get("last_meetings", {})
     results_raw = last_meetings.get("results", [])
@@ -1282,6 +3448,9 @@ def predictions():
     data, error = call_sportradar(f"/sport_events/{fixture}/probabilities.json")
     if error:
         return error_response(error, 500)
+    not_modified = _not_modified()
+    if not_modified:
+        return not_modified
 
     sport_event = data.get("sport_event", {})
     probabilities = data.get("probabilities", [])
@@ -1330,40 +3499,47 @@ def live_fixtures():
     data, error = call_sportradar("/schedules/live/summaries.json")
     if error:
         return error_response(error, 500)
+    not_modified = _not_modified()
+    if not_modified:
+        return not_modified
 
     summaries = data.get("summaries", [])
-    partidas = []
 
-    for summary in summaries[:MAX_LIVE_FIXTURES]:
-        sport_event = summary.get("sport_event", {})
-        status_obj = summary.get("sport_event_status", {})
+    def rows():
+        for summary in summaries[:MAX_LIVE_FIXTURES]:
+            sport_event = summary.get("sport_event", {})
+            status_obj = summary.get("sport_event_status", {})
 
-        competitors = sport_event.get("competitors", [])
-        home_name = away_name = None
-        for c in competitors:
-            if c.get("qualifier") == "home":
-                home_name = c.get("name")
-            elif c.get("qualifier") == "away":
-                away_name = c.get("name")
+            competitors = sport_event.get("competitors", [])
+            home_name = away_name = None
+            for c in competitors:
+                if c.get("qualifier") == "home":
+                    home_name = c.get("name")
+                elif c.get("qualifier") == "away":
+                    away_name = c.get("name")
 
-        ctx = sport_event.get("sport_event_context", {})
-        comp = ctx.get("competition", {})
-        clock = status_obj.get("clock", {})
+            ctx = sport_event.get("sport_event_context", {})
+            comp = ctx.get("competition", {})
+            clock = status_obj.get("clock", {})
 
-        home_score = status_obj.get("home_score", 0)
-        away_score = status_obj.get("away_score", 0)
+            home_score = status_obj.get("home_score", 0)
+            away_score = status_obj.get("away_score", 0)
 
-        partidas.append({
-            "id": sport_event.get("id"),
-            "status": _parse_status_sportradar(status_obj.get("status", "")),
-            "match_status": status_obj.get("match_status"),
-            "minuto": clock.get("match_time"),
-            "competicao": comp.get("name"),
-            "competicao_id": comp.get("id"),
-            "mandante": home_name,
-            "visitante": away_name,
-            "placar": f"{home_score}x{away_score}"
-        })
+            yield {
+                "id": sport_event.get("id"),
+                "status": _parse_status_sportradar(status_obj.get("status", "")),
+                "match_status": status_obj.get("match_status"),
+                "minuto": clock.get("match_time"),
+                "competicao": comp.get("name"),
+                "competicao_id": comp.get("id"),
+                "mandante": home_name,
+                "visitante": away_name,
+                "placar": f"{home_score}x{away_score}"
+            }
+
+    if _wants_ndjson():
+        return _ndjson_response(rows())
+    partidas = list(rows())
 
     return jsonify({
         "ok": True,
@@ -1385,7 +3561,13 @@ def live_analysis():
     - Placar e minuto atuais
     - Fator Must Win (baseado em tabela se disponível)
     - Estatísticas da partida (via timeline)
+    - Tendências dos últimos 10/15 minutos (escanteios/min, finalizações/min,
+      mudança de pressão), lidas do histórico em _live_match_store
     - Sugestões de apostas ao vivo
+
+    Leitura de jogo em andamento mantém o _LivePoller ativo por mais
+    LIVE_WATCH_TTL segundos: o histórico segue sendo amostrado e as leituras
+    seguintes saem do cache que ele grava.
     """
     fixture_id = request.args.get("fixture")
     if not fixture_id:
@@ -1395,6 +3577,15 @@ def live_analysis():
     data, error = call_sportradar(f"/sport_events/{fixture_id}/summary.json")
     if error:
         return error_response(error, 500)
+    if data.get("sport_event_status", {}).get("status") == "live":
+        _live_poller.watch()
+
+    match = _live_match_store.record(data)
+    with _live_match_store.lock:
+        tendencias = {f"ultimos_{size}_min": match.rates(size) for size in LIVE_RATE_WINDOWS} if match else {}
+        if match:
+            tendencias["mudanca_pressao"] = match.pressure_shift()
+            tendencias["desde_minuto"] = match.first_minute
 
     sport_event = data.get("sport_event", {})
     status_obj = data.get("sport_event_status", {})
@@ -1411,8 +3602,7 @@ def live_analysis():
             away_name = c.get("name")
             away_id = c.get("id")
 
-    clock = status_obj.get("clock", {})
-    elapsed = int(clock.get("match_time", 0) or 0)
+    elapsed = _clock_minute(status_obj.get("clock", {}))
     match_status = status_obj.get("match_status", "")
     home_score = status_obj.get("home_score", 0)
     away_score = status_obj.get("away_score", 0)
@@ -1470,7 +3660,21 @@ def live_analysis():
         h_corners = live_stats["mandante"].get("corner_kicks", 0) or 0
         a_corners = live_stats["visitante"].get("corner_kicks", 0) or 0
         total_corners = int(h_corners) + int(a_corners)
-        if elapsed > 0:
+        recent = tendencias.get(f"ultimos_{LIVE_RATE_WINDOWS[-1]}_min") or {}
+        if recent.get("janela_min", 0) >= 5 and elapsed < 90:
+            # Ritmo recente projeta o restante do jogo melhor que a média desde o apito inicial
+            rate = recent["escanteios_por_min"]["total"]
+            proj = round(total_corners + rate * (90 - elapsed), 1)
+            sugestoes.append({
+                "tipo": "Escanteios",
+                "mercado": f"Projecao: {proj} escanteios no jogo",
+                "justificativa": (
+                    f"{total_corners} escanteios em {elapsed}'; ritmo de {rate}/min nos "
+                    f"ultimos {recent['janela_min']}'"
+                ),
+                "confianca": 4 if elapsed > 30 else 3
+            })
+        elif elapsed > 0:
             proj = round(total_corners / elapsed * 90, 1)
             sugestoes.append({
                 "tipo": "Escanteios",
@@ -1497,6 +3701,7 @@ def live_analysis():
             }
         },
         "estatisticas_ao_vivo": live_stats,
+        "tendencias": tendencias,
         "must_win": {
             "mandante": must_win_home,
             "visitante": must_win_away,
@@ -1514,139 +3719,145 @@ def minute_by_minute_analysis():
 
     Query Parameters:
         - fixture (required): URN do jogo (ex: sr:sport_event:12345)
+        - since (optional): id do último evento já recebido; retorna só o delta
+          (`eventos_novos`) e os totais por período
 
     Retorna:
     - Timeline completa de eventos (gols, cartões, substituições)
     - Análise de cada período (0-15, 16-30, 31-45, etc.)
     - Momentos-chave identificados
+    - ultimo_evento_id para a próxima chamada com `since`
+
+    A timeline é processada de forma incremental (ver _TimelineStore).
     """
     fixture_id = request.args.get("fixture")
     if not fixture_id:
         return error_response("Parametro 'fixture' e obrigatorio (ex: sr:sport_event:12345)")
 
+    since = request.args.get("since")
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return error_response("Parametro 'since' deve ser o id numerico de um evento")
+
     data, error = call_sportradar(f"/sport_events/{fixture_id}/timeline.json")
     if error:
         return error_response(error, 500)
+    not_modified = _not_modified()
+    if not_modified:
+        return not_modified
 
-    sport_event = data.get("sport_event", {})
     status_obj = data.get("sport_event_status", {})
-    timeline_raw = data.get("timeline", [])
 
-    competitors = sport_event.get("competitors", [])
-    home_name = away_name = None
-    for c in competitors:
-        if c.get("qualifier") == "home":
-            home_name = c.get("name")
-        elif c.get("qualifier") == "away":
-            away_name = c.get("name")
-
-    # Processar eventos
-    timeline = []
-    goals_timeline = []
-    cards_timeline = []
-    substitutions = []
-
-    for event in timeline_raw:
-        minute = event.get("match_time", 0) or 0
-        event_type = event.get("type", "")
-        competitor = event.get("competitor", "")
-        player = event.get("player", {})
-        player_name = player.get("name", "Desconhecido") if player else "Desconhecido"
-
-        # Mapear team name
-        team_name = home_name if competitor == "home" else (away_name if competitor == "away" else competitor)
-
-        event_obj = {
-            "minuto": minute,
-            "minuto_display": f"{minute}'",
-            "tipo": event_type,
-            "time": team_name,
-            "jogador": player_name,
-            "descricao": event.get("description", "")
-        }
-
-        if event_type in ("score_change",):
-            event_obj["placar"] = {
-                "mandante": event.get("home_score"),
-                "visitante": event.get("away_score")
-            }
-            goals_timeline.append(event_obj)
-        elif event_type in ("yellow_card", "red_card", "yellow_red_card"):
-            cards_timeline.append(event_obj)
-        elif event_type in ("substitution",):
-            substitutions.append(event_obj)
-
-        timeline.append(event_obj)
-
-    # Análise por períodos
-    periods = {
-        "0-15": {"gols": 0, "cartoes": 0, "eventos": []},
-        "16-30": {"gols": 0, "cartoes": 0, "eventos": []},
-        "31-45": {"gols": 0, "cartoes": 0, "eventos": []},
-        "46-60": {"gols": 0, "cartoes": 0, "eventos": []},
-        "61-75": {"gols": 0, "cartoes": 0, "eventos": []},
-        "76-90+": {"gols": 0, "cartoes": 0, "eventos": []}
-    }
-
-    def get_period(m):
-        if m <= 15: return "0-15"
-        if m <= 30: return "16-30"
-        if m <= 45: return "31-45"
-        if m <= 60: return "46-60"
-        if m <= 75: return "61-75"
-        return "76-90+"
-
-    for event in timeline:
-        m = event.get("minuto", 0)
-        p = get_period(m)
-        if event["tipo"] == "score_change":
-            periods[p]["gols"] += 1
-        elif event["tipo"] in ("yellow_card", "red_card", "yellow_red_card"):
-            periods[p]["cartoes"] += 1
-        periods[p]["eventos"].append(event)
-
-    # Momentos-chave
-    momentos_chave = []
-    if periods["0-15"]["gols"] > 0:
-        momentos_chave.append({
-            "periodo": "0-15",
-            "descricao": f"Inicio eletrico com {periods['0-15']['gols']} gol(s)",
-            "impacto": "ALTO"
-        })
-
-    periodo_mais_movimentado = max(periods.items(), key=lambda x: len(x[1]["eventos"]))
-    if len(periodo_mais_movimentado[1]["eventos"]) >= 5:
-        momentos_chave.append({
-            "periodo": periodo_mais_movimentado[0],
-            "descricao": f"Periodo mais agitado com {len(periodo_mais_movimentado[1]['eventos'])} eventos",
-            "impacto": "MODERADO"
-        })
-
-    return jsonify({
-        "ok": True,
-        "jogo": {
+    with _timeline_store.lock:
+        state = _timeline_store.update(fixture_id, data)
+        jogo = {
             "id": fixture_id,
-            "mandante": home_name,
-            "visitante": away_name,
+            "mandante": state.home_name,
+            "visitante": state.away_name,
             "status": _parse_status_sportradar(status_obj.get("status", "")),
             "placar": {
                 "mandante": status_obj.get("home_score"),
                 "visitante": status_obj.get("away_score")
             }
-        },
-        "timeline_completa": sorted(timeline, key=lambda x: x["minuto"]),
-        "analise_por_periodos": periods,
+        }
+        resumo = {
+            "total_eventos": len(state.timeline),
+            "total_gols": state.goals,
+            "total_cartoes": state.cards,
+            "total_substituicoes": state.substitutions
+        }
+        momentos_chave = state.key_moments()
+
+        if since is None:
+            result = {
+                "timeline_completa": list(state.timeline),
+                "analise_por_periodos": {
+                    p: dict(v, eventos=list(v["eventos"])) for p, v in state.periods.items()
+                }
+            }
+        else:
+            # Delta: só eventos posteriores a `since` (ids crescentes, procurados a partir do fim)
+            novos = []
+            for p in TIMELINE_PERIODS:
+                for event in reversed(state.periods[p]["eventos"]):
+                    if (event["id"] or 0) <= since:
+                        break
+                    novos.append(event)
+            novos.sort(key=lambda e: e["minuto"])
+            result = {
+                "since": since,
+                "eventos_novos": novos,
+                "analise_por_periodos": {
+                    p: {"gols": v["gols"], "cartoes": v["cartoes"], "total_eventos": len(v["eventos"])}
+                    for p, v in state.periods.items()
+                }
+            }
+        ultimo_evento_id = state.last_id
+
+    return jsonify({
+        "ok": True,
+        "jogo": jogo,
+        **result,
         "momentos_chave": momentos_chave,
-        "resumo": {
-            "total_eventos": len(timeline),
-            "total_gols": len(goals_timeline),
-            "total_cartoes": len(cards_timeline),
-            "total_substituicoes": len(substitutions)
-        },
+        "resumo": resumo,
+        "ultimo_evento_id": ultimo_evento_id,
         "timestamp": datetime.utcnow().isoformat() + "Z"
     })
 
 
+@app.route("/fixtures/live/stream")
+def live_stream():
+    """
+    Stream Server-Sent Events com as mudanças dos jogos ao vivo.
+
+    Query Parameters:
+        - fixture (optional): URN(s) de jogo separados por vírgula para filtrar
+
+    Eventos: snapshot (estado atual ao conectar), inicio, placar, relogio,
+    status, estatisticas (só os campos alterados) e fim. Todos os clientes
+    compartilham o mesmo poller; o custo na Sportradar não cresce com o
+    número de conexões.
+
+    Limitação: com workers gthread cada conexão prende uma thread, então a
+    capacidade é LIVE_STREAM_MAX_CLIENTS por worker (padrão 2, ou seja 4 no
+    Procfile atual). Acima disso o cliente recebe 503 e volta ao polling de
+    /fixtures/live/analysis, cujo custo segue o do poller compartilhado.
+    """
+    if not API_KEY:
+        return error_response("API_KEY nao configurada. Configure sua chave Sportradar.", 500)
+
+    fixtures = [f.strip() for f in request.args.get("fixture", "").split(",") if f.strip()]
+    subscription = _live_poller.subscribe(fixtures)
+    if subscription is None:
+        return error_response(
+            "Limite de conexoes ao vivo atingido. Use /fixtures/live/analysis (polling) ou tente novamente em instantes.", 503
+        )
+    sub_id, q = subscription
+
+    def generate():
+        try:
+            yield f"retry: {LIVE_POLL_INTERVAL * 1000}\n\n"
+            yield _sse("snapshot", {"partidas": _live_poller.snapshot(fixtures)})
+            while True:
+                try:
+                    name, payload = q.get(timeout=LIVE_STREAM_HEARTBEAT)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse(name, payload)
+                if name == "fim_stream":
+                    return
+        finally:
+            _live_poller.unsubscribe(sub_id)
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
 @app.route("/injuries")
 def injuries():
     """
@@ -1670,39 +3881,46 @@ def injuries():
     if not season_urn:
         season_urn, error = _get_current_season_urn(competition)
         if error:
-            return error_response(f"Nao foi possivel detectar a temporada: {error}", 500)
+            return error_response(f"Nao foi possivel detectar a temporada: {error}", getattr(error, "status", 500))
 
     data, error = call_sportradar(
-        f"/competitions/{competition}/seasons/{season_urn}/missing_players.json"
+        f"/competitions/{competition}/seasons/{season_urn}/missing_players.json", swr=True
     )
     if error:
         return error_response(error, 500)
+    not_modified = _not_modified()
+    if not_modified:
+        return not_modified
 
     missing = data.get("missing_players", {})
     competitors_raw = missing.get("competitors", [])
 
-    lesoes = []
-    for comp_entry in competitors_raw:
-        comp = comp_entry.get("competitor", {})
-        comp_id = comp.get("id")
-        comp_name = comp.get("name")
+    def rows():
+        for comp_entry in competitors_raw:
+            comp = comp_entry.get("competitor", {})
+            comp_id = comp.get("id")
+            comp_name = comp.get("name")
 
-        # Filtrar por time se solicitado
-        if team_filter and comp_id != team_filter:
-            continue
+            # Filtrar por time se solicitado
+            if team_filter and comp_id != team_filter:
+                continue
 
-        for player_entry in comp_entry.get("players", []):
-            player = player_entry.get("player", {})
-            lesoes.append({
-                "time": comp_name,
-                "time_id": comp_id,
-                "jogador": player.get("name"),
-                "jogador_id": player.get("id"),
-                "tipo": player_entry.get("type"),
-                "lesionado": player_entry.get("injured", False),
-                "desde": player_entry.get("started_at"),
-                "retorno_previsto": player_entry.get("return_date")
-            })
+            for player_entry in comp_entry.get("players", []):
+                player = player_entry.get("player", {})
+                yield {
+                    "time": comp_name,
+                    "time_id": comp_id,
+                    "jogador": player.get("name"),
+                    "jogador_id": player.get("id"),
+                    "tipo": player_entry.get("type"),
+                    "lesionado": player_entry.get("injured", False),
+                    "desde": player_entry.get("started_at"),
+                    "retorno_previsto": player_entry.get("return_date")
+                }
+
+    if _wants_ndjson():
+        return _ndjson_response(rows())
+    lesoes = list(rows())
 
     return jsonify({
         "ok": True,
@@ -1710,6 +3928,7 @@ def injuries():
         "season": season_urn,
         "team_filter": team_filter,
         "total": len(lesoes),
+        "stale": _data_is_stale(),
         "lesoes": lesoes
     })
 
@@ -1752,7 +3971,9 @@ def analysis_corners():
         - team_home (required): URN do time mandante
         - team_away (required): URN do time visitante
 
-    Baseia-se em informações da tabela (standings) para calcular Must Win.
+    A estimativa vem de _set_piece_model (taxas de escanteios por time em
+    casa/fora, sem chamada à Sportradar) com distribuição de Poisson por
+    linha; o Must Win (tabela + forma) ajusta a confiança da sugestão.
     """
     competition = request.args.get("competition")
     season_urn = request.args.get("season")
@@ -1766,61 +3987,51 @@ def analysis_corners():
     if not season_urn:
         season_urn, error = _get_current_season_urn(competition)
         if error:
-            return error_response(f"Nao foi possivel detectar a temporada: {error}", 500)
-
-    # Buscar standings para calcular posições
-    standings_data, _ = call_sportradar(
-        f"/competitions/{competition}/seasons/{season_urn}/standings.json"
-    )
+            return error_response(f"Nao foi possivel detectar a temporada: {error}", getattr(error, "status", 500))
 
+    # Posições na tabela (snapshot compartilhado)
     home_position = away_position = total_teams = None
     home_points = away_points = 0
 
-    try:
-        if standings_data:
-            for standing in standings_data.get("standings", []):
-                if standing.get("type") != "total":
-                    continue
-                for group in standing.get("groups", []):
-                    entries = group.get("standings", [])
-                    total_teams = len(entries)
-                    for entry in entries:
-                        t = entry.get("team", {})
-                        if t.get("id") == team_home:
-                            home_position = entry.get("rank")
-                            home_points = entry.get("points", 0)
-                        if t.get("id") == team_away:
-                            away_position = entry.get("rank")
-                            away_points = entry.get("points", 0)
-    except Exception as e:
-        logger.warning(f"Erro ao processar standings para corners: {e}")
+    snapshot, _ = _standings_store.get(competition, season_urn)
+    if snapshot:
+        home_position, home_points, _, home_total = snapshot.lookup(team_home)
+        away_position, away_points, _, away_total = snapshot.lookup(team_away)
+        total_teams = home_total or away_total
 
     form_home, _ = _get_team_form(team_home)
     form_away, _ = _get_team_form(team_away)
     must_win_home = calculate_must_win_factor(form_home, home_position, total_teams)
     must_win_away = calculate_must_win_factor(form_away, away_position, total_teams)
 
-    estimativa = DEFAULT_CORNERS_ESTIMATE
+    estimate = _set_piece_model.estimate(
+        "corners", competition, team_home, team_away, DEFAULT_CORNERS_ESTIMATE, CORNER_LINES
+    )
     must_win_combined = (must_win_home["score"] + must_win_away["score"]) / 2
     base_confidence = 4.0
     adjusted_confidence = min(5.0, base_confidence + (must_win_combined - 5.0) * 0.15)
+    mercado, probabilidade, odd_justa = _set_piece_suggestion(estimate, "Escanteios Totais")
 
     return jsonify({
         "ok": True,
         "analise_escanteios": {
             "time_casa": {"id": team_home, "posicao": home_position, "pontos": home_points, "must_win": must_win_home},
             "time_fora": {"id": team_away, "posicao": away_position, "pontos": away_points, "must_win": must_win_away},
-            "estimativa_total": estimativa,
+            **estimate,
             "analise_must_win": {
                 "impacto": "Times pressionados tendem a jogar mais ofensivamente, gerando mais escanteios",
                 "fator_combinado": round(must_win_combined, 1)
             },
             "sugestoes": [{
-                "mercado": "Over 9.5 Escanteios Totais",
+                "mercado": mercado,
                 "confianca": round(adjusted_confidence, 1),
-                "value_estimado": "+20%" if estimativa >= 10 else "+10%"
-            }],
-            "nota": "Estimativa baseada em posicao na tabela (Must Win). Para maior precisao, use estatisticas de escanteios do time via /teams/statistics."
+                "probabilidade": probabilidade,
+                "odd_justa": odd_justa
+            }] if mercado else [],
+            "nota": (
+                "Estimativa pelas medias de escanteios de cada time em casa/fora (Poisson), "
+                "combinadas com a media da competicao quando a amostra e pequena."
+            )
         }
     })
 
@@ -1835,6 +4046,9 @@ def analysis_cards():
         - season: URN da temporada (auto-detecta se omitido)
         - team_home (required): URN do time mandante
         - team_away (required): URN do time visitante
+
+    Mesma estrutura de /analysis/corners, com as taxas de cartões do
+    _set_piece_model.
     """
     competition = request.args.get("competition")
     season_urn = request.args.get("season")
@@ -1847,56 +4061,45 @@ def analysis_cards():
     if not season_urn:
         season_urn, error = _get_current_season_urn(competition)
         if error:
-            return error_response(f"Nao foi possivel detectar a temporada: {error}", 500)
-
-    standings_data, _ = call_sportradar(
-        f"/competitions/{competition}/seasons/{season_urn}/standings.json"
-    )
+            return error_response(f"Nao foi possivel detectar a temporada: {error}", getattr(error, "status", 500))
 
     home_position = away_position = total_teams = None
 
-    try:
-        if standings_data:
-            for standing in standings_data.get("standings", []):
-                if standing.get("type") != "total":
-                    continue
-                for group in standing.get("groups", []):
-                    entries = group.get("standings", [])
-                    total_teams = len(entries)
-                    for entry in entries:
-                        t = entry.get("team", {})
-                        if t.get("id") == team_home:
-                            home_position = entry.get("rank")
-                        if t.get("id") == team_away:
-                            away_position = entry.get("rank")
-    except Exception as e:
-        logger.warning(f"Erro ao processar standings para cards: {e}")
+    snapshot, _ = _standings_store.get(competition, season_urn)
+    if snapshot:
+        home_position, _, _, home_total = snapshot.lookup(team_home)
+        away_position, _, _, away_total = snapshot.lookup(team_away)
+        total_teams = home_total or away_total
 
     form_home, _ = _get_team_form(team_home)
     form_away, _ = _get_team_form(team_away)
     must_win_home = calculate_must_win_factor(form_home, home_position, total_teams)
     must_win_away = calculate_must_win_factor(form_away, away_position, total_teams)
 
-    estimativa = DEFAULT_CARDS_ESTIMATE
+    estimate = _set_piece_model.estimate(
+        "cards", competition, team_home, team_away, DEFAULT_CARDS_ESTIMATE, CARD_LINES
+    )
     must_win_combined = (must_win_home["score"] + must_win_away["score"]) / 2
     base_confidence = 4.0
     adjusted_confidence = min(5.0, base_confidence + (must_win_combined - 5.0) * 0.2)
+    mercado, probabilidade, odd_justa = _set_piece_suggestion(estimate, "Cartoes Totais")
 
     return jsonify({
         "ok": True,
         "analise_cartoes": {
             "time_casa": {"id": team_home, "posicao": home_position, "must_win": must_win_home},
             "time_fora": {"id": team_away, "posicao": away_position, "must_win": must_win_away},
-            "estimativa_total": estimativa,
+            **estimate,
             "analise_must_win": {
                 "impacto": "Times pressionados jogam com mais intensidade, resultando em mais cartoes",
                 "fator_combinado": round(must_win_combined, 1)
             },
             "sugestoes": [{
-                "mercado": "Over 5.5 Cartoes Totais",
+                "mercado": mercado,
                 "confianca": round(adjusted_confidence, 1),
-                "value_estimado": "+25%" if estimativa >= 5.5 else "+10%"
-            }]
+                "probabilidade": probabilidade,
+                "odd_justa": odd_justa
+            }] if mercado else []
         }
     })
 
@@ -1923,7 +4126,7 @@ def analysis_value():
     if error:
         return error_response(f"{error}. Exemplo: probability=0.50 (50%)")
 
-    value = round((prob * odd) - 1, 3)
+    value = _value_bet_value(odd, prob)
     return jsonify({
         "ok": True,
         "value": value,
@@ -1933,6 +4136,125 @@ def analysis_value():
     })
 
 
+def _value_bet_value(odd, prob):
+    """Value da aposta: (probabilidade × odd) - 1, arredondado como em /analysis/value."""
+    return round((prob * odd) - 1, 3)
+
+
+def _read_value_batch():
+    """
+    Lê o corpo de /analysis/value/batch.
+
+    Aceita JSON {"odds": [...], "probabilities": [...], "mercados": [...]}
+    ou CSV com cabeçalho odd,probability[,mercado].
+    Retorna ((odds, probs, mercados), error).
+    """
+    if request.mimetype in ("text/csv", "text/plain"):
+        reader = csv.DictReader(io.StringIO(request.get_data(as_text=True)))
+        if not reader.fieldnames or not {"odd", "probability"} <= set(reader.fieldnames):
+            return None, "CSV deve ter cabecalho com as colunas 'odd' e 'probability' (e opcional 'mercado')"
+        odds, probs, mercados = [], [], []
+        for row in reader:
+            odds.append(row.get("odd"))
+            probs.append(row.get("probability"))
+            mercados.append(row.get("mercado") or None)
+        if not any(mercados):
+            mercados = None
+    else:
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return None, "Corpo deve ser JSON {\"odds\": [...], \"probabilities\": [...]} ou CSV (text/csv)"
+        odds, probs, mercados = body.get("odds"), body.get("probabilities"), body.get("mercados")
+        if not isinstance(odds, list) or not isinstance(probs, list):
+            return None, "Campos 'odds' e 'probabilities' devem ser listas"
+        if mercados is not None and (not isinstance(mercados, list) or len(mercados) != len(odds)):
+            return None, "Campo 'mercados' deve ser uma lista do mesmo tamanho de 'odds'"
+        if mercados is not None and not all(m is None or isinstance(m, str) for m in mercados):
+            return None, "Itens de 'mercados' devem ser texto ou null"
+
+    if len(odds) != len(probs):
+        return None, f"'odds' ({len(odds)}) e 'probabilities' ({len(probs)}) devem ter o mesmo tamanho"
+    if not odds:
+        return None, "Nenhuma odd informada"
+    return (odds, probs, mercados), None
+
+
+@app.route("/analysis/value/batch", methods=["POST"])
+def analysis_value_batch():
+    """
+    Value Bet em lote: até VALUE_BATCH_MAX_ITEMS pares (odd, probabilidade) por chamada.
+
+    Body (JSON): {"odds": [2.1, 3.4], "probabilities": [0.52, 0.30], "mercados": ["1x2", "1x2"]}
+    Body (CSV, text/csv): cabeçalho odd,probability[,mercado]
+
+    Uma única passada calcula, por item: value, fração de Kelly, probabilidade
+    implícita (1/odd) e margem (probabilidade estimada - implícita). Com
+    `mercados`, também o overround de cada mercado (soma de 1/odd - 1).
+    Resposta em colunas (listas paralelas); itens inválidos ficam null e são
+    listados em `erros`.
+    """
+    batch, error = _read_value_batch()
+    if error:
+        return error_response(error)
+    odds_in, probs_in, mercados = batch
+    n = len(odds_in)
+    if n > VALUE_BATCH_MAX_ITEMS:
+        return error_response(f"Maximo de {VALUE_BATCH_MAX_ITEMS} itens por lote (recebidos {n})", 413)
+
+    odds, probs, values, kelly, implied, margin, recommendation = [], [], [], [], [], [], []
+    overround = {}
+    erros = []
+    for i in range(n):
+        # bool é subclasse de int: true/false não passam como 1/0
+        if isinstance(odds_in[i], bool) or isinstance(probs_in[i], bool):
+            odd, err = None, "Parametros 'odd' e 'probability' devem ser numericos (booleano recebido)"
+        else:
+            odd, err = validate_numeric_param(odds_in[i], "odd", min_val=MIN_ODD_VALUE, max_val=MAX_ODD_VALUE)
+        if not err:
+            prob, err = validate_numeric_param(
+                probs_in[i], "probability", min_val=MIN_PROBABILITY, max_val=MAX_PROBABILITY
+            )
+        if err:
+            erros.append({"indice": i, "erro": err})
+            for column in (odds, probs, values, kelly, implied, margin, recommendation):
+                column.append(None)
+            continue
+
+        value = _value_bet_value(odd, prob)
+        inverse = 1 / odd
+        odds.append(odd)
+        probs.append(prob)
+        values.append(value)
+        # Kelly: (b·p - q) / b com b = odd - 1  ==  value / (odd - 1); sem aposta se negativo
+        kelly.append(round(max(0.0, (prob * odd - 1) / (odd - 1)), 4))
+        implied.append(round(inverse, 4))
+        margin.append(round(prob - inverse, 4))
+        recommendation.append("Apostar" if value > 0.05 else "Evitar")
+        if mercados is not None and mercados[i] is not None:
+            overround[mercados[i]] = overround.get(mercados[i], -1.0) + inverse
+
+    response = {
+        "ok": True,
+        "total": n,
+        "validos": n - len(erros),
+        "value_bets": sum(1 for v in values if v is not None and v > 0),
+        "colunas": {
+            "odd": odds,
+            "probability": probs,
+            "value": values,
+            "kelly": kelly,
+            "prob_implicita": implied,
+            "margem": margin,
+            "recommendation": recommendation
+        },
+        "erros": erros
+    }
+    if mercados is not None:
+        response["colunas"]["mercado"] = mercados
+        response["overround_por_mercado"] = {m: round(v, 4) for m, v in overround.items()}
+    return jsonify(response)
+
+
 # =======================
 # Endpoint contextual
 # =======================
@@ -1975,7 +4297,7 @@ def news_context():
     }
 
     try:
-        response = requests.get(url, headers={"Authorization": NEWS_API_KEY}, params=params, timeout=10)
+        response = _http_session().get(url, headers={"Authorization": NEWS_API_KEY}, params=params, timeout=10)
         if response.status_code != 200:
             return error_response(f"Erro na API de noticias: HTTP {response.status_code}", 500)
 
@@ -2002,34 +4324,15 @@ def news_context():
 # =======================
 # Análise completa
 # =======================
-@app.route("/analysis/complete")
-def analysis_complete():
+def _build_complete_analysis(competition, team_home, team_away, season_urn, snapshot,
+                             form_home, form_away, h2h_data, prob_data):
     """
-    Análise completa de um jogo consolidando standings, H2H e Must Win.
+    Monta o JSON de /analysis/complete a partir dos dados já buscados.
 
-    Query Parameters:
-        - competition (required): URN da competição (ex: sr:competition:325)
-        - team_home (required): URN do time mandante (ex: sr:competitor:1234)
-        - team_away (required): URN do time visitante (ex: sr:competitor:5678)
-        - season: URN da temporada (auto-detecta se omitido)
-        - fixture: URN do jogo para probabilidades (ex: sr:sport_event:12345)
-
-    Retorna análise consolidada com:
-    - Classificação dos times
-    - Fator Must Win
-    - H2H (últimos confrontos)
-    - Probabilidades (se fixture fornecido)
-    - Análise de escanteios e cartões (baseada em Must Win)
+    Compartilhado por /analysis/complete e /analysis/complete/batch; não faz
+    chamadas à Sportradar. Qualquer dado ausente (None) é omitido da análise;
+    dado malformado vira uma entrada em "erros" para a seção afetada.
     """
-    competition = request.args.get("competition")
-    team_home = request.args.get("team_home")
-    team_away = request.args.get("team_away")
-    season_urn = request.args.get("season")
-    fixture_id = request.args.get("fixture")
-
-    if not (competition and team_home and team_away):
-        return error_response("Parametros obrigatorios: competition, team_home, team_away")
-
     complete_analysis = {
         "ok": True,
         "jogo": {
@@ -2045,47 +4348,20 @@ def analysis_complete():
         "analise_cartoes": {}
     }
 
-    # 1. Auto-detectar temporada
-    if not season_urn:
-        logger.info("[ANALYSIS COMPLETE] Detectando temporada atual...")
-        season_urn, error = _get_current_season_urn(competition)
-        if error:
-            logger.warning(f"[ANALYSIS COMPLETE] Falha ao detectar temporada: {error}")
-        else:
-            complete_analysis["jogo"]["temporada"] = season_urn
-
-    # 2. Buscar standings
+    # 1-2. Temporada e classificação
     if season_urn:
-        logger.info(f"[ANALYSIS COMPLETE] Buscando classificacao de {competition}")
-        standings_data, _ = call_sportradar(
-            f"/competitions/{competition}/seasons/{season_urn}/standings.json"
-        )
-
         home_position = away_position = total_teams = None
         home_points = away_points = 0
         home_name = away_name = None
 
-        try:
-            if standings_data:
-                for standing in standings_data.get("standings", []):
-                    if standing.get("type") != "total":
-                        continue
-                    for group in standing.get("groups", []):
-                        entries = group.get("standings", [])
-                        total_teams = len(entries)
-                        for entry in entries:
-                            t = entry.get("team", {})
-                            if t.get("id") == team_home:
-                                home_position = entry.get("rank")
-                                home_points = entry.get("points", 0)
-                                home_name = t.get("name")
-                            if t.get("id") == team_away:
-                                away_position = entry.get("rank")
-                                away_points = entry.get("points", 0)
-                                away_name = t.get("name")
-        except Exception as e:
-            logger.warning(f"[ANALYSIS COMPLETE] Erro ao processar standings: {e}")
+        if snapshot:
+            home_position, home_points, home_name, home_total = snapshot.lookup(team_home)
+            away_position, away_points, away_name, away_total = snapshot.lookup(team_away)
+            total_teams = home_total or away_total
 
+        # Sem classificação, o nome vem do registro local (sem chamada extra)
+        home_name = home_name or _competitor_registry.name_of(team_home, competition)
+        away_name = away_name or _competitor_registry.name_of(team_away, competition)
         if home_name:
             complete_analysis["jogo"]["mandante_nome"] = home_name
         if away_name:
@@ -2098,9 +4374,6 @@ def analysis_complete():
         }
 
         # 3. Must Win com forma recente
-        logger.info("[ANALYSIS COMPLETE] Buscando forma recente dos times")
-        form_home, _ = _get_team_form(team_home)
-        form_away, _ = _get_team_form(team_away)
         must_win_home = calculate_must_win_factor(form_home, home_position, total_teams)
         must_win_away = calculate_must_win_factor(form_away, away_position, total_teams)
         complete_analysis["contexto"]["must_win"] = {
@@ -2115,54 +4388,52 @@ def analysis_complete():
 
         # Análise de escanteios e cartões
         must_win_combined = (must_win_home["score"] + must_win_away["score"]) / 2
-        complete_analysis["analise_escanteios"] = {
-            "estimativa_total": DEFAULT_CORNERS_ESTIMATE,
-            "fator_must_win": round(must_win_combined, 1),
-            "sugestao": "Over 9.5 Escanteios Totais" if must_win_combined >= 5 else "Indefinido"
-        }
-        complete_analysis["analise_cartoes"] = {
-            "estimativa_total": DEFAULT_CARDS_ESTIMATE,
-            "fator_must_win": round(must_win_combined, 1),
-            "sugestao": "Over 5.5 Cartoes Totais" if must_win_combined >= 5 else "Indefinido"
-        }
+        for key, kind, default, lines, label in (
+            ("analise_escanteios", "corners", DEFAULT_CORNERS_ESTIMATE, CORNER_LINES, "Escanteios Totais"),
+            ("analise_cartoes", "cards", DEFAULT_CARDS_ESTIMATE, CARD_LINES, "Cartoes Totais"),
+        ):
+            estimate = _set_piece_model.estimate(kind, competition, team_home, team_away, default, lines)
+            mercado, probabilidade, _ = _set_piece_suggestion(estimate, label)
+            complete_analysis[key] = dict(
+                estimate,
+                fator_must_win=round(must_win_combined, 1),
+                sugestao=mercado or "Indefinido",
+                probabilidade=probabilidade
+            )
     else:
-        form_home, _ = _get_team_form(team_home)
-        form_away, _ = _get_team_form(team_away)
         must_win_home = calculate_must_win_factor(form_home)
         must_win_away = calculate_must_win_factor(form_away)
 
     # 4. H2H
-    logger.info("[ANALYSIS COMPLETE] Buscando historico H2H")
-    h2h_data, _ = call_sportradar(
-        f"/competitors/{team_home}/versus/{team_away}/summaries.json"
-    )
     if h2h_data:
-        last = h2h_data.get("last_meetings", {}).get("results", [])
-        h2h_matches = []
-        for match in last[:5]:
-            se = match.get("sport_event", {})
-            so = match.get("sport_event_status", {})
-            comps = se.get("competitors", [])
-            hn = an = None
-            for c in comps:
-                if c.get("qualifier") == "home": hn = c.get("name")
-                if c.get("qualifier") == "away": an = c.get("name")
-            h2h_matches.append({
-                "data": se.get("scheduled"),
-                "mandante": hn,
-                "visitante": an,
-                "placar": f"{so.get('home_score', 0)}-{so.get('away_score', 0)}"
-            })
-        complete_analysis["confronto_direto"] = {
-            "total": len(last),
-            "ultimos_jogos": h2h_matches
-        }
+        try:
+            last = h2h_data.get("last_meetings", {}).get("results", [])
+            h2h_matches = []
+            for match in last[:5]:
+                se = match.get("sport_event", {})
+                so = match.get("sport_event_status", {})
+                comps = se.get("competitors", [])
+                hn = an = None
+                for c in comps:
+                    if c.get("qualifier") == "home": hn = c.get("name")
+                    if c.get("qualifier") == "away": an = c.get("name")
+                h2h_matches.append({
+                    "data": se.get("scheduled"),
+                    "mandante": hn,
+                    "visitante": an,
+                    "placar": f"{so.get('home_score', 0)}-{so.get('away_score', 0)}"
+                })
+            complete_analysis["confronto_direto"] = {
+                "total": len(last),
+                "ultimos_jogos": h2h_matches
+            }
+        except Exception as e:
+            logger.warning(f"[ANALYSIS COMPLETE] Erro ao processar confronto direto: {e}")
+            complete_analysis.setdefault("erros", {})["confronto_direto"] = f"Erro ao processar confronto_direto: {e}"
 
     # 5. Probabilidades (se fixture fornecido)
-    if fixture_id:
-        logger.info(f"[ANALYSIS COMPLETE] Buscando probabilidades do jogo {fixture_id}")
-        prob_data, _ = call_sportradar(f"/sport_events/{fixture_id}/probabilities.json")
-        if prob_data:
+    if prob_data:
+        try:
             probs = prob_data.get("probabilities", [])
             prob_3way = next((p for p in probs if p.get("market") == "3way"), None)
             if prob_3way:
@@ -2173,13 +4444,947 @@ def analysis_complete():
                     "empate": outcomes.get("draw"),
                     "vitoria_visitante": outcomes.get("away_team_winner")
                 }
+        except Exception as e:
+            logger.warning(f"[ANALYSIS COMPLETE] Erro ao processar probabilidades: {e}")
+            complete_analysis.setdefault("erros", {})["probabilidades"] = f"Erro ao processar probabilidades: {e}"
+
+    return complete_analysis
+
+
+@app.route("/analysis/complete")
+def analysis_complete():
+    """
+    Análise completa de um jogo consolidando standings, H2H e Must Win.
+
+    Query Parameters:
+        - competition (required): URN da competição (ex: sr:competition:325)
+        - team_home (required): URN do time mandante (ex: sr:competitor:1234)
+        - team_away (required): URN do time visitante (ex: sr:competitor:5678)
+        - season: URN da temporada (auto-detecta se omitido)
+        - fixture: URN do jogo para probabilidades (ex: sr:sport_event:12345)
+
+    Retorna análise consolidada com:
+    - Classificação dos times
+    - Fator Must Win
+    - H2H (últimos confrontos)
+    - Probabilidades (se fixture fornecido)
+    - Análise de escanteios e cartões (baseada em Must Win)
+    """
+    competition = request.args.get("competition")
+    team_home = request.args.get("team_home")
+    team_away = request.args.get("team_away")
+    season_urn = request.args.get("season")
+    fixture_id = request.args.get("fixture")
+
+    if not (competition and team_home and team_away):
+        return error_response("Parametros obrigatorios: competition, team_home, team_away")
+
+    # Plano de chamadas: só a classificação depende da temporada; o resto sai em paralelo
+    deadline = time.time() + ANALYSIS_DEADLINE
+
+    def fetch_season(_):
+        if season_urn:
+            return season_urn, None
+        logger.info("[ANALYSIS COMPLETE] Detectando temporada atual...")
+        # Caminho crítico (a classificação espera por ela): sai da faixa de cadastros
+        return _get_current_season_urn(competition, deadline=deadline, lane=LANE_DEFAULT)
+
+    def fetch_standings(deps):
+        season, _ = deps["temporada"] or (None, None)
+        if not season:
+            return None
+        logger.info(f"[ANALYSIS COMPLETE] Buscando classificacao de {competition}")
+        snapshot, _ = _standings_store.get(competition, season, deadline=deadline, swr=True)
+        return snapshot
+
+    stages = {
+        "temporada": (fetch_season, ()),
+        "classificacao": (fetch_standings, ("temporada",)),
+        "forma_mandante": (lambda _: _get_team_form(team_home, deadline=deadline)[0], ()),
+        "forma_visitante": (lambda _: _get_team_form(team_away, deadline=deadline)[0], ()),
+        "confronto_direto": (lambda _: call_sportradar(
+            f"/competitors/{team_home}/versus/{team_away}/summaries.json", deadline=deadline, swr=True
+        )[0], ()),
+    }
+    if fixture_id:
+        logger.info(f"[ANALYSIS COMPLETE] Buscando probabilidades do jogo {fixture_id}")
+        stages["probabilidades"] = (lambda _: call_sportradar(
+            f"/sport_events/{fixture_id}/probabilities.json", deadline=deadline, swr=True
+        )[0], ())
+
+    started = time.time()
+    results, timings, errors = _run_stage_graph(stages)
+
+    season_urn, error = results["temporada"] or (None, errors.get("temporada"))
+    if error:
+        logger.warning(f"[ANALYSIS COMPLETE] Falha ao detectar temporada: {error}")
+        season_urn = None
+
+    complete_analysis = _build_complete_analysis(
+        competition, team_home, team_away, season_urn, results.get("classificacao"),
+        results["forma_mandante"], results["forma_visitante"],
+        results["confronto_direto"], results.get("probabilidades")
+    )
+    if errors:
+        # Seções com falha ficam de fora da análise; o motivo vai em "erros"
+        complete_analysis.setdefault("erros", {}).update(errors)
+    complete_analysis["desempenho"] = {
+        "total_ms": round((time.time() - started) * 1000),
+        "etapas": timings
+    }
 
     return jsonify(complete_analysis)
 
 
+ANALYSIS_BATCH_MAX_FIXTURES = int(os.getenv("ANALYSIS_BATCH_MAX_FIXTURES", "20"))
+ANALYSIS_BATCH_DEADLINE = float(os.getenv("ANALYSIS_BATCH_DEADLINE", "60"))
+
+
+def _batch_fixture(sport_event):
+    """Extrai (id, competição, mandante, visitante) de um sport_event Sportradar."""
+    teams = {c.get("qualifier"): c.get("id") for c in sport_event.get("competitors", [])}
+    return {
+        "id": sport_event.get("id"),
+        "competicao": sport_event.get("sport_event_context", {}).get("competition", {}).get("id"),
+        "mandante": teams.get("home"),
+        "visitante": teams.get("away")
+    }
+
+
+@app.route("/analysis/complete/batch")
+def analysis_complete_batch():
+    """
+    /analysis/complete para uma rodada inteira, em streaming NDJSON.
+
+    Query Parameters (uma das formas):
+        - competition + date (YYYY-MM-DD): todos os jogos da competição no dia
+        - fixtures: URNs de jogos separados por vírgula
+
+    Temporada e classificação são buscadas uma vez por competição; forma,
+    H2H e probabilidades uma vez por time/confronto/jogo, todas em paralelo
+    no executor de lotes (separado do fan-out de /analysis/complete). Cada jogo é enviado numa linha assim que seus
+    dados ficam prontos; a última linha traz o resumo do lote.
+    """
+    competition = request.args.get("competition")
+    date = request.args.get("date")
+    fixtures_param = request.args.get("fixtures")
+    started = time.time()
+    deadline = started + ANALYSIS_BATCH_DEADLINE
+
+    failed = []
+    if fixtures_param:
+        fixture_ids = list(dict.fromkeys(f.strip() for f in fixtures_param.split(",") if f.strip()))
+        for fixture_id in fixture_ids:
+            _, error = validate_urn_param(fixture_id, "fixtures", prefix="sr:sport_event:")
+            if error:
+                return error_response(error)
+        if len(fixture_ids) > ANALYSIS_BATCH_MAX_FIXTURES:
+            return error_response(f"Maximo de {ANALYSIS_BATCH_MAX_FIXTURES} jogos por lote")
+        lookups = {
+            fixture_id: _batch_executor.submit(
+                call_sportradar, f"/sport_events/{fixture_id}/summary.json", deadline=deadline
+            )
+            for fixture_id in fixture_ids
+        }
+        sport_events = []
+        for fixture_id, future in lookups.items():
+            data, error = future.result()
+            if error:
+                failed.append({"fixture": fixture_id, "ok": False, "error": error})
+            else:
+                sport_events.append(data.get("sport_event", {}))
+    elif competition and date:
+        try:
+            datetime.strptime(date, "%Y-%m-%d")
+        except ValueError:
+            return error_response("Parametro 'date' deve estar no formato YYYY-MM-DD")
+        data, error = call_sportradar(f"/schedules/{date}/summaries.json", deadline=deadline)
+        if error:
+            return error_response(error, 500)
+        sport_events = [
+            summary.get("sport_event", {}) for summary in data.get("summaries", [])
+            if summary.get("sport_event", {}).get("sport_event_context", {})
+                      .get("competition", {}).get("id") == competition
+        ]
+        if len(sport_events) > ANALYSIS_BATCH_MAX_FIXTURES:
+            return error_response(
+                f"{len(sport_events)} jogos no dia; maximo de {ANALYSIS_BATCH_MAX_FIXTURES} por lote"
+            )
+    else:
+        return error_response("Informe competition + date (YYYY-MM-DD) ou fixtures (URNs separados por virgula)")
+
+    fixtures = [fx for fx in map(_batch_fixture, sport_events) if fx["mandante"] and fx["visitante"]]
+
+    def generate():
+        futures = {}  # chave -> future; a mesma chave nunca é buscada duas vezes
+
+        def submit(key, func, *args, **kwargs):
+            if key not in futures:
+                futures[key] = _batch_executor.submit(func, *args, **kwargs)
+            return futures[key]
+
+        def result(key):
+            try:
+                return futures[key].result()
+            except Exception as e:
+                logger.error(f"[ANALYSIS BATCH] {key}: {e}")
+                return None, str(e)
+
+        def deps(fx):
+            season_key = ("temporada", fx["competicao"])
+            keys = [season_key, ("forma", fx["mandante"]), ("forma", fx["visitante"]),
+                    ("confronto", fx["mandante"], fx["visitante"]), ("probabilidades", fx["id"])]
+            # Classificação sai assim que a temporada da competição é conhecida
+            if futures[season_key].done():
+                season, _ = result(season_key)
+                if season:
+                    submit(("classificacao", fx["competicao"]), _standings_store.get, fx["competicao"],
+                           season, deadline=deadline, swr=True)
+                    keys.append(("classificacao", fx["competicao"]))
+            return keys
+
+        requested = 0
+        for fx in fixtures:
+            home, away = fx["mandante"], fx["visitante"]
+            submit(("temporada", fx["competicao"]), _get_current_season_urn, fx["competicao"],
+                   deadline=deadline, lane=LANE_DEFAULT)
+            submit(("forma", home), _get_team_form, home, deadline=deadline)
+            submit(("forma", away), _get_team_form, away, deadline=deadline)
+            submit(("confronto", home, away), call_sportradar,
+                   f"/competitors/{home}/versus/{away}/summaries.json", deadline=deadline, swr=True)
+            submit(("probabilidades", fx["id"]), call_sportradar,
+                   f"/sport_events/{fx['id']}/probabilities.json", deadline=deadline, swr=True)
+            requested += 6
+
+        for item in failed:
+            yield item
+
+        pending = list(fixtures)
+        while pending:
+            ready = [fx for fx in pending if all(futures[k].done() for k in deps(fx))]
+            for fx in ready:
+                pending.remove(fx)
+                season_urn = result(("temporada", fx["competicao"]))[0]
+                snapshot = result(("classificacao", fx["competicao"]))[0] if season_urn else None
+                analysis = _build_complete_analysis(
+                    fx["competicao"], fx["mandante"], fx["visitante"], season_urn, snapshot,
+                    result(("forma", fx["mandante"]))[0], result(("forma", fx["visitante"]))[0],
+                    result(("confronto", fx["mandante"], fx["visitante"]))[0],
+                    result(("probabilidades", fx["id"]))[0]
+                )
+                analysis["fixture"] = fx["id"]
+                analysis["desempenho"] = {"concluido_ms": round((time.time() - started) * 1000)}
+                yield analysis
+
+            running = [f for f in futures.values() if not f.done()]
+            if pending and running:
+                wait(running, return_when=FIRST_COMPLETED)
+
+        yield {
+            "ok": True,
+            "resumo": {
+                "jogos": len(fixtures),
+                "falhas": len(failed),
+                "buscas_unicas": len(futures),
+                "buscas_sem_deduplicacao": requested,
+                "total_ms": round((time.time() - started) * 1000)
+            }
+        }
+
+    return _ndjson_response(generate())
+
+
+# =======================
+# Pré-carregamento dos jogos do dia
+# =======================
+PREFETCH_INTERVAL = int(os.getenv("PREFETCH_INTERVAL", "30"))
+PREFETCH_TASKS_PER_TICK = int(os.getenv("PREFETCH_TASKS_PER_TICK", "2"))
+PREFETCH_LEAD = int(os.getenv("PREFETCH_LEAD", str(90 * 60)))  # antecedência em relação ao início do jogo
+PREFETCH_PLAN_HOUR = int(os.getenv("PREFETCH_PLAN_HOUR", "6"))  # hora UTC do planejamento diário
+PREFETCH_QUOTA_SHARE = float(os.getenv("PREFETCH_QUOTA_SHARE", "0.5"))  # fração da quota diária
+# Tarefas cujo TTL é menor que PREFETCH_LEAD são reaquecidas quando falta esta fração do TTL
+# para o início (probabilidades, TTL 30 min: T-20 min), então o dado ainda está no TTL no apito
+PREFETCH_REWARM_FRACTION = 2 / 3
+_PREFETCH_TTL_PATHS = {
+    "standings": "/seasons/x/standings.json",
+    "versus": "/competitors/x/versus/y/summaries.json",
+    "probabilities": "/sport_events/x/probabilities.json",
+}
+
+
+def _parse_iso(value):
+    """Converte datetime ISO 8601 da Sportradar em epoch (None se inválido)."""
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class _PrefetchScheduler:
+    """
+    Lê a agenda do dia e a do seguinte (/schedules/{date}/schedule.json, ver
+    plan) e pré-aquece, para
+    cada jogo das SUPPORTED_COMPETITIONS, classificação, forma dos times, H2H
+    e probabilidades. Cada tarefa vence PREFETCH_LEAD antes do início do jogo
+    e roda na faixa de baixa prioridade do limiter, poucas por vez, enquanto o
+    uso do dia estiver abaixo de PREFETCH_QUOTA_SHARE da quota. O que expira
+    antes do início (TTL < PREFETCH_LEAD) ganha uma segunda passada perto do
+    jogo (ver PREFETCH_REWARM_FRACTION).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = []  # heap de (due, seq, tipo, args)
+        self._keys = {}  # chave da tarefa -> due (deduplicação entre planejamentos)
+        self._seq = itertools.count()
+        self._planned_date = None
+        self.planned = 0
+        self.done = 0
+        self.failed = 0
+        self.skipped_budget = 0
+
+    def _schedule(self, date):
+        data, error = call_sportradar(
+            f"/schedules/{date}/schedule.json", deadline=time.time() + 120, lane=LANE_BULK
+        )
+        if error:
+            logger.warning(f"[Prefetch] Agenda de {date} indisponivel: {error}")
+            return None
+        return data.get("schedule", data.get("sport_events", []))
+
+    def plan(self, date):
+        """
+        Planeja uma janela móvel: o resto do dia `date` mais os jogos do dia
+        seguinte que começam antes do próximo planejamento (PREFETCH_PLAN_HOUR)
+        + PREFETCH_LEAD — os da madrugada UTC (noite em Brasília). As tarefas
+        novas entram na fila existente; as já planejadas não se repetem.
+        """
+        events = self._schedule(date)
+        if events is None:
+            return False
+        day = datetime.strptime(date, "%Y-%m-%d")
+        next_day = day + timedelta(days=1)
+        window_end = (next_day - datetime(1970, 1, 1)).total_seconds() + PREFETCH_PLAN_HOUR * 3600 + PREFETCH_LEAD
+        tomorrow = self._schedule(next_day.strftime("%Y-%m-%d"))
+        if tomorrow is not None:
+            events = events + tomorrow
+
+        tasks, seen = [], set()
+        now = time.time()
+
+        def push(due, key, kind, args):
+            if key not in seen:
+                seen.add(key)
+                tasks.append((key, due, kind, args))
+
+        def add(due, kickoff, kind, *args):
+            push(due, (kind,) + args, kind, args)
+            ttl_path = _PREFETCH_TTL_PATHS.get(kind)
+            if ttl_path:
+                rewarm = kickoff - _cache_ttl_for(ttl_path) * PREFETCH_REWARM_FRACTION
+                if rewarm > due:
+                    push(rewarm, ("rewarm", kind, args[0], int(rewarm)), kind, args)
+
+        for sport_event in events:
+            competition = sport_event.get("sport_event_context", {}).get("competition", {}).get("id")
+            if competition not in SUPPORTED_COMPETITIONS:
+                continue
+            if sport_event.get("status", "not_started") != "not_started":
+                continue
+            kickoff = _parse_iso(sport_event.get("scheduled"))
+            if kickoff is None or kickoff < now or kickoff >= window_end:
+                continue
+            teams = {c.get("qualifier"): c.get("id") for c in sport_event.get("competitors", [])}
+            home, away = teams.get("home"), teams.get("away")
+            due = max(now, kickoff - PREFETCH_LEAD)
+            # Uma classificação por competição por hora de início
+            add(due, kickoff, "standings", competition, int(due // 3600))
+            if home and away:
+                add(due, kickoff, "form", home)
+                add(due, kickoff, "form", away)
+                add(due, kickoff, "versus", home, away)
+            add(due, kickoff, "probabilities", sport_event.get("id"))
+
+        added = 0
+        with self._lock:
+            # Chaves antigas saem; as da janela anterior seguram a deduplicação
+            self._keys = {key: due for key, due in self._keys.items() if due >= now - 86400}
+            for key, due, kind, args in tasks:
+                if key in self._keys:
+                    continue
+                self._keys[key] = due
+                heapq.heappush(self._queue, (due, next(self._seq), kind, args))
+                added += 1
+            self._planned_date = date
+            self.planned += added
+        logger.info(f"[Prefetch] {date}: {added} tarefa(s) nova(s) ate {datetime.utcfromtimestamp(window_end).isoformat()}Z")
+        return True
+
+    def _run(self, kind, args):
+        deadline = time.time() + 60
+        if kind == "standings":
+            season, error = _get_current_season_urn(args[0], deadline=deadline, lane=LANE_BULK)
+            if error:
+                return error
+            return _standings_store.get(args[0], season, deadline=deadline, lane=LANE_BULK)[1]
+        if kind == "form":
+            return _get_team_form(args[0], deadline=deadline, lane=LANE_BULK)[1]
+        if kind == "versus":
+            path = f"/competitors/{args[0]}/versus/{args[1]}/summaries.json"
+        else:
+            path = f"/sport_events/{args[0]}/probabilities.json"
+        return call_sportradar(path, deadline=deadline, lane=LANE_BULK)[1]
+
+    def tick(self):
+        """Job: planeja a janela (uma vez por dia, após PREFETCH_PLAN_HOUR) e executa as tarefas vencidas."""
+        now_utc = datetime.utcnow()
+        today = now_utc.strftime("%Y-%m-%d")
+        if self._planned_date != today and (now_utc.hour >= PREFETCH_PLAN_HOUR or self._planned_date is None):
+            if not self.plan(today):
+                return
+
+        for _ in range(PREFETCH_TASKS_PER_TICK):
+            with self._lock:
+                if not self._queue or self._queue[0][0] > time.time():
+                    return
+                due, _, kind, args = heapq.heappop(self._queue)
+            quota = _rate_limiter.quota_status()
+            if quota.get("usadas", 0) >= API_DAILY_QUOTA * PREFETCH_QUOTA_SHARE:
+                with self._lock:
+                    self.skipped_budget += 1 + len(self._queue)
+                    self._queue = []
+                logger.warning("[Prefetch] Fatia da quota diaria para prefetch esgotada; restante descartado")
+                return
+            error = self._run(kind, args)
+            with self._lock:
+                if error:
+                    self.failed += 1
+                else:
+                    self.done += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "data": self._planned_date,
+                "planejadas": self.planned,
+                "concluidas": self.done,
+                "falhas": self.failed,
+                "pendentes": len(self._queue),
+                "descartadas_quota": self.skipped_budget,
+                "proxima_em_s": round(max(0, self._queue[0][0] - time.time())) if self._queue else None
+            }
+
+
+_prefetch_scheduler = _PrefetchScheduler()
+
+
+# =======================
+# Estado ao vivo por jogo
+# =======================
+LIVE_MATCH_DB_PATH = os.getenv(
+    "LIVE_MATCH_DB_PATH", os.path.join(tempfile.gettempdir(), "sportradar_live.sqlite3")
+)
+LIVE_MATCH_MAX_FIXTURES = int(os.getenv("LIVE_MATCH_MAX_FIXTURES", "300"))
+LIVE_MATCH_RETENTION = int(os.getenv("LIVE_MATCH_RETENTION", str(6 * 3600)))
+LIVE_MATCH_MAX_MINUTE = 150
+LIVE_RATE_WINDOWS = (10, 15)
+LIVE_TRACKED_STATS = ("corner_kicks", "shots_total", "shots_on_target", "yellow_cards", "red_cards", "fouls")
+# Peso de cada estatística no índice de pressão (finalização no alvo conta duas vezes)
+LIVE_PRESSURE_WEIGHTS = {"shots_total": 1.0, "shots_on_target": 1.0, "corner_kicks": 0.5}
+_LIVE_STAT_OFFSET = {"mandante": 2, "visitante": 2 + len(LIVE_TRACKED_STATS)}
+
+
+def _clock_minute(clock):
+    """Minuto de jogo a partir do clock da Sportradar (match_time/played, int ou "mm:ss")."""
+    value = clock.get("match_time") or clock.get("played") or 0
+    try:
+        return max(0, min(LIVE_MATCH_MAX_MINUTE, int(str(value).split(":")[0])))
+    except ValueError:
+        return 0
+
+
+def _live_row(summary):
+    """(minuto, linha) de um summary: placar e LIVE_TRACKED_STATS acumulados de cada time."""
+    state = _live_state(summary)
+    status_obj = summary.get("sport_event_status", {})
+    row = [int(status_obj.get("home_score") or 0), int(status_obj.get("away_score") or 0)]
+    for side in ("mandante", "visitante"):
+        stats = state["estatisticas"][side]
+        row.extend(int(stats.get(key) or 0) for key in LIVE_TRACKED_STATS)
+    return _clock_minute(status_obj.get("clock", {})), tuple(row)
+
+
+class _LiveMatch:
+    """
+    Histórico de um jogo ao vivo indexado pelo minuto: minutes[m] é a linha
+    acumulada (placar + estatísticas) no minuto m. Minutos sem amostra herdam
+    a linha anterior, então a taxa numa janela de W minutos é uma subtração
+    entre duas posições da lista (O(1)).
+    """
+
+    __slots__ = ("fixture_id", "minutes", "first_minute", "updated_at")
+
+    def __init__(self, fixture_id):
+        self.fixture_id = fixture_id
+        self.minutes = []
+        self.first_minute = None
+        self.updated_at = 0.0
+
+    def record(self, minute, row):
+        """Aplica uma amostra. Retorna True se o histórico mudou."""
+        last = len(self.minutes) - 1
+        if self.first_minute is None:
+            self.first_minute = minute
+            self.minutes = [row] * (minute + 1)
+        elif minute > last:
+            self.minutes.extend([self.minutes[last]] * (minute - last - 1))
+            self.minutes.append(row)
+        elif self.minutes[last] != row:
+            # Relógio parado (intervalo, acréscimos) ou correção: atualiza o minuto corrente
+            self.minutes[last] = row
+        else:
+            return False
+        return True
+
+    def _delta(self, start, end):
+        a, b = self.minutes[start], self.minutes[end]
+        return [y - x for x, y in zip(a, b)]
+
+    def window(self, size, end=None):
+        """Diferença acumulada nos últimos `size` minutos (até `end`). Retorna (span, delta)."""
+        end = len(self.minutes) - 1 if end is None else end
+        start = max(self.first_minute, end - size)
+        if end <= start:
+            return 0, None
+        return end - start, self._delta(start, end)
+
+    @staticmethod
+    def _side(delta, side):
+        offset = _LIVE_STAT_OFFSET[side]
+        return dict(zip(LIVE_TRACKED_STATS, delta[offset:offset + len(LIVE_TRACKED_STATS)]))
+
+    @staticmethod
+    def _pressure(stats):
+        return sum(stats[key] * weight for key, weight in LIVE_PRESSURE_WEIGHTS.items())
+
+    def _pressure_share(self, delta):
+        home = self._pressure(self._side(delta, "mandante"))
+        away = self._pressure(self._side(delta, "visitante"))
+        return home / (home + away) if home + away else None
+
+    def rates(self, size):
+        """Taxas por minuto da janela (escanteios, finalizações, cartões) e divisão da pressão."""
+        span, delta = self.window(size)
+        if not span:
+            return {"janela_min": 0}
+        home, away = self._side(delta, "mandante"), self._side(delta, "visitante")
+        share = self._pressure_share(delta)
+
+        def per_min(key):
+            return {
+                "mandante": round(home[key] / span, 3),
+                "visitante": round(away[key] / span, 3),
+                "total": round((home[key] + away[key]) / span, 3)
+            }
+
+        return {
+            "janela_min": span,
+            "gols": delta[0] + delta[1],
+            "escanteios_por_min": per_min("corner_kicks"),
+            "finalizacoes_por_min": per_min("shots_total"),
+            "finalizacoes_no_alvo_por_min": per_min("shots_on_target"),
+            "cartoes_por_min": round(
+                (home["yellow_cards"] + away["yellow_cards"] + home["red_cards"] + away["red_cards"]) / span, 3
+            ),
+            "pressao_mandante_pct": round(share * 100, 1) if share is not None else None
+        }
+
+    def pressure_shift(self, size=LIVE_RATE_WINDOWS[0]):
+        """Compara a pressão dos últimos `size` minutos com a dos `size` anteriores."""
+        end = len(self.minutes) - 1
+        span, recent = self.window(size, end)
+        prev_span, previous = self.window(size, end - span) if span else (0, None)
+        if not span or not prev_span:
+            return None
+        now, before = self._pressure_share(recent), self._pressure_share(previous)
+        if now is None or before is None:
+            return None
+        return {
+            "pressao_mandante_pct": round(now * 100, 1),
+            "pressao_mandante_pct_anterior": round(before * 100, 1),
+            "variacao_pp": round((now - before) * 100, 1),
+            "dominante": self._leader(now),
+            "virou": self._leader(now) != self._leader(before)
+        }
+
+    @staticmethod
+    def _leader(share):
+        return "mandante" if share > 0.6 else "visitante" if share < 0.4 else "equilibrado"
+
+
+class _LiveMatchStore(_SQLiteStore):
+    """
+    Estado por jogo ao vivo (_LiveMatch), alimentado pelo _LivePoller e pelas
+    leituras de /fixtures/live/analysis. Cada minuto que muda é gravado no
+    SQLite, então outro worker (ou um reinício) retoma o histórico do jogo.
+    """
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS live_minutes ("
+        "fixture TEXT NOT NULL, minute INTEGER NOT NULL, row TEXT NOT NULL, recorded_at REAL NOT NULL, "
+        "PRIMARY KEY (fixture, minute))",
+        "CREATE INDEX IF NOT EXISTS live_minutes_recorded_at ON live_minutes (recorded_at)",
+    )
+
+    def __init__(self, db_path, max_fixtures, retention):
+        super().__init__(db_path)
+        self.max_fixtures = max_fixtures
+        self.retention = retention
+        self.lock = threading.Lock()
+        self._matches = OrderedDict()  # fixture -> _LiveMatch
+        self.samples = 0
+        self.errors = 0
+
+    def _safe(self, func, default=None):
+        try:
+            return func()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"[LiveMatch] {e}")
+            return default
+
+    def _restore(self, fixture_id):
+        rows = self._safe(lambda: self._conn().execute(
+            "SELECT minute, row FROM live_minutes WHERE fixture = ? ORDER BY minute", (fixture_id,)
+        ).fetchall(), default=[])
+        match = _LiveMatch(fixture_id)
+        for minute, row in rows:
+            match.record(minute, tuple(json.loads(row)))
+        return match
+
+    def get(self, fixture_id):
+        """Estado do jogo (restaurado do SQLite se este worker ainda não o tem). Chamar com `lock`."""
+        match = self._matches.get(fixture_id)
+        if match is None:
+            match = self._matches[fixture_id] = self._restore(fixture_id)
+            while len(self._matches) > self.max_fixtures:
+                self._matches.popitem(last=False)
+        else:
+            self._matches.move_to_end(fixture_id)
+        return match
+
+    def record(self, summary):
+        """Aplica o summary de um jogo ao vivo. Retorna o _LiveMatch (ou None sem id)."""
+        fixture_id = summary.get("sport_event", {}).get("id")
+        if not fixture_id:
+            return None
+        minute, row = _live_row(summary)
+        with self.lock:
+            match = self.get(fixture_id)
+            changed = match.record(minute, row)
+            match.updated_at = time.time()
+        if changed:
+            self.samples += 1
+            minute = len(match.minutes) - 1
+            self._safe(lambda: self._conn().execute(
+                "INSERT OR REPLACE INTO live_minutes (fixture, minute, row, recorded_at) VALUES (?, ?, ?, ?)",
+                (fixture_id, minute, json.dumps(row), match.updated_at)
+            ))
+        return match
+
+    def prune(self):
+        """Descarta jogos sem amostra há mais de LIVE_MATCH_RETENTION segundos."""
+        cutoff = time.time() - self.retention
+        with self.lock:
+            for fixture_id in [f for f, m in self._matches.items() if m.updated_at < cutoff]:
+                del self._matches[fixture_id]
+        self._safe(lambda: self._conn().execute(
+            "DELETE FROM live_minutes WHERE fixture IN "
+            "(SELECT fixture FROM live_minutes GROUP BY fixture HAVING MAX(recorded_at) < ?)", (cutoff,)
+        ))
+
+    def stats(self):
+        with self.lock:
+            return {
+                "jogos": len(self._matches),
+                "amostras_gravadas": self.samples,
+                "erros": self.errors
+            }
+
+
+_live_match_store = _LiveMatchStore(LIVE_MATCH_DB_PATH, LIVE_MATCH_MAX_FIXTURES, LIVE_MATCH_RETENTION)
+
+
+# =======================
+# Poller ao vivo + Server-Sent Events
+# =======================
+LIVE_POLL_INTERVAL = int(os.getenv("LIVE_POLL_INTERVAL", "15"))
+# Cada conexão SSE prende uma thread gthread: o limite fica abaixo de GUNICORN_THREADS
+# para sobrar thread para o tráfego normal da API. Com o Procfile atual (2 workers x
+# 4 threads) são 4 streams no total; mais espectadores exigem mais threads/workers
+# (ou um worker assíncrono dedicado ao stream)
+LIVE_STREAM_MAX_CLIENTS = max(1, min(
+    int(os.getenv("LIVE_STREAM_MAX_CLIENTS", str(GUNICORN_THREADS - 2))), GUNICORN_THREADS - 1
+))
+LIVE_POLLER_LEASE = "live_poller"
+LIVE_STREAM_QUEUE = 100           # eventos pendentes por assinante antes de desconectá-lo
+LIVE_STREAM_HEARTBEAT = 15        # segundos entre comentários keep-alive
+# Poller segue ativo após uma leitura de análise de jogo ao vivo. Com TTL <= intervalo,
+# uma leitura isolada não gera nenhum poll extra (o primeiro poll espera um intervalo);
+# leituras seguidas custam um poll por intervalo, dividido entre todos os leitores
+LIVE_WATCH_TTL = int(os.getenv("LIVE_WATCH_TTL", str(LIVE_POLL_INTERVAL)))
+LIVE_SUMMARIES_PATH = "/schedules/live/summaries.json"
+
+
+def _live_state(summary):
+    """Extrai de um summary ao vivo o estado acompanhado pelo poller."""
+    sport_event = summary.get("sport_event", {})
+    status_obj = summary.get("sport_event_status", {})
+    teams = {c.get("qualifier"): c for c in sport_event.get("competitors", [])}
+    home, away = teams.get("home", {}), teams.get("away", {})
+
+    estatisticas = {"mandante": {}, "visitante": {}}
+    for cs in summary.get("statistics", {}).get("totals", {}).get("competitors", []):
+        if cs.get("id") == home.get("id"):
+            estatisticas["mandante"] = cs.get("statistics", {})
+        elif cs.get("id") == away.get("id"):
+            estatisticas["visitante"] = cs.get("statistics", {})
+
+    return {
+        "id": sport_event.get("id"),
+        "competicao_id": sport_event.get("sport_event_context", {}).get("competition", {}).get("id"),
+        "mandante": home.get("name"),
+        "visitante": away.get("name"),
+        "placar": f"{status_obj.get('home_score', 0)}x{status_obj.get('away_score', 0)}",
+        "minuto": _clock_minute(status_obj.get("clock") or {}),
+        "status": _parse_status_sportradar(status_obj.get("status", "")),
+        "match_status": status_obj.get("match_status"),
+        "estatisticas": estatisticas
+    }
+
+
+def _live_diff(old, new):
+    """Lista de (evento, payload) com o que mudou entre dois estados do mesmo jogo."""
+    events = []
+    base = {"id": new["id"], "minuto": new["minuto"]}
+    if old is None:
+        return [("inicio", new)]
+    if old["placar"] != new["placar"]:
+        events.append(("placar", dict(base, placar=new["placar"], anterior=old["placar"])))
+    if old["status"] != new["status"] or old["match_status"] != new["match_status"]:
+        events.append(("status", dict(base, status=new["status"], match_status=new["match_status"])))
+    if old["minuto"] != new["minuto"]:
+        events.append(("relogio", base))
+    changed = {}
+    for side in ("mandante", "visitante"):
+        before, after = old["estatisticas"][side], new["estatisticas"][side]
+        delta = {k: v for k, v in after.items() if before.get(k) != v}
+        if delta:
+            changed[side] = delta
+    if changed:
+        events.append(("estatisticas", dict(base, **changed)))
+    return events
+
+
+class _LivePoller:
+    """
+    Um único poller por worker para /schedules/live/summaries.json.
+
+    Roda a cada LIVE_POLL_INTERVAL segundos apenas enquanto houver assinantes
+    SSE (ou por LIVE_WATCH_TTL segundos após uma leitura de jogo ao vivo em
+    /fixtures/live/analysis), calcula o diff de cada jogo (placar, relógio,
+    status, estatísticas) e publica nas filas dos assinantes. O summary de
+    cada jogo também alimenta o cache de /sport_events/{id}/summary.json e o
+    histórico em _live_match_store, então /fixtures/live e
+    /fixtures/live/analysis leem do mesmo payload. O custo upstream independe
+    do número de clientes conectados.
+
+    Entre os workers, só o dono do lease LIVE_POLLER_LEASE chama a
+    Sportradar; os demais leem o snapshot que ele gravou.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # id -> (fila, filtro de jogos ou None)
+        self._ids = itertools.count(1)
+        self._states = {}
+        self._thread = None
+        self._watch_until = 0.0
+        self._wake = threading.Event()  # assinante SSE novo antecipa o primeiro poll
+        self.leader = False
+        self.polls = 0
+        self.errors = 0
+        self.events_published = 0
+        self.dropped = 0
+        self.last_poll = None
+
+    def subscribe(self, fixtures=None):
+        """Registra um assinante; retorna (id, fila) ou None se o limite foi atingido."""
+        with self._lock:
+            if len(self._subscribers) >= LIVE_STREAM_MAX_CLIENTS:
+                return None
+            sub_id = next(self._ids)
+            q = queue.Queue(maxsize=LIVE_STREAM_QUEUE)
+            self._subscribers[sub_id] = (q, set(fixtures) if fixtures else None)
+            self._ensure_running()
+            self._wake.set()
+            return sub_id, q
+
+    def watch(self):
+        """
+        Mantém o poller ativo por LIVE_WATCH_TTL segundos (leitores de /fixtures/live/analysis).
+
+        Quem chama acabou de ler o summary: se o poller estiver parado, o
+        primeiro poll só sai depois de um intervalo, e não sai se ninguém mais
+        ler até lá.
+        """
+        with self._lock:
+            self._watch_until = time.time() + LIVE_WATCH_TTL
+            self._ensure_running(delay=LIVE_POLL_INTERVAL)
+
+    def _ensure_running(self, delay=0):
+        # Chamar com _lock
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, args=(delay,), name="live-poller", daemon=True)
+            self._thread.start()
+
+    def unsubscribe(self, sub_id):
+        with self._lock:
+            self._subscribers.pop(sub_id, None)
+
+    def snapshot(self, fixtures=None):
+        with self._lock:
+            return [st for fid, st in self._states.items() if not fixtures or fid in fixtures]
+
+    def _loop(self, delay=0):
+        self._wake.wait(delay)
+        self._wake.clear()
+        while True:
+            with self._lock:
+                if not self._subscribers and time.time() >= self._watch_until:
+                    self._thread = None
+                    _shared_lease.release(LIVE_POLLER_LEASE)
+                    return
+            try:
+                self.poll()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"[LivePoller] {e}")
+            time.sleep(LIVE_POLL_INTERVAL)
+
+    def _fetch(self):
+        """Payload ao vivo: da Sportradar se este worker tem o lease, senão do snapshot do dono."""
+        if _shared_lease.acquire(LIVE_POLLER_LEASE, LIVE_POLL_INTERVAL * 2):
+            self.leader = True
+            return call_sportradar(LIVE_SUMMARIES_PATH, lane=LANE_LIVE)
+        self.leader = False
+        snapshot = _snapshot_store.load(_cache_key(LIVE_SUMMARIES_PATH), max_age=LIVE_POLL_INTERVAL * 2)
+        if snapshot is None:
+            return None, "Snapshot ao vivo do worker lider indisponivel"
+        return snapshot[0], None
+
+    def poll(self):
+        data, error = self._fetch()
+        self.polls += 1
+        self.last_poll = datetime.utcnow().isoformat() + "Z"
+        if error:
+            self.errors += 1
+            return
+
+        now = time.time()
+        summary_ttl = _cache_ttl_for("/sport_events/x/summary.json")
+        states, events = {}, []
+        for summary in data.get("summaries", []):
+            state = _live_state(summary)
+            if not state["id"]:
+                continue
+            states[state["id"]] = state
+            # Versão pelo conteúdo: summary igual ao da rodada anterior mantém o ETag
+            version = hashlib.sha1(json.dumps(summary, sort_keys=True).encode("utf-8")).hexdigest()
+            _response_cache.set(
+                _cache_key(f"/sport_events/{state['id']}/summary.json"), summary, summary_ttl,
+                stored_at=now, version=version
+            )
+            _live_match_store.record(summary)
+            events.extend(_live_diff(self._states.get(state["id"]), state))
+        for fid in self._states.keys() - states.keys():
+            events.append(("fim", {"id": fid, "placar": self._states[fid]["placar"]}))
+
+        with self._lock:
+            self._states = states
+            subscribers = list(self._subscribers.items())
+        for name, payload in events:
+            self._publish(subscribers, name, payload)
+
+    def _publish(self, subscribers, name, payload):
+        for sub_id, (q, fixtures) in subscribers:
+            if fixtures and payload["id"] not in fixtures:
+                continue
+            try:
+                q.put_nowait((name, payload))
+                self.events_published += 1
+            except queue.Full:
+                # Cliente lento: desconecta em vez de acumular memória
+                self.dropped += 1
+                self.unsubscribe(sub_id)
+                q.queue.clear()
+                q.put_nowait(("fim_stream", {"motivo": "cliente lento"}))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ativo": self._thread is not None,
+                "intervalo_s": LIVE_POLL_INTERVAL,
+                "assinantes": len(self._subscribers),
+                "observado_por_s": max(0, round(self._watch_until - time.time())),
+                "limite_assinantes": LIVE_STREAM_MAX_CLIENTS,
+                "lider": self.leader,
+                "jogos": len(self._states),
+                "polls": self.polls,
+                "erros": self.errors,
+                "eventos_publicados": self.events_published,
+                "desconectados_lentos": self.dropped,
+                "ultimo_poll": self.last_poll
+            }
+
+
+_live_poller = _LivePoller()
+
+
+def _sse(event, payload):
+    """Formata um evento Server-Sent Events."""
+    return f"event: {event}\ndata: {app.json.dumps(payload)}\n\n"
+
+
 # =======================
 # Inicialização
 # =======================
+
+def _start_background_jobs():
+    _start_periodic_job(
+        "snapshot_compact", SNAPSHOT_COMPACT_INTERVAL, _snapshot_store.compact,
+        initial_delay=SNAPSHOT_COMPACT_INTERVAL
+    )
+    _start_periodic_job("season_index", SEASON_INDEX_REFRESH, _season_index.refresh_all, initial_delay=2)
+    _start_periodic_job("team_form_feed", FORM_FEED_INTERVAL, _team_form_store.refresh_feed, initial_delay=30)
+    _start_periodic_job("prefetch", PREFETCH_INTERVAL, _prefetch_scheduler.tick, initial_delay=60)
+    _start_periodic_job("live_match_prune", 3600, _live_match_store.prune, initial_delay=3600)
+
+
+_warmed = _snapshot_store.warm(_response_cache)
+if _warmed:
+    logger.info(f"[Snapshots] Cache aquecido com {_warmed} resposta(s) de {SNAPSHOT_DB_PATH}")
+# Jogos encerrados já guardados nos snapshots alimentam o modelo de escanteios/cartões sem quota
+_replayed = sum(
+    _set_piece_model.record(data.get("summaries", []))
+    for _, data in _snapshot_store.payloads("%/summaries.json") if isinstance(data, dict)
+)
+if _replayed:
+    logger.info(f"[SetPiece] {_replayed} jogo(s) encerrado(s) carregado(s) dos snapshots")
+_restored = _competitor_catalog.restore()
+if _restored:
+    logger.info(f"[Catalogo] {_restored} competidor(es) restaurado(s) de {CATALOG_DB_PATH}")
+_start_background_jobs()
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5000))
     debug = os.getenv("FLASK_DEBUG", "false").lower() == "true"